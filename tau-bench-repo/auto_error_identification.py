@@ -8,9 +8,11 @@ from tau_bench.model_utils import default_api_from_args, API
 from tau_bench.envs.airline.tasks_test import TASKS as AIRLINE_TASKS
 from tau_bench.envs.retail.tasks_test import TASKS_TEST as RETAIL_TASKS
 from tau_bench.model_utils.args import api_parser
+from tau_bench.model_utils.api.cache import SQLiteStore, cache_metrics, set_cache_store
+from tau_bench.model_utils import func_tools
+from tau_bench.model_utils.executor import SharedExecutor, executor_metrics, set_executor
 from tau_bench.types import Task, Action
 from typing import List, Dict, Any
-from concurrent.futures import ThreadPoolExecutor
 
 def get_args() -> argparse.Namespace:
     parser = api_parser()
@@ -19,6 +21,8 @@ def get_args() -> argparse.Namespace:
     parser.add_argument("--max-concurrency", type=int, default=1, help="Maximum number of concurrent API calls")
     parser.add_argument("--output-path", type=str, required=True, help="Path to the output file")
     parser.add_argument("--max-num-failed-results", "-n", type=int, help="Maximum number of failed results to analyze")
+    parser.add_argument("--cache-path", type=str, help="SQLite file to cache API calls in, shared by concurrent and later runs")
+    parser.add_argument("--cache-max-mb", type=int, default=1024, help="Evict the least recently used API calls past this size")
     return parser.parse_args()
 
 class OriginalResult(BaseModel):
@@ -133,14 +137,7 @@ def fault_assignment_analysis(api: API, results: List[OriginalResult], max_concu
             text=context,
         )
         return FaultAssignmentResult(task_id=task_id, author=author, description=description)
-    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
-        task_ids = [r.task_id for r in results]
-        user_instructions = [r.user_instruction for r in results]
-        trajs = [r.traj for r in results]
-        ground_truth_actions = [r.ground_truth_actions for r in results]
-        ground_truth_outputs = [r.ground_truth_outputs for r in results]
-        results = list(executor.map(assign_fault, task_ids, user_instructions, trajs, ground_truth_actions, ground_truth_outputs))
-    return results
+    return func_tools.map(lambda r: assign_fault(r.task_id, r.user_instruction, r.traj, r.ground_truth_actions, r.ground_truth_outputs), results, max_concurrency=max_concurrency)
 
 
 def fault_type_analysis(api: API, results: List[OriginalResult], max_concurrency: int) -> List[FaultTypeResult]:
@@ -165,17 +162,14 @@ def fault_type_analysis(api: API, results: List[OriginalResult], max_concurrency
             text=context,
         )
         return FaultTypeResult(task_id=task_id, fault_type=fault_type, description=description)
-    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
-        task_ids = [r.task_id for r in results]
-        user_instructions = [r.user_instruction for r in results]
-        trajs = [r.traj for r in results]
-        ground_truth_actions = [r.ground_truth_actions for r in results]
-        ground_truth_outputs = [r.ground_truth_outputs for r in results]
-        results = list(executor.map(get_fault_type, task_ids, user_instructions, trajs, ground_truth_actions, ground_truth_outputs))
-    return results
+    return func_tools.map(lambda r: get_fault_type(r.task_id, r.user_instruction, r.traj, r.ground_truth_actions, r.ground_truth_outputs), results, max_concurrency=max_concurrency)
 
 def main() -> None:
     args = get_args()
+    # the pipeline gets a helper per concurrent trajectory, sampling shares the rest
+    set_executor(SharedExecutor(max_workers=max(64, 2 * args.max_concurrency)))
+    if args.cache_path is not None:
+        set_cache_store(SQLiteStore(args.cache_path, max_bytes=args.cache_max_mb * 1024 * 1024))
     api = default_api_from_args(args)
     with open(args.results_path, "r") as f:
         results = json.load(f)
@@ -225,6 +219,9 @@ Fault type distribution (only failures marked as being caused by the agent):
             "fault_type_analysis": [r.model_dump() for r in fault_type_results],
         }, f, indent=4)
     print(f"Saved results to {args.output_path}")
+    metrics = cache_metrics()
+    print(f"Peak threads: {executor_metrics()['peak_threads']}")
+    print(f"API cache: {metrics['hits']} hits, {metrics['misses']} misses, {metrics['evictions']} evictions, {metrics['dedup_waits']} deduplicated")
 
 if __name__ == "__main__":
     main()
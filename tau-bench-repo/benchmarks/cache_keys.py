@@ -0,0 +1,134 @@
+# Copyright Sierra
+
+"""Measures the cost of computing the cache key of an API call.
+
+Keys are computed for `classify` calls over a conversation like the ones
+`auto_error_identification.py` sends, and `parse_force` calls with a large nested
+schema. The script compares the cache's key function with the one the cache was
+introduced with, which inspected the signature, generated the schema and serialized
+the arguments to JSON on every call.
+"""
+
+import argparse
+import hashlib
+import inspect
+import json
+import time
+from enum import Enum
+from typing import Any, Callable
+
+from pydantic import BaseModel, create_model
+
+from tau_bench.model_utils.api import cache
+from tau_bench.model_utils.api.api import API
+from tau_bench.model_utils.model.vllm_completion import VLLMCompletionModel
+
+
+def get_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--turns", type=int, default=30, help="Turns of the classified conversation")
+    parser.add_argument("--schema-fields", type=int, default=40, help="Fields of the parsed type")
+    return parser.parse_args()
+
+
+# the key function the cache was introduced with, verbatim, as the baseline
+
+# objects nested deeper than this are keyed by their type only, e.g. a model's SDK client
+MAX_OBJECT_DEPTH = 2
+
+
+def encode_item(item: Any, depth: int = 0) -> Any:
+    """A JSON-serializable form of `item` that is the same in every process."""
+    if item is None or isinstance(item, (str, bool, int, float)):
+        return item
+    elif isinstance(item, dict):
+        return {str(k): encode_item(v, depth) for k, v in item.items()}
+    elif isinstance(item, (list, tuple)):
+        return [encode_item(x, depth) for x in item]
+    elif isinstance(item, (set, frozenset)):
+        return sorted([encode_item(x, depth) for x in item], key=json.dumps)
+    elif isinstance(item, Enum):
+        return encode_item(item.value, depth)
+    elif isinstance(item, BaseModel):
+        return {"model": type(item).__qualname__, "data": item.model_dump(mode="json")}
+    elif isinstance(item, type):
+        if issubclass(item, BaseModel):
+            return {"schema": item.model_json_schema()}
+        return {"type": f"{item.__module__}.{item.__qualname__}"}
+    # e.g. the API and its models, keyed by their configuration but not their clients
+    encoded: dict[str, Any] = {"object": f"{type(item).__module__}.{type(item).__qualname__}"}
+    if depth < MAX_OBJECT_DEPTH:
+        for name, value in sorted(getattr(item, "__dict__", {}).items()):
+            if not name.startswith("_"):
+                encoded[name] = encode_item(value, depth + 1)
+    return encoded
+
+
+def hash_func_call(func: Callable[..., Any], args: tuple[Any], kwargs: dict[str, Any]) -> str:
+    bound_args = inspect.signature(func).bind(*args, **kwargs)
+    bound_args.apply_defaults()
+    call = [func.__module__, func.__qualname__, encode_item(bound_args.arguments)]
+    return hashlib.sha256(json.dumps(call, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def make_type(fields: int) -> type[BaseModel]:
+    item = create_model("Item", name=(str, ...), quantity=(int, ...), price=(float, ...))
+    return create_model(
+        "Order",
+        **{f"field_{i}": (list[item] if i % 4 == 0 else str, ...) for i in range(fields)},
+    )
+
+
+def bench(name: str, key: Callable[[], str], iterations: int) -> float:
+    key()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        key()
+    us = (time.perf_counter() - start) / iterations * 1e6
+    print(f"  {name:<10} {us:10.1f} us/key")
+    return us
+
+
+def main() -> None:
+    args = get_args()
+    model = VLLMCompletionModel(model="mock", base_url="http://127.0.0.1:8000")
+    api = API.from_general_model(model)
+    conversation = "\n".join(
+        f"{'User' if i % 2 == 0 else 'Assistant'}: turn {i} " + "lorem ipsum dolor sit amet " * 20
+        for i in range(args.turns)
+    )
+    typ = make_type(args.schema_fields)
+    calls = {
+        "classify": (
+            API.classify,
+            (api,),
+            {
+                "instruction": "Who is responsible for the failure of the conversation?",
+                "text": conversation,
+                "options": ["The user", "The agent", "The environment"],
+            },
+        ),
+        "parse_force": (
+            API.parse_force,
+            (api,),
+            {"instruction": "Extract the order.", "typ": typ, "text": conversation},
+        ),
+    }
+    print(f"{args.iterations} keys per call, {len(conversation)} characters of text")
+    for name, (func, call_args, call_kwargs) in calls.items():
+        print(name)
+        binder = cache.ArgBinder(func)
+        before = bench(
+            "baseline", lambda: hash_func_call(func, call_args, call_kwargs), args.iterations
+        )
+        after = bench(
+            "cache",
+            lambda: cache.hash_func_call(func, call_args, call_kwargs, binder=binder),
+            args.iterations,
+        )
+        print(f"  {before / after:.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# Copyright Sierra
+
+"""Measures environment throughput by running the oracle agent on every task.
+
+Each split is sharded across worker processes. The script reports episodes per second
+overall and per process, and lists every task whose ground truth does not earn a
+reward of 1.0.
+"""
+
+import argparse
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+from tau_bench.agents.oracle_agent import OracleAgent
+from tau_bench.envs import get_env
+from tau_bench.envs.base import Env
+
+SPLITS = {"retail": ["train", "test", "dev"], "airline": ["test"]}
+
+_envs: Dict[Tuple[str, str], Env] = {}
+
+
+def get_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--env", type=str, choices=["retail", "airline", "all"], default="all")
+    parser.add_argument("--processes", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--repeats", type=int, default=1)
+    return parser.parse_args()
+
+
+def load_env(env_name: str, task_split: str) -> Env:
+    key = (env_name, task_split)
+    if key not in _envs:
+        _envs[key] = get_env(
+            env_name,
+            user_strategy="scripted",
+            user_model="",
+            task_split=task_split,
+            task_index=0,
+        )
+    return _envs[key]
+
+
+def num_tasks(env_name: str, task_split: str) -> int:
+    return len(load_env(env_name, task_split).tasks)
+
+
+def run_shard(
+    env_name: str, task_split: str, task_indices: List[int], repeats: int
+) -> Tuple[List[Tuple[int, float]], float]:
+    """Return the reward of each task of the shard and the time spent solving them."""
+    env = load_env(env_name, task_split)
+    agent = OracleAgent()
+    rewards = []
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for task_index in task_indices:
+            rewards.append((task_index, agent.solve(env, task_index=task_index).reward))
+    return rewards, time.perf_counter() - start
+
+
+def main() -> None:
+    args = get_args()
+    env_names = list(SPLITS) if args.env == "all" else [args.env]
+    failures = []
+    with ProcessPoolExecutor(max_workers=args.processes) as executor:
+        for env_name in env_names:
+            for task_split in SPLITS[env_name]:
+                n = num_tasks(env_name, task_split)
+                shards = [list(range(i, n, args.processes)) for i in range(args.processes)]
+                start = time.perf_counter()
+                futures = [
+                    executor.submit(run_shard, env_name, task_split, shard, args.repeats)
+                    for shard in shards
+                    if len(shard) > 0
+                ]
+                results = [future.result() for future in futures]
+                wall = time.perf_counter() - start
+                episodes = sum(len(rewards) for rewards, _ in results)
+                busy = sum(elapsed for _, elapsed in results)
+                for rewards, _ in results:
+                    failures.extend(
+                        (env_name, task_split, task_index, reward)
+                        for task_index, reward in rewards
+                        if reward != 1.0
+                    )
+                print(
+                    f"{env_name}/{task_split}: {episodes} episodes in {wall:.2f}s, "
+                    f"{episodes / wall:.1f} episodes/s, {episodes / busy:.1f} episodes/s per process"
+                )
+    if len(failures) == 0:
+        print("every ground truth earns a reward of 1.0")
+    for env_name, task_split, task_index, reward in sorted(set(failures)):
+        print(f"  {env_name}/{task_split} task {task_index}: reward {reward}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# Copyright Sierra
+
+"""Measures the per-step cost of validating tool arguments in `Env.step`.
+
+Replays the ground-truth tool calls of every task of a domain, with and without
+argument validation, and reports the mean time of a step.
+"""
+
+import argparse
+import time
+from typing import List, Tuple
+
+from tau_bench.envs import get_env
+from tau_bench.envs.base import Env
+from tau_bench.types import Action
+
+
+def get_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--env", type=str, choices=["retail", "airline"], default="retail")
+    parser.add_argument("--task-split", type=str, default="test")
+    parser.add_argument("--repeats", type=int, default=5)
+    return parser.parse_args()
+
+
+def replay(env: Env, actions: List[Tuple[int, Action]]) -> float:
+    """Return the total time spent in `env.step`, reloading the data before each task."""
+    elapsed = 0.0
+    current_task = None
+    for task_index, action in actions:
+        if task_index != current_task:
+            env.data = env.load_data()
+            current_task = task_index
+        start = time.perf_counter()
+        env.step(action)
+        elapsed += time.perf_counter() - start
+    return elapsed
+
+
+def main() -> None:
+    args = get_args()
+    env = get_env(
+        args.env,
+        user_strategy="human",
+        user_model="",
+        task_split=args.task_split,
+        task_index=0,
+    )
+    actions = [
+        (task_index, action)
+        for task_index, task in enumerate(env.tasks)
+        for action in task.actions
+        if action.name in env.tools_map and action.name not in env.terminate_tools
+    ]
+    validator_time = 0.0
+    for _ in range(args.repeats):
+        start = time.perf_counter()
+        for _, action in actions:
+            env.validators[action.name].errors(action.kwargs)
+        validator_time += time.perf_counter() - start
+
+    timings = {}
+    for validate_args in [False, True]:
+        env.validate_args = validate_args
+        timings[validate_args] = min(replay(env, actions) for _ in range(args.repeats))
+
+    num_steps = len(actions)
+    print(f"{num_steps} tool calls from {len(env.tasks)} tasks ({args.env}/{args.task_split})")
+    print(f"validator alone:      {validator_time / args.repeats / num_steps * 1e6:.2f} us/step")
+    print(f"step w/o validation:  {timings[False] / num_steps * 1e6:.2f} us/step")
+    print(f"step with validation: {timings[True] / num_steps * 1e6:.2f} us/step")
+    print(f"validator share:      {validator_time / args.repeats / timings[False] * 100:.2f}%")
+
+
+if __name__ == "__main__":
+    main()
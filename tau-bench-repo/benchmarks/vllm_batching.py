@@ -0,0 +1,116 @@
+# Copyright Sierra
+
+"""Compares unbatched and micro-batched requests to a vLLM-like server.
+
+The stand-in server processes one request at a time, like an engine running one batch
+per forward pass, and each request costs a fixed step time plus a small time per prompt.
+Concurrent callers complete prompts through `VLLMCompletionModel` with and without a
+batching window, and the script reports throughput and latency quantiles.
+"""
+
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from tau_bench.model_utils.model.vllm_completion import VLLMCompletionModel
+
+
+def get_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8123)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests-per-caller", type=int, default=10)
+    parser.add_argument("--step-ms", type=float, default=20.0, help="Server time per request")
+    parser.add_argument("--prompt-ms", type=float, default=0.5, help="Server time per prompt of a request")
+    parser.add_argument("--batch-window-ms", type=float, default=5.0)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    return parser.parse_args()
+
+
+def make_handler(step_ms: float, prompt_ms: float) -> type:
+    engine = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format: str, *args) -> None:
+            pass
+
+        def do_POST(self) -> None:
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            prompts = body["prompt"] if isinstance(body["prompt"], list) else [body["prompt"]]
+            with engine:
+                time.sleep((step_ms + prompt_ms * len(prompts)) / 1000)
+            if self.path.endswith("/generate"):
+                res = {"text": [prompts[0] + " done"]}
+            else:
+                res = {"choices": [{"index": i, "text": " done"} for i in range(len(prompts))]}
+            payload = json.dumps(res).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return Handler
+
+
+def quantile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def bench(model: VLLMCompletionModel, concurrency: int, requests_per_caller: int) -> None:
+    latencies: list[float] = []
+    lock = threading.Lock()
+
+    def caller(i: int) -> None:
+        for j in range(requests_per_caller):
+            start = time.perf_counter()
+            model.generate_from_prompt(f"caller {i} request {j}")
+            with lock:
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(caller, range(concurrency)))
+    elapsed = time.perf_counter() - start
+    print(
+        f"  {len(latencies) / elapsed:8.1f} req/s  p50 {quantile(latencies, 0.5):8.1f} ms  "
+        f"p95 {quantile(latencies, 0.95):8.1f} ms"
+    )
+
+
+def main() -> None:
+    args = get_args()
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(args.step_ms, args.prompt_ms))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{args.port}"
+    print(f"{args.concurrency} callers x {args.requests_per_caller} requests")
+    # both sides use the completions endpoint, which is the only one that takes batches
+    print("unbatched")
+    bench(
+        VLLMCompletionModel(model="mock", base_url=base_url, endpoint="v1/completions"),
+        args.concurrency,
+        args.requests_per_caller,
+    )
+    print(f"batched (window {args.batch_window_ms} ms, max batch {args.max_batch_size})")
+    model = VLLMCompletionModel(
+        model="mock",
+        base_url=base_url,
+        endpoint="v1/completions",
+        batch_window_ms=args.batch_window_ms,
+        max_batch_size=args.max_batch_size,
+    )
+    bench(model, args.concurrency, args.requests_per_caller)
+    print(f"  {model.dispatcher.num_prompts / model.dispatcher.num_batches:.1f} prompts per batch")
+    model.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
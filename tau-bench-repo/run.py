@@ -5,6 +5,7 @@ from tau_bench.types import RunConfig
 from tau_bench.run import run
 from litellm import provider_list
 from tau_bench.envs.user import UserStrategy
+from tau_bench.cassette import CassetteMode
 
 
 def parse_args() -> RunConfig:
@@ -40,7 +41,7 @@ def parse_args() -> RunConfig:
         "--agent-strategy",
         type=str,
         default="tool-calling",
-        choices=["tool-calling", "act", "react", "few-shot"],
+        choices=["tool-calling", "act", "react", "few-shot", "oracle"],
     )
     parser.add_argument(
         "--temperature",
@@ -69,6 +70,81 @@ def parse_args() -> RunConfig:
     parser.add_argument("--shuffle", type=int, default=0)
     parser.add_argument("--user-strategy", type=str, default="llm", choices=[item.value for item in UserStrategy])
     parser.add_argument("--few-shot-displays-path", type=str, help="Path to a jsonlines file containing few shot displays")
+    parser.add_argument(
+        "--parallel-tool-calls",
+        action="store_true",
+        help="Execute every tool call of a turn instead of only the first (tool-calling agent only)",
+    )
+    parser.add_argument(
+        "--history-max-tokens",
+        type=int,
+        help="(Optional) elide old tool outputs to keep the agent's history under this many tokens",
+    )
+    parser.add_argument(
+        "--history-keep-turns",
+        type=int,
+        default=4,
+        help="Number of most recent turns that are never elided",
+    )
+    parser.add_argument(
+        "--stream-actions",
+        action="store_true",
+        help="Stream completions and dispatch the action as soon as its JSON closes (act and react agents only)",
+    )
+    parser.add_argument(
+        "--cassette-dir",
+        type=str,
+        help="(Optional) directory of recorded LLM completions to replay and/or record into",
+    )
+    parser.add_argument(
+        "--cassette-mode",
+        type=str,
+        default="record-missing",
+        choices=[item.value for item in CassetteMode],
+        help="record: always call the provider, replay: never call it, record-missing: only call it for unrecorded requests",
+    )
+    parser.add_argument(
+        "--few-shot-selection",
+        type=str,
+        default="random",
+        choices=["random", "bm25"],
+        help="random: sample the examples for each task, bm25: retrieve the examples most similar to the first user message",
+    )
+    parser.add_argument(
+        "--few-shot-max-tokens",
+        type=int,
+        default=None,
+        help="(Optional) token budget of the retrieved few-shot examples (bm25 selection only)",
+    )
+    parser.add_argument(
+        "--user-cache-path",
+        type=str,
+        default=None,
+        help="(Optional) sqlite file caching the llm and react user simulator messages by conversation prefix across runs",
+    )
+    parser.add_argument(
+        "--user-cache-max-mb",
+        type=int,
+        default=512,
+        help="Size of the user cache above which the least recently used entries are evicted",
+    )
+    parser.add_argument(
+        "--hedge-quantile",
+        type=float,
+        default=None,
+        help="(Optional) send a duplicate of any completion slower than this latency quantile of its model's recent calls, e.g. 0.95",
+    )
+    parser.add_argument(
+        "--hedge-max-rate",
+        type=float,
+        default=0.1,
+        help="Largest fraction of completions that may be hedged",
+    )
+    parser.add_argument(
+        "--validate-args",
+        action="store_true",
+        help="Reject tool calls whose arguments do not match the tool's schema before running them. This changes what the agent observes, so scores are not comparable with runs without it",
+    )
     args = parser.parse_args()
     print(args)
     return RunConfig(
@@ -90,6 +166,19 @@ def parse_args() -> RunConfig:
         shuffle=args.shuffle,
         user_strategy=args.user_strategy,
         few_shot_displays_path=args.few_shot_displays_path,
+        parallel_tool_calls=args.parallel_tool_calls,
+        history_max_tokens=args.history_max_tokens,
+        history_keep_turns=args.history_keep_turns,
+        stream_actions=args.stream_actions,
+        cassette_dir=args.cassette_dir,
+        cassette_mode=args.cassette_mode,
+        few_shot_selection=args.few_shot_selection,
+        few_shot_max_tokens=args.few_shot_max_tokens,
+        user_cache_path=args.user_cache_path,
+        user_cache_max_mb=args.user_cache_max_mb,
+        hedge_quantile=args.hedge_quantile,
+        hedge_max_rate=args.hedge_max_rate,
+        validate_args=args.validate_args,
     )
 
 
@@ -1,10 +1,16 @@
 # Copyright Sierra
 
 import json
-from litellm import completion
+import time
+from litellm import completion_cost
+from tau_bench.ledger import LLMCall, completion, record_call
 
 from tau_bench.agents.base import Agent
+from tau_bench.agents.history import FullHistory, HistoryPolicy, record_history
+from tau_bench.agents.prompt_cache import with_cache_control
+from tau_bench.agents.usage import new_agent_metrics, record_completion
 from tau_bench.envs.base import Env
+from tau_bench.envs.metrics import estimate_tokens
 from tau_bench.types import (
     Action,
     SolveResult,
@@ -23,6 +29,9 @@ class ChatReActAgent(Agent):
         provider: str,
         use_reasoning: bool = True,
         temperature: float = 0.0,
+        prompt_caching: bool = True,
+        history_policy: Optional[HistoryPolicy] = None,
+        stream: bool = False,
     ) -> None:
         instruction = REACT_INSTRUCTION if use_reasoning else ACT_INSTRUCTION
         self.prompt = (
@@ -33,30 +42,97 @@ class ChatReActAgent(Agent):
         self.temperature = temperature
         self.use_reasoning = use_reasoning
         self.tools_info = tools_info
+        self.prompt_caching = prompt_caching
+        self.history_policy = (
+            history_policy if history_policy is not None else FullHistory()
+        )
+        # dispatch the action as soon as its JSON is complete and drop the rest
+        self.stream = stream
 
     def generate_next_step(
-        self, messages: List[Dict[str, Any]]
+        self,
+        messages: List[Dict[str, Any]],
+        agent_metrics: Optional[Dict[str, Any]] = None,
     ) -> Tuple[Dict[str, Any], Action, float]:
+        sent = self.history_policy.apply(messages)
+        if agent_metrics is not None:
+            record_history(agent_metrics, messages, sent)
+        if self.stream:
+            return self.stream_next_step(sent, agent_metrics)
+        start = time.perf_counter()
         res = completion(
             model=self.model,
             custom_llm_provider=self.provider,
-            messages=messages,
+            messages=(
+                with_cache_control(sent, self.model, self.provider)
+                if self.prompt_caching
+                else sent
+            ),
             temperature=self.temperature,
         )
+        if agent_metrics is not None:
+            latency_ms = (time.perf_counter() - start) * 1000
+            record_completion(agent_metrics, res, latency_ms)
+            agent_metrics["time_to_action_ms"].append(latency_ms)
         message = res.choices[0].message
-        action_str = message.content.split("Action:")[-1].strip()
+        action = parse_action(message.content)
+        return message.model_dump(), action, res._hidden_params["response_cost"] or 0.0
+
+    def stream_next_step(
+        self,
+        messages: List[Dict[str, Any]],
+        agent_metrics: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[Dict[str, Any], Action, float]:
+        start = time.perf_counter()
+        stream = completion(
+            model=self.model,
+            custom_llm_provider=self.provider,
+            messages=(
+                with_cache_control(messages, self.model, self.provider)
+                if self.prompt_caching
+                else messages
+            ),
+            temperature=self.temperature,
+            stream=True,
+        )
+        parser = ActionStreamParser()
+        for chunk in stream:
+            delta = chunk.choices[0].delta.content if len(chunk.choices) > 0 else None
+            if delta is not None and parser.feed(delta):
+                close = getattr(getattr(stream, "completion_stream", None), "close", None)
+                if close is not None:
+                    close()
+                break
+        latency_ms = (time.perf_counter() - start) * 1000
+        content = parser.text
         try:
-            action_parsed = json.loads(action_str)
-        except json.JSONDecodeError:
-            # this is a hack
-            action_parsed = {
-                "name": RESPOND_ACTION_NAME,
-                "arguments": {RESPOND_ACTION_FIELD_NAME: action_str},
-            }
-        assert "name" in action_parsed
-        assert "arguments" in action_parsed
-        action = Action(name=action_parsed["name"], kwargs=action_parsed["arguments"])
-        return message.model_dump(), action, res._hidden_params["response_cost"]
+            cost = completion_cost(
+                model=self.model,
+                custom_llm_provider=self.provider,
+                messages=messages,
+                completion=content,
+            )
+        except Exception:
+            cost = 0.0
+        record_call(
+            LLMCall(
+                role="agent",
+                model=self.model,
+                provider=self.provider,
+                # streamed responses carry no usage
+                prompt_tokens=sum(estimate_tokens(str(m["content"])) for m in messages),
+                completion_tokens=estimate_tokens(content),
+                cost=cost,
+                latency_ms=latency_ms,
+            )
+        )
+        if agent_metrics is not None:
+            agent_metrics["llm_turns"] += 1
+            agent_metrics["llm_latency_ms"] += latency_ms
+            agent_metrics["time_to_action_ms"].append(latency_ms)
+            if parser.action_end is not None:
+                agent_metrics["early_actions"] += 1
+        return {"role": "assistant", "content": content}, parser.action(), cost
 
     def solve(
         self, env: Env, task_index: Optional[int] = None, max_num_steps: int = 30
@@ -69,13 +145,19 @@ class ChatReActAgent(Agent):
         ]
         total_cost = 0.0
         info = {}
+        agent_metrics = {
+            **new_agent_metrics(),
+            "time_to_action_ms": [],
+            "early_actions": 0,
+        }
         for _ in range(max_num_steps):
-            message, action, cost = self.generate_next_step(messages)
+            message, action, cost = self.generate_next_step(messages, agent_metrics)
             response = env.step(action)
             obs = response.observation
             reward = response.reward
             info = {**info, **response.info.model_dump()}
             if action.name != RESPOND_ACTION_NAME:
+                agent_metrics["tool_calls"] += 1
                 obs = "API output: " + obs
             messages.extend(
                 [
@@ -89,10 +171,119 @@ class ChatReActAgent(Agent):
         return SolveResult(
             messages=messages,
             reward=reward,
-            info=info,
+            info={**info, "agent_metrics": agent_metrics},
+            total_cost=total_cost,
         )
 
 
+class ActionStreamParser(object):
+    """Finds the end of the `Action:` JSON object while a generation streams in.
+
+    `feed` returns True once the object has closed and parses, at which point `text`
+    ends with it and the rest of the generation can be dropped.
+    """
+
+    def __init__(self) -> None:
+        self.text = ""
+        self.action_end: Optional[int] = None
+        # scan state of the JSON object after the last "Action:" marker
+        self.marker = -1
+        self.start = 0
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        # the text after the marker is not a JSON object, wait for another marker
+        self.dead = False
+        # where the next marker may start, the text before it has been searched
+        self.searched = 0
+
+    def feed(self, delta: str) -> bool:
+        if self.action_end is not None:
+            return True
+        self.text += delta
+        while True:
+            outside = self.depth == 0
+            # inside the object, "Action:" is part of a value and not a new marker
+            marker = self.text.find("Action:", self.searched) if outside else -1
+            if self.scan(len(self.text) if marker == -1 else marker):
+                return True
+            if marker != -1 and self.depth == 0:
+                # a later marker restarts the scan, as in `split("Action:")[-1]`
+                self.marker = marker
+                self.start = self.pos = self.searched = marker + len("Action:")
+                self.in_string, self.escaped, self.dead = False, False, False
+            elif marker == -1 and (outside or self.depth > 0):
+                # the next delta may complete a marker that the text ends with
+                self.searched = max(self.searched, len(self.text) - len("Action:") + 1)
+                return False
+
+    def scan(self, end: int) -> bool:
+        """Scan the text up to `end`, return True once the object has closed and parses."""
+        if self.marker == -1 or self.dead:
+            return False
+        while self.pos < end:
+            c = self.text[self.pos]
+            self.pos += 1
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif c == "\\":
+                    self.escaped = True
+                elif c == '"':
+                    self.in_string = False
+            elif self.depth == 0:
+                if c == "{":
+                    self.start = self.pos - 1
+                    self.depth = 1
+                elif not c.isspace():
+                    self.dead = True
+                    return False
+            elif c == '"':
+                self.in_string = True
+            elif c == "{":
+                self.depth += 1
+            elif c == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    try:
+                        json.loads(self.text[self.start : self.pos])
+                    except json.JSONDecodeError:
+                        # markers inside the object are not searched for again
+                        self.searched = self.pos
+                        self.dead = True
+                        return False
+                    self.action_end = self.pos
+                    self.text = self.text[: self.pos]
+                    return True
+        return False
+
+    def action(self) -> Action:
+        """Return the streamed action, or parse the whole text like a blocking call."""
+        if self.action_end is None:
+            return parse_action(self.text)
+        return action_from_json(json.loads(self.text[self.start : self.action_end]))
+
+
+def parse_action(content: str) -> Action:
+    action_str = content.split("Action:")[-1].strip()
+    try:
+        action_parsed = json.loads(action_str)
+    except json.JSONDecodeError:
+        # this is a hack
+        action_parsed = {
+            "name": RESPOND_ACTION_NAME,
+            "arguments": {RESPOND_ACTION_FIELD_NAME: action_str},
+        }
+    return action_from_json(action_parsed)
+
+
+def action_from_json(action_parsed: Dict[str, Any]) -> Action:
+    assert "name" in action_parsed
+    assert "arguments" in action_parsed
+    return Action(name=action_parsed["name"], kwargs=action_parsed["arguments"])
+
+
 REACT_INSTRUCTION = f"""
 # Instruction
 You need to act as an agent that use the above tools to help the user according to the above policy.
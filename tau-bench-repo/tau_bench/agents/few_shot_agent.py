@@ -2,10 +2,15 @@
 
 import json
 import random
-from litellm import completion
+import time
+from tau_bench.ledger import completion
 from typing import List, Optional, Dict, Any
 
 from tau_bench.agents.base import Agent
+from tau_bench.agents.few_shot_retrieval import FewShotSelector
+from tau_bench.agents.history import FullHistory, HistoryPolicy, record_history
+from tau_bench.agents.prompt_cache import with_cache_control
+from tau_bench.agents.usage import new_agent_metrics, record_completion
 from tau_bench.envs.base import Env
 from tau_bench.types import SolveResult, Action, RESPOND_ACTION_NAME
 
@@ -20,6 +25,9 @@ class FewShotToolCallingAgent(Agent):
         few_shot_displays: List[str],
         temperature: float = 0.0,
         num_few_shots: int = 5,
+        prompt_caching: bool = True,
+        history_policy: Optional[HistoryPolicy] = None,
+        few_shot_selector: Optional[FewShotSelector] = None,
     ):
         self.tools_info = tools_info
         self.wiki = wiki
@@ -32,35 +40,55 @@ class FewShotToolCallingAgent(Agent):
         self.few_shot_displays = few_shot_displays
         self.temperature = temperature
         self.num_few_shots = num_few_shots
+        self.prompt_caching = prompt_caching
+        self.history_policy = (
+            history_policy if history_policy is not None else FullHistory()
+        )
+        # retrieve the examples closest to the first user message instead of sampling them
+        self.few_shot_selector = few_shot_selector
+
     def solve(
         self, env: Env, task_index: Optional[int] = None, max_num_steps: int = 30
     ) -> SolveResult:
-        sampled_few_shot_displays = random.sample(self.few_shot_displays, self.num_few_shots)
-        few_shots = "\n\n".join([f"Example {i+1}:\n{display}" for i, display in enumerate(sampled_few_shot_displays)])
+        if self.few_shot_selector is None:
+            sampled_few_shot_displays = random.sample(self.few_shot_displays, self.num_few_shots)
+            few_shots = "\n\n".join([f"Example {i+1}:\n{display}" for i, display in enumerate(sampled_few_shot_displays)])
         total_cost = 0.0
         env_reset_res = env.reset(task_index=task_index)
         obs = env_reset_res.observation
+        if self.few_shot_selector is not None:
+            few_shots = self.few_shot_selector.render(obs)
         info = env_reset_res.info.model_dump()
         reward = 0.0
+        agent_metrics = new_agent_metrics()
         messages: List[Dict[str, Any]] = [
             {"role": "system", "content": f"{self.wiki}\n\n{few_shots}"},
             {"role": "user", "content": obs},
         ]
         for _ in range(max_num_steps):
+            sent = self.history_policy.apply(messages)
+            record_history(agent_metrics, messages, sent)
+            start = time.perf_counter()
             res = completion(
-                messages=messages,
+                messages=(
+                    with_cache_control(sent, self.model, self.provider)
+                    if self.prompt_caching
+                    else sent
+                ),
                 model=self.model,
                 custom_llm_provider=self.provider,
                 tools=self.tools_info,
                 temperature=self.temperature,
             )
             next_message = res.choices[0].message.model_dump()
-            total_cost += res._hidden_params["response_cost"]
+            total_cost += res._hidden_params["response_cost"] or 0
+            record_completion(agent_metrics, res, (time.perf_counter() - start) * 1000)
             action = message_to_action(next_message)
             env_response = env.step(action)
             reward = env_response.reward
             info = {**info, **env_response.info.model_dump()}
             if action.name != RESPOND_ACTION_NAME:
+                agent_metrics["tool_calls"] += 1
                 next_message["tool_calls"] = next_message["tool_calls"][:1]
                 messages.extend(
                     [
@@ -84,7 +112,7 @@ class FewShotToolCallingAgent(Agent):
                 break
         return SolveResult(
             reward=reward,
-            info=info,
+            info={**info, "agent_metrics": agent_metrics},
             messages=messages,
             total_cost=total_cost,
         )
@@ -0,0 +1,177 @@
+# Copyright Sierra
+
+import json
+import math
+import os
+import re
+import sys
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from tau_bench.envs.metrics import estimate_tokens
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "can", "do", "for", "from",
+    "have", "hi", "i", "if", "in", "is", "it", "me", "my", "of", "on", "or", "please",
+    "so", "that", "the", "this", "to", "want", "was", "with", "would", "you", "your",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def user_text(display: str) -> str:
+    """Return the user turns of a display, which is what a task's first message resembles."""
+    return "\n".join(
+        line[len("user: ") :] for line in display.split("\n") if line.startswith("user: ")
+    )
+
+
+class BM25Index(object):
+    def __init__(
+        self,
+        term_freqs: List[Dict[str, int]],
+        doc_lengths: List[int],
+        k1: float = 1.5,
+        b: float = 0.75,
+    ) -> None:
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_length = sum(doc_lengths) / max(len(doc_lengths), 1)
+        doc_freqs: Counter = Counter()
+        for freqs in term_freqs:
+            doc_freqs.update(freqs.keys())
+        n = len(term_freqs)
+        self.idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freqs.items()
+        }
+
+    @classmethod
+    def build(cls, documents: List[str], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        tokens = [tokenize(document) for document in documents]
+        return cls(
+            term_freqs=[dict(Counter(t)) for t in tokens],
+            doc_lengths=[len(t) for t in tokens],
+            k1=k1,
+            b=b,
+        )
+
+    def scores(self, query: str) -> List[float]:
+        terms = set(tokenize(query))
+        scores = []
+        for freqs, length in zip(self.term_freqs, self.doc_lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / self.avg_doc_length)
+            score = 0.0
+            for term in terms:
+                tf = freqs.get(term, 0)
+                if tf > 0:
+                    score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            scores.append(score)
+        return scores
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "term_freqs": self.term_freqs,
+            "doc_lengths": self.doc_lengths,
+            "k1": self.k1,
+            "b": self.b,
+        }
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "BM25Index":
+        return cls(**d)
+
+
+def index_path(displays_path: str) -> str:
+    return f"{displays_path}.bm25.json"
+
+
+def load_displays(displays_path: str) -> List[str]:
+    with open(displays_path, "r") as f:
+        return [json.loads(line)["messages_display"] for line in f]
+
+
+def build_index(displays_path: str) -> BM25Index:
+    """Index the displays of `displays_path` and save the index next to it."""
+    index = BM25Index.build([user_text(display) for display in load_displays(displays_path)])
+    with open(index_path(displays_path), "w") as f:
+        json.dump(index.to_dict(), f)
+    return index
+
+
+def load_index(displays_path: str, displays: List[str]) -> BM25Index:
+    """Load the precomputed index of `displays_path`, or build it in memory if it is stale."""
+    path = index_path(displays_path)
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(displays_path):
+        with open(path, "r") as f:
+            index = BM25Index.from_dict(json.load(f))
+        if len(index.doc_lengths) == len(displays):
+            return index
+    return BM25Index.build([user_text(display) for display in displays])
+
+
+class FewShotSelector(object):
+    """Picks the `k` displays most relevant to a task's first user message.
+
+    Displays are taken by decreasing BM25 score as long as the examples fit in
+    `max_tokens`. Rendered examples are cached by selection, tasks that open alike
+    share the same prompt.
+    """
+
+    def __init__(
+        self,
+        displays: List[str],
+        index: BM25Index,
+        k: int = 5,
+        max_tokens: Optional[int] = None,
+    ) -> None:
+        self.displays = displays
+        self.index = index
+        self.k = k
+        self.max_tokens = max_tokens
+        self.display_tokens = [estimate_tokens(display) for display in displays]
+        self.rendered: Dict[Tuple[int, ...], str] = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_path(
+        cls, displays_path: str, k: int = 5, max_tokens: Optional[int] = None
+    ) -> "FewShotSelector":
+        displays = load_displays(displays_path)
+        return cls(displays, load_index(displays_path, displays), k=k, max_tokens=max_tokens)
+
+    def select(self, query: str) -> Tuple[int, ...]:
+        scores = self.index.scores(query)
+        ranked = sorted(range(len(self.displays)), key=lambda i: (-scores[i], i))
+        selected = []
+        tokens = 0
+        for i in ranked:
+            if len(selected) == self.k:
+                break
+            if self.max_tokens is not None and tokens + self.display_tokens[i] > self.max_tokens:
+                continue
+            selected.append(i)
+            tokens += self.display_tokens[i]
+        return tuple(selected)
+
+    def render(self, query: str) -> str:
+        selected = self.select(query)
+        with self.lock:
+            if selected not in self.rendered:
+                self.rendered[selected] = "\n\n".join(
+                    [f"Example {i+1}:\n{self.displays[j]}" for i, j in enumerate(selected)]
+                )
+            return self.rendered[selected]
+
+
+if __name__ == "__main__":
+    # python -m tau_bench.agents.few_shot_retrieval few_shot_data/*.jsonl
+    for path in sys.argv[1:]:
+        index = build_index(path)
+        print(f"Indexed {len(index.doc_lengths)} displays of {path} into {index_path(path)}")
@@ -0,0 +1,117 @@
+# Copyright Sierra
+
+import abc
+from typing import Any, Dict, List, Optional
+
+from tau_bench.envs.metrics import estimate_tokens
+
+# the ReAct agents return tool outputs as user messages with this prefix
+TOOL_OUTPUT_PREFIXES = ["API output: "]
+
+
+def message_tokens(message: Dict[str, Any]) -> int:
+    content = message.get("content")
+    tokens = estimate_tokens(content) if isinstance(content, str) else 0
+    for tool_call in message.get("tool_calls") or []:
+        tokens += estimate_tokens(tool_call["function"]["arguments"] or "")
+    return tokens
+
+
+def is_tool_output(message: Dict[str, Any]) -> bool:
+    if message["role"] == "tool":
+        return True
+    return (
+        message["role"] == "user"
+        and isinstance(message.get("content"), str)
+        and any(message["content"].startswith(prefix) for prefix in TOOL_OUTPUT_PREFIXES)
+    )
+
+
+class HistoryPolicy(abc.ABC):
+    """Decides which part of the conversation is sent with each completion call.
+
+    Policies return a new list and never modify the transcript they are given.
+    """
+
+    @abc.abstractmethod
+    def apply(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+
+class FullHistory(HistoryPolicy):
+    def apply(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return messages
+
+
+class TokenBudgetHistory(HistoryPolicy):
+    """Elides old tool outputs, oldest first, until the history fits in `max_tokens`.
+
+    The system prompt and the last `keep_recent_turns` turns (an assistant message and
+    the messages answering it) are always sent verbatim. An elided output keeps its first
+    `summary_chars` characters, which usually hold the ids the agent needs to refer back
+    to it. The budget is a target, the history may stay above it once nothing is left to
+    elide.
+    """
+
+    def __init__(
+        self, max_tokens: int, keep_recent_turns: int = 4, summary_chars: int = 200
+    ) -> None:
+        self.max_tokens = max_tokens
+        self.keep_recent_turns = keep_recent_turns
+        self.summary_chars = summary_chars
+
+    def recent_start(self, messages: List[Dict[str, Any]]) -> int:
+        """Return the index of the first message of the turns kept verbatim."""
+        turns = 0
+        for i in range(len(messages) - 1, 0, -1):
+            if messages[i]["role"] == "assistant":
+                turns += 1
+                if turns == self.keep_recent_turns:
+                    return i
+        return 1
+
+    def elide(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        content = message["content"]
+        elided = len(content) - self.summary_chars
+        return {
+            **message,
+            "content": f"{content[: self.summary_chars]}... [{elided} characters elided]",
+        }
+
+    def apply(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        tokens = [message_tokens(message) for message in messages]
+        total = sum(tokens)
+        if total <= self.max_tokens:
+            return messages
+        compacted = list(messages)
+        for i in range(1, self.recent_start(messages)):
+            if total <= self.max_tokens:
+                break
+            message = messages[i]
+            if not is_tool_output(message) or len(message["content"]) <= self.summary_chars:
+                continue
+            compacted[i] = self.elide(message)
+            total += message_tokens(compacted[i]) - tokens[i]
+        return compacted
+
+
+def get_history_policy(
+    max_tokens: Optional[int], keep_recent_turns: int = 4
+) -> HistoryPolicy:
+    if max_tokens is None:
+        return FullHistory()
+    return TokenBudgetHistory(max_tokens=max_tokens, keep_recent_turns=keep_recent_turns)
+
+
+def record_history(
+    agent_metrics: Dict[str, Any],
+    messages: List[Dict[str, Any]],
+    sent: List[Dict[str, Any]],
+) -> None:
+    """Count the tokens a history policy kept out of one completion call."""
+    if sent is messages:
+        return
+    saved = sum(message_tokens(m) for m in messages) - sum(message_tokens(m) for m in sent)
+    agent_metrics["history_tokens_saved"] += saved
+    if saved > 0:
+        agent_metrics["compacted_turns"] += 1
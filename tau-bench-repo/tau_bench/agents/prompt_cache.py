@@ -0,0 +1,43 @@
+# Copyright Sierra
+
+from typing import Any, Dict, List, Optional
+
+# providers that only reuse a cached prompt prefix when the request marks where it ends
+CACHE_CONTROL_PROVIDERS = ["anthropic", "bedrock", "vertex_ai"]
+
+EPHEMERAL_CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def supports_cache_control(model: str, provider: Optional[str]) -> bool:
+    if provider == "anthropic":
+        return True
+    return provider in CACHE_CONTROL_PROVIDERS and "claude" in model
+
+
+def with_cache_control(
+    messages: List[Dict[str, Any]], model: str, provider: Optional[str]
+) -> List[Dict[str, Any]]:
+    """Return the messages to send, with the static system prompt marked as cacheable.
+
+    Tools are rendered before the system prompt, so the breakpoint covers both. Providers
+    that cache prefixes automatically (e.g. OpenAI) only need the prefix to be
+    byte-stable, so the messages are returned as is. The transcript is never modified.
+    """
+    if (
+        len(messages) == 0
+        or messages[0]["role"] != "system"
+        or not isinstance(messages[0]["content"], str)
+        or not supports_cache_control(model, provider)
+    ):
+        return messages
+    system = {
+        **messages[0],
+        "content": [
+            {
+                "type": "text",
+                "text": messages[0]["content"],
+                "cache_control": EPHEMERAL_CACHE_CONTROL,
+            }
+        ],
+    }
+    return [system] + messages[1:]
@@ -1,12 +1,24 @@
 # Copyright Sierra
 
 import json
-from litellm import completion
+import time
+from concurrent.futures import ThreadPoolExecutor
+from tau_bench.ledger import completion
 from typing import List, Optional, Dict, Any
 
 from tau_bench.agents.base import Agent
+from tau_bench.agents.history import FullHistory, HistoryPolicy, record_history
+from tau_bench.agents.prompt_cache import with_cache_control
+from tau_bench.agents.usage import new_agent_metrics, record_completion
 from tau_bench.envs.base import Env
-from tau_bench.types import SolveResult, Action, RESPOND_ACTION_NAME
+from tau_bench.types import SolveResult, Action, EnvResponse, RESPOND_ACTION_NAME
+
+# read-only tool calls only read the data and never wait on each other, so one pool
+# serves the tool calls of every episode
+MAX_CONCURRENT_TOOL_CALLS = 16
+_tool_pool = ThreadPoolExecutor(
+    max_workers=MAX_CONCURRENT_TOOL_CALLS, thread_name_prefix="tool-calls"
+)
 
 
 class ToolCallingAgent(Agent):
@@ -17,12 +29,21 @@ class ToolCallingAgent(Agent):
         model: str,
         provider: str,
         temperature: float = 0.0,
+        parallel_tool_calls: bool = False,
+        prompt_caching: bool = True,
+        history_policy: Optional[HistoryPolicy] = None,
     ):
         self.tools_info = tools_info
         self.wiki = wiki
         self.model = model
         self.provider = provider
         self.temperature = temperature
+        # execute every tool call of a turn instead of only the first one
+        self.parallel_tool_calls = parallel_tool_calls
+        self.prompt_caching = prompt_caching
+        self.history_policy = (
+            history_policy if history_policy is not None else FullHistory()
+        )
 
     def solve(
         self, env: Env, task_index: Optional[int] = None, max_num_steps: int = 30
@@ -32,13 +53,25 @@ class ToolCallingAgent(Agent):
         obs = env_reset_res.observation
         info = env_reset_res.info.model_dump()
         reward = 0.0
+        agent_metrics = {
+            **new_agent_metrics(),
+            "turns_saved": 0,
+            "prompt_tokens_saved": 0,
+        }
         messages: List[Dict[str, Any]] = [
             {"role": "system", "content": self.wiki},
             {"role": "user", "content": obs},
         ]
         for _ in range(max_num_steps):
+            sent = self.history_policy.apply(messages)
+            record_history(agent_metrics, messages, sent)
+            start = time.perf_counter()
             res = completion(
-                messages=messages,
+                messages=(
+                    with_cache_control(sent, self.model, self.provider)
+                    if self.prompt_caching
+                    else sent
+                ),
                 model=self.model,
                 custom_llm_provider=self.provider,
                 tools=self.tools_info,
@@ -46,11 +79,47 @@ class ToolCallingAgent(Agent):
             )
             next_message = res.choices[0].message.model_dump()
             total_cost += res._hidden_params["response_cost"] or 0
+            usage = record_completion(
+                agent_metrics, res, (time.perf_counter() - start) * 1000
+            )
             action = message_to_action(next_message)
+            if self.parallel_tool_calls and action.name != RESPOND_ACTION_NAME:
+                actions = [
+                    tool_call_to_action(tool_call)
+                    for tool_call in next_message["tool_calls"]
+                ]
+                env_responses = execute_tool_calls(env, actions)
+                next_message["tool_calls"] = next_message["tool_calls"][
+                    : len(env_responses)
+                ]
+                messages.append(next_message)
+                for tool_call, env_response in zip(
+                    next_message["tool_calls"], env_responses
+                ):
+                    info = {**info, **env_response.info.model_dump()}
+                    messages.append(
+                        {
+                            "role": "tool",
+                            "tool_call_id": tool_call["id"],
+                            "name": tool_call["function"]["name"],
+                            "content": env_response.observation,
+                        }
+                    )
+                reward = env_responses[-1].reward
+                agent_metrics["tool_calls"] += len(env_responses)
+                # each extra call would otherwise have cost a turn resending the prompt
+                agent_metrics["turns_saved"] += len(env_responses) - 1
+                agent_metrics["prompt_tokens_saved"] += (
+                    len(env_responses) - 1
+                ) * usage["prompt_tokens"]
+                if env_responses[-1].done:
+                    break
+                continue
             env_response = env.step(action)
             reward = env_response.reward
             info = {**info, **env_response.info.model_dump()}
             if action.name != RESPOND_ACTION_NAME:
+                agent_metrics["tool_calls"] += 1
                 next_message["tool_calls"] = next_message["tool_calls"][:1]
                 messages.extend(
                     [
@@ -74,20 +143,50 @@ class ToolCallingAgent(Agent):
                 break
         return SolveResult(
             reward=reward,
-            info=info,
+            info={**info, "agent_metrics": agent_metrics},
             messages=messages,
             total_cost=total_cost,
         )
 
 
+def execute_tool_calls(env: Env, actions: List[Action]) -> List[EnvResponse]:
+    """Run the tool calls of one turn in order and return their responses.
+
+    Consecutive calls to read-only tools run concurrently and are then recorded in the
+    order they were made, every other call runs alone once the calls before it are done.
+    Calls after one that ends the episode are not run.
+    """
+    env_responses: List[EnvResponse] = []
+    i = 0
+    while i < len(actions):
+        j = i
+        while j < len(actions) and actions[j].name in env.read_only_tools:
+            j += 1
+        if j - i > 1:
+            results = list(_tool_pool.map(env.run_tool, actions[i:j]))
+            for action, result in zip(actions[i:j], results):
+                env_responses.append(env.record_tool_call(action, result))
+            i = j
+            continue
+        env_response = env.step(actions[i])
+        env_responses.append(env_response)
+        if env_response.done:
+            break
+        i += 1
+    return env_responses
+
+
+def tool_call_to_action(tool_call: Dict[str, Any]) -> Action:
+    return Action(
+        name=tool_call["function"]["name"],
+        kwargs=json.loads(tool_call["function"]["arguments"]),
+    )
+
+
 def message_to_action(
     message: Dict[str, Any],
 ) -> Action:
     if "tool_calls" in message and message["tool_calls"] is not None and len(message["tool_calls"]) > 0 and message["tool_calls"][0]["function"] is not None:
-        tool_call = message["tool_calls"][0]
-        return Action(
-            name=tool_call["function"]["name"],
-            kwargs=json.loads(tool_call["function"]["arguments"]),
-        )
+        return tool_call_to_action(message["tool_calls"][0])
     else:
         return Action(name=RESPOND_ACTION_NAME, kwargs={"content": message["content"]})
@@ -0,0 +1,59 @@
+# Copyright Sierra
+
+from typing import Any, Dict
+
+
+def new_agent_metrics() -> Dict[str, Any]:
+    """Per-task counters of the LLM calls an agent makes, stored in `info["agent_metrics"]`."""
+    return {
+        "llm_turns": 0,
+        "llm_latency_ms": 0.0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "cached_prompt_tokens": 0,
+        "cache_creation_tokens": 0,
+        "tool_calls": 0,
+        "history_tokens_saved": 0,
+        "compacted_turns": 0,
+    }
+
+
+def get_usage(res: Any) -> Dict[str, int]:
+    """Return the token counts of a completion, including prompt-cache reads and writes.
+
+    Providers report cache usage under different names, litellm normalizes most of them
+    into `prompt_tokens_details`.
+    """
+    usage = getattr(res, "usage", None)
+    if usage is None:
+        return {
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "cached_prompt_tokens": 0,
+            "cache_creation_tokens": 0,
+        }
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) or getattr(
+        usage, "cache_read_input_tokens", None
+    )
+    created = getattr(details, "cache_creation_tokens", None) or getattr(
+        usage, "cache_creation_input_tokens", None
+    )
+    return {
+        "prompt_tokens": usage.prompt_tokens or 0,
+        "completion_tokens": usage.completion_tokens or 0,
+        "cached_prompt_tokens": cached or 0,
+        "cache_creation_tokens": created or 0,
+    }
+
+
+def record_completion(
+    agent_metrics: Dict[str, Any], res: Any, latency_ms: float
+) -> Dict[str, int]:
+    """Add one completion to `agent_metrics` and return its token counts."""
+    usage = get_usage(res)
+    agent_metrics["llm_turns"] += 1
+    agent_metrics["llm_latency_ms"] += latency_ms
+    for key, count in usage.items():
+        agent_metrics[key] += count
+    return usage
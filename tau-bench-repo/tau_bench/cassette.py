@@ -0,0 +1,250 @@
+# Copyright Sierra
+
+import contextlib
+import contextvars
+import enum
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Any, Dict, Iterator, Optional
+
+import litellm
+
+
+class CassetteMode(enum.Enum):
+    RECORD = "record"
+    REPLAY = "replay"
+    RECORD_MISSING = "record-missing"
+
+
+class CassetteMissError(KeyError):
+    pass
+
+
+def normalize(value: Any) -> Any:
+    """Drop what does not change a completion: unset fields and provider cache hints.
+
+    Messages that went through `model_dump` carry `None` for every unset field, and
+    cacheable system prompts are sent as a single text block. Both normalize to the
+    plain message.
+    """
+    if isinstance(value, dict):
+        return {
+            key: normalize(v)
+            for key, v in value.items()
+            if v is not None and key != "cache_control"
+        }
+    if isinstance(value, list):
+        if len(value) > 0 and all(
+            isinstance(block, dict) and block.get("type") == "text" for block in value
+        ):
+            return "".join(block["text"] for block in value)
+        return [normalize(v) for v in value]
+    if hasattr(value, "model_dump"):
+        return normalize(value.model_dump())
+    return value
+
+
+class Episode(object):
+    """One episode (a task of a trial) and how many times it made each request so far."""
+
+    def __init__(self, trial: int = 0, task: Optional[int] = None) -> None:
+        self.trial = trial
+        self.task = task
+        self.counts: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def occurrence(self, key: str, call: Dict[str, int]) -> int:
+        """Return the occurrence of request `key` for the logical call `call`.
+
+        The first attempt of a call takes the next occurrence of its request, later
+        attempts of the same call (retries, hedges) reuse it.
+        """
+        with self.lock:
+            if key not in call:
+                call[key] = self.counts.get(key, 0)
+                self.counts[key] = call[key] + 1
+            return call[key]
+
+
+_episode: contextvars.ContextVar[Optional[Episode]] = contextvars.ContextVar(
+    "cassette_episode", default=None
+)
+_call: contextvars.ContextVar[Optional[Dict[str, int]]] = contextvars.ContextVar(
+    "cassette_call", default=None
+)
+
+
+@contextlib.contextmanager
+def episode(current: Episode) -> Iterator[Episode]:
+    """Key the completions of the current thread to the episode `current`.
+
+    Trials repeat the same requests, different tasks may make the same request (e.g.
+    the agent's first turn when two users open the same way), and an episode may repeat
+    a request too (e.g. a user simulator sampling several candidates). Each of them gets
+    its own entry, so replaying an episode returns what it recorded in the same order. Every completion
+    of an episode, from creating its env on, must be made under the same `Episode`.
+    """
+    token = _episode.set(current)
+    try:
+        yield current
+    finally:
+        _episode.reset(token)
+
+
+@contextlib.contextmanager
+def call_scope() -> Iterator[None]:
+    """Make every attempt of one logical completion share a single cassette entry."""
+    token = _call.set({})
+    try:
+        yield
+    finally:
+        _call.reset(token)
+
+
+def request_key(
+    kwargs: Dict[str, Any],
+    trial: int = 0,
+    task: Optional[int] = None,
+    occurrence: int = 0,
+) -> str:
+    request = {
+        "model": kwargs.get("model"),
+        "provider": kwargs.get("custom_llm_provider"),
+        "messages": normalize(kwargs.get("messages", [])),
+        "tools": normalize(kwargs.get("tools")),
+        "temperature": kwargs.get("temperature"),
+        "stream": bool(kwargs.get("stream", False)),
+    }
+    # only set fields are keyed, so a request made outside an episode keeps its plain key
+    if trial > 0:
+        request["trial"] = trial
+    if task is not None:
+        request["task"] = task
+    if occurrence > 0:
+        request["occurrence"] = occurrence
+    encoded = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def entry_key(kwargs: Dict[str, Any]) -> str:
+    """Return the key of the request `kwargs` in the current episode and call."""
+    current = _episode.get()
+    if current is None:
+        return request_key(kwargs)
+    key = request_key(kwargs, trial=current.trial, task=current.task)
+    call = _call.get()
+    occurrence = current.occurrence(key, call if call is not None else {})
+    if occurrence == 0:
+        return key
+    return request_key(
+        kwargs, trial=current.trial, task=current.task, occurrence=occurrence
+    )
+
+
+class Cassette(object):
+    """A directory of recorded completions, one JSON file per request key.
+
+    In `record` mode every call goes to the provider and is stored, in `replay` mode
+    every call must be on the cassette, and in `record-missing` mode only the calls that
+    are not on the cassette go to the provider.
+    """
+
+    def __init__(self, path: str, mode: CassetteMode = CassetteMode.RECORD_MISSING) -> None:
+        self.path = path
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], f"{key}.json")
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.entry_path(key), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, key: str, entry: Dict[str, Any]) -> None:
+        path = self.entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # concurrent writers of the same key write the same content, the last one wins
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def completion(self, **kwargs: Any) -> Any:
+        key = entry_key(kwargs)
+        entry = self.load(key) if self.mode != CassetteMode.RECORD else None
+        with self.lock:
+            if entry is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if entry is not None:
+            return replay_entry(entry, kwargs)
+        if self.mode == CassetteMode.REPLAY:
+            raise CassetteMissError(f"No recorded completion for {kwargs.get('model')} ({key})")
+        res = litellm.completion(**kwargs)
+        if kwargs.get("stream", False):
+            return self.record_stream(key, res)
+        self.save(
+            key,
+            {
+                "response": res.model_dump(),
+                "response_cost": res._hidden_params.get("response_cost"),
+            },
+        )
+        return res
+
+    def record_stream(self, key: str, stream: Any) -> Iterator[Any]:
+        """Pass a stream through and record the text its consumer read.
+
+        Consumers may stop reading early, replaying the entry yields the same text.
+        """
+        content = []
+        try:
+            for chunk in stream:
+                if len(chunk.choices) > 0 and chunk.choices[0].delta.content is not None:
+                    content.append(chunk.choices[0].delta.content)
+                yield chunk
+        finally:
+            self.save(key, {"stream_content": "".join(content), "response_cost": None})
+
+
+def replay_entry(entry: Dict[str, Any], kwargs: Dict[str, Any]) -> Any:
+    if "stream_content" in entry:
+        # litellm mocks never reach the network, but still resolve the provider from the
+        # routing arguments of the request
+        return litellm.completion(
+            **{**kwargs, "mock_response": entry["stream_content"], "stream": True}
+        )
+    res = litellm.ModelResponse(**entry["response"])
+    res._hidden_params["response_cost"] = entry["response_cost"]
+    return res
+
+
+_cassette: Optional[Cassette] = None
+
+
+def use_cassette(cassette: Optional[Cassette]) -> None:
+    """Route every `completion` call through `cassette`, or straight to litellm if None."""
+    global _cassette
+    _cassette = cassette
+
+
+def get_cassette() -> Optional[Cassette]:
+    return _cassette
+
+
+def completion(**kwargs: Any) -> Any:
+    """Drop-in replacement for `litellm.completion` that honors the active cassette."""
+    if _cassette is None:
+        return litellm.completion(**kwargs)
+    return _cassette.completion(**kwargs)
@@ -12,6 +12,7 @@ def get_env(
     task_split: str,
     user_provider: Optional[str] = None,
     task_index: Optional[int] = None,
+    validate_args: bool = False,
 ) -> Env:
     if env_name == "retail":
         from tau_bench.envs.retail import MockRetailDomainEnv
@@ -22,6 +23,7 @@ def get_env(
             task_split=task_split,
             user_provider=user_provider,
             task_index=task_index,
+            validate_args=validate_args,
         )
     elif env_name == "airline":
         from tau_bench.envs.airline import MockAirlineDomainEnv
@@ -32,6 +34,7 @@ def get_env(
             task_split=task_split,
             user_provider=user_provider,
             task_index=task_index,
+            validate_args=validate_args,
         )
     else:
         raise ValueError(f"Unknown environment: {env_name}")
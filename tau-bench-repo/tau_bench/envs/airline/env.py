@@ -1,6 +1,7 @@
 # Copyright Sierra
 
 from tau_bench.envs.airline.data import load_data
+from tau_bench.envs.airline.indexes import CACHED_TABLES, DERIVED_TABLES, INDEXES
 from tau_bench.envs.airline.rules import RULES
 from tau_bench.envs.airline.tools import ALL_TOOLS
 from tau_bench.envs.airline.wiki import WIKI
@@ -17,6 +18,7 @@ class MockAirlineDomainEnv(Env):
         user_provider: Optional[str] = None,
         task_split: str = "test",
         task_index: Optional[int] = None,
+        validate_args: bool = False,
     ):
         match task_split:
             case "test":
@@ -33,5 +35,17 @@ class MockAirlineDomainEnv(Env):
             user_model=user_model,
             user_provider=user_provider,
             task_index=task_index,
+            indexes=INDEXES,
+            cached_tables=CACHED_TABLES + DERIVED_TABLES,
+            validate_args=validate_args,
         )
         self.terminate_tools = ["transfer_to_human_agents"]
+        self.read_only_tools = [
+            "calculate",
+            "get_reservation_details",
+            "get_user_details",
+            "list_all_airports",
+            "search_direct_flight",
+            "search_onestop_flight",
+            "think",
+        ]
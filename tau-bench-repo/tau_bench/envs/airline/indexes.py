@@ -0,0 +1,13 @@
+# Copyright Sierra
+
+from typing import List
+
+from tau_bench.envs.index import IndexSpec
+
+# no airline tool looks records up by a field value
+INDEXES: List[IndexSpec] = []
+
+# tables whose records are serialized whole by the get_*_details tools
+CACHED_TABLES = ["users", "reservations"]
+# tables with state derived from the whole table, rebuilt once they change
+DERIVED_TABLES = ["flights"]
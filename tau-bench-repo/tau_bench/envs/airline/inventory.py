@@ -0,0 +1,281 @@
+# Copyright Sierra
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from tau_bench.envs.index import _TableState, get_registry
+
+CABINS = ["basic_economy", "economy", "business"]
+AVAILABLE_STATUS = "available"
+NO_RECORD = -1
+
+
+class FlightInventory(object):
+    """Columnar view of `data["flights"]` as flight x date x cabin arrays.
+
+    Rows follow the iteration order of the flights table and columns follow the sorted
+    dates, so results come back in the same order a scan over the table would produce.
+    Seat and status changes must go through the `set_*`/`reserve_seats`/`release_seats`
+    methods, which write through to the underlying records and keep the arrays in sync.
+
+    When `state` is given, `flights` is a tracked table and `revision` is the table
+    revision the arrays reflect.
+    """
+
+    def __init__(
+        self, flights: Dict[str, Any], state: Optional[_TableState] = None
+    ) -> None:
+        self.flights = flights
+        self.state = state
+        self.revision = state.revision if state is not None else 0
+        # read the records without making the table track every one of them
+        records = list(dict.values(flights))
+        self.flight_numbers: List[str] = list(dict.keys(flights))
+        self.flight_index = {
+            flight_number: i for i, flight_number in enumerate(self.flight_numbers)
+        }
+        self.dates: List[str] = sorted(
+            {date for flight in records for date in flight["dates"]}
+        )
+        self.date_index = {date: i for i, date in enumerate(self.dates)}
+        self.cabin_index = {cabin: i for i, cabin in enumerate(CABINS)}
+        self.airports: List[str] = sorted(
+            {flight["origin"] for flight in records}
+            | {flight["destination"] for flight in records}
+        )
+        self.airport_index = {airport: i for i, airport in enumerate(self.airports)}
+        self.statuses: List[str] = sorted(
+            {
+                date_data["status"]
+                for flight in records
+                for date_data in flight["dates"].values()
+            }
+            | {AVAILABLE_STATUS}
+        )
+        self.status_index = {status: i for i, status in enumerate(self.statuses)}
+
+        num_flights, num_dates, num_cabins = (
+            len(self.flight_numbers),
+            len(self.dates),
+            len(CABINS),
+        )
+        self.origin = np.empty(num_flights, dtype=np.int32)
+        self.destination = np.empty(num_flights, dtype=np.int32)
+        self.status = np.full((num_flights, num_dates), NO_RECORD, dtype=np.int16)
+        self.seats = np.zeros((num_flights, num_dates, num_cabins), dtype=np.int64)
+        self.prices = np.full((num_flights, num_dates, num_cabins), np.nan)
+        for i, flight in enumerate(records):
+            self.origin[i] = self.airport_index[flight["origin"]]
+            self.destination[i] = self.airport_index[flight["destination"]]
+            for date, date_data in flight["dates"].items():
+                self._load_date(i, self.date_index[date], date_data)
+
+    def _load_date(self, i: int, j: int, date_data: Dict[str, Any]) -> None:
+        self.status[i, j] = self.status_index[date_data["status"]]
+        available_seats = date_data.get("available_seats", {})
+        prices = date_data.get("prices", {})
+        for cabin, k in self.cabin_index.items():
+            self.seats[i, j, k] = available_seats.get(cabin, 0)
+            self.prices[i, j, k] = prices.get(cabin, np.nan)
+
+    def _airport_code(self, airport: str) -> int:
+        return self.airport_index.get(airport, NO_RECORD)
+
+    def _route_rows(self, origin: Optional[str], destination: Optional[str]) -> np.ndarray:
+        rows = np.ones(len(self.flight_numbers), dtype=bool)
+        if origin is not None:
+            rows &= self.origin == self._airport_code(origin)
+        if destination is not None:
+            rows &= self.destination == self._airport_code(destination)
+        return rows
+
+    def _date_columns(self, dates: Optional[Iterable[str]]) -> np.ndarray:
+        if dates is None:
+            return np.ones(len(self.dates), dtype=bool)
+        columns = np.zeros(len(self.dates), dtype=bool)
+        for date in dates:
+            if date in self.date_index:
+                columns[self.date_index[date]] = True
+        return columns
+
+    def route(
+        self, origin: Optional[str] = None, destination: Optional[str] = None
+    ) -> List[str]:
+        """Return the flight numbers flying from `origin` to `destination` in table order."""
+        rows = self._route_rows(origin, destination)
+        return [self.flight_numbers[i] for i in np.flatnonzero(rows).tolist()]
+
+    def mask(
+        self,
+        origin: Optional[str] = None,
+        destination: Optional[str] = None,
+        dates: Optional[Iterable[str]] = None,
+        cabin: Optional[str] = None,
+        min_seats: int = 0,
+        status: Optional[str] = AVAILABLE_STATUS,
+    ) -> np.ndarray:
+        """Return a boolean (flight, date) matrix of the slots matching every filter."""
+        rows = self._route_rows(origin, destination)
+        mask = rows[:, None] & self._date_columns(dates)[None, :]
+        if status is None:
+            mask &= self.status != NO_RECORD
+        elif status in self.status_index:
+            mask &= self.status == self.status_index[status]
+        else:
+            mask[:] = False
+        if cabin is not None:
+            mask &= self.seats[:, :, self.cabin_index[cabin]] >= min_seats
+        elif min_seats > 0:
+            mask &= (self.seats >= min_seats).any(axis=2)
+        return mask
+
+    def search(
+        self,
+        origin: Optional[str] = None,
+        destination: Optional[str] = None,
+        dates: Optional[Iterable[str]] = None,
+        cabin: Optional[str] = None,
+        min_seats: int = 0,
+        status: Optional[str] = AVAILABLE_STATUS,
+    ) -> List[Tuple[str, str]]:
+        """Return the matching (flight_number, date) slots in table order."""
+        rows, columns = np.divmod(
+            np.flatnonzero(
+                self.mask(
+                    origin=origin,
+                    destination=destination,
+                    dates=dates,
+                    cabin=cabin,
+                    min_seats=min_seats,
+                    status=status,
+                )
+            ),
+            len(self.dates),
+        )
+        return [
+            (self.flight_numbers[i], self.dates[j])
+            for i, j in zip(rows.tolist(), columns.tolist())
+        ]
+
+    def flights_with_seats(
+        self, cabin: str, min_seats: int, dates: Optional[Iterable[str]] = None
+    ) -> List[Tuple[str, str]]:
+        return self.search(dates=dates, cabin=cabin, min_seats=min_seats)
+
+    def cheapest(
+        self,
+        cabin: str,
+        origin: Optional[str] = None,
+        destination: Optional[str] = None,
+        dates: Optional[Iterable[str]] = None,
+        min_seats: int = 1,
+    ) -> Optional[Dict[str, Any]]:
+        """Return the cheapest available slot for `cabin`, or None if nothing matches.
+
+        Ties are broken by table order, so the result is deterministic.
+        """
+        k = self.cabin_index[cabin]
+        mask = self.mask(
+            origin=origin,
+            destination=destination,
+            dates=dates,
+            cabin=cabin,
+            min_seats=min_seats,
+        )
+        if not mask.any():
+            return None
+        prices = np.where(mask, self.prices[:, :, k], np.inf)
+        i, j = np.unravel_index(np.argmin(prices), prices.shape)
+        flight_number, date = self.flight_numbers[i], self.dates[j]
+        date_data = self.flights[flight_number]["dates"][date]
+        return {
+            "flight_number": flight_number,
+            "date": date,
+            "cabin": cabin,
+            "price": date_data["prices"][cabin],
+            "available_seats": date_data["available_seats"][cabin],
+        }
+
+    def lookup(
+        self, slots: Sequence[Tuple[str, str]], cabin: str
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the (available seats, prices) of many (flight_number, date) slots at once.
+
+        Unknown slots and slots without an inventory record get 0 seats and a NaN price.
+        """
+        rows = np.array(
+            [self.flight_index.get(flight_number, NO_RECORD) for flight_number, _ in slots],
+            dtype=np.int64,
+        )
+        columns = np.array(
+            [self.date_index.get(date, NO_RECORD) for _, date in slots], dtype=np.int64
+        )
+        known = (rows != NO_RECORD) & (columns != NO_RECORD)
+        k = self.cabin_index[cabin]
+        seats = np.zeros(len(slots), dtype=np.int64)
+        prices = np.full(len(slots), np.nan)
+        seats[known] = self.seats[rows[known], columns[known], k]
+        prices[known] = self.prices[rows[known], columns[known], k]
+        return seats, prices
+
+    def set_available_seats(
+        self, flight_number: str, date: str, cabin: str, seats: int
+    ) -> None:
+        date_data = self.flights[flight_number]["dates"][date]
+        if "available_seats" not in date_data:
+            raise ValueError(f"flight {flight_number} has no seat inventory on {date}")
+        date_data["available_seats"][cabin] = seats
+        self.seats[
+            self.flight_index[flight_number], self.date_index[date], self.cabin_index[cabin]
+        ] = seats
+        self._wrote()
+
+    def reserve_seats(self, flight_number: str, date: str, cabin: str, count: int) -> None:
+        seats = self.flights[flight_number]["dates"][date]["available_seats"][cabin]
+        if seats < count:
+            raise ValueError(f"not enough seats on flight {flight_number}")
+        self.set_available_seats(flight_number, date, cabin, seats - count)
+
+    def release_seats(self, flight_number: str, date: str, cabin: str, count: int) -> None:
+        seats = self.flights[flight_number]["dates"][date]["available_seats"][cabin]
+        self.set_available_seats(flight_number, date, cabin, seats + count)
+
+    def set_status(self, flight_number: str, date: str, status: str) -> None:
+        self.flights[flight_number]["dates"][date]["status"] = status
+        if status not in self.status_index:
+            self.statuses.append(status)
+            self.status_index[status] = len(self.statuses) - 1
+        self.status[self.flight_index[flight_number], self.date_index[date]] = (
+            self.status_index[status]
+        )
+        self._wrote()
+
+    def _wrote(self) -> None:
+        # the arrays already reflect the change written through to the table
+        if self.state is not None:
+            self.revision = self.state.revision
+
+
+def get_flight_inventory(data: Dict[str, Any]) -> FlightInventory:
+    """Return the inventory for the flights table of `data`.
+
+    For a tracked flights table the inventory is kept with the table and rebuilt once
+    any flight changed other than through the inventory. Untracked tables are read
+    again on every call.
+    """
+    registry = get_registry(data)
+    state = registry.tables.get("flights") if registry is not None else None
+    if state is None:
+        return FlightInventory(data["flights"])
+    with state.lock:
+        # records written during the current tool call can still change without a
+        # new revision, so an inventory that read them is not kept
+        settled = len(state.pending) == 0
+        inventory = state.derived.get("inventory")
+        if settled and inventory is not None and inventory.revision == state.revision:
+            return inventory
+        inventory = FlightInventory(data["flights"], state=state)
+        if settled:
+            state.derived["inventory"] = inventory
+        return inventory
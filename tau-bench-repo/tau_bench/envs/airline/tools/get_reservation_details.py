@@ -1,7 +1,7 @@
 # Copyright Sierra
 
-import json
 from typing import Any, Dict
+from tau_bench.envs.serialization import dumps_record
 from tau_bench.envs.tool import Tool
 
 
@@ -10,7 +10,7 @@ class GetReservationDetails(Tool):
     def invoke(data: Dict[str, Any], reservation_id: str) -> str:
         reservations = data["reservations"]
         if reservation_id in reservations:
-            return json.dumps(reservations[reservation_id])
+            return dumps_record(data, "reservations", reservation_id)
         return "Error: user not found"
 
     @staticmethod
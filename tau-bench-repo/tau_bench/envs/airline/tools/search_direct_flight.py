@@ -2,6 +2,7 @@
 
 import json
 from typing import Any, Dict
+from tau_bench.envs.airline.inventory import get_flight_inventory
 from tau_bench.envs.tool import Tool
 
 
@@ -9,16 +10,15 @@ class SearchDirectFlight(Tool):
     @staticmethod
     def invoke(data: Dict[str, Any], origin: str, destination: str, date: str) -> str:
         flights = data["flights"]
+        inventory = get_flight_inventory(data)
         results = []
-        for flight in flights.values():
-            if flight["origin"] == origin and flight["destination"] == destination:
-                if (
-                    date in flight["dates"]
-                    and flight["dates"][date]["status"] == "available"
-                ):
-                    # results add flight except dates, but add flight["datas"][date]
-                    results.append({k: v for k, v in flight.items() if k != "dates"})
-                    results[-1].update(flight["dates"][date])
+        for flight_number, _ in inventory.search(
+            origin=origin, destination=destination, dates=[date]
+        ):
+            flight = flights[flight_number]
+            # results add flight except dates, but add flight["datas"][date]
+            results.append({k: v for k, v in flight.items() if k != "dates"})
+            results[-1].update(flight["dates"][date])
         return json.dumps(results)
 
     @staticmethod
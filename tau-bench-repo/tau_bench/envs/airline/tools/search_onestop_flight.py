@@ -2,6 +2,7 @@
 
 import json
 from typing import Any, Dict
+from tau_bench.envs.airline.inventory import get_flight_inventory
 from tau_bench.envs.tool import Tool
 
 
@@ -9,10 +10,21 @@ class SearchOnestopFlight(Tool):
     @staticmethod
     def invoke(data: Dict[str, Any], origin: str, destination: str, date: str) -> str:
         flights = data["flights"]
+        inventory = get_flight_inventory(data)
+        # only first legs that depart from the origin and are available on the date
+        # and second legs that arrive at the destination can form a result
+        first_legs = [
+            flights[flight_number]
+            for flight_number, _ in inventory.search(origin=origin, dates=[date])
+        ]
+        second_legs = [
+            flights[flight_number]
+            for flight_number in inventory.route(destination=destination)
+        ]
         results = []
-        for flight1 in flights.values():
+        for flight1 in first_legs:
             if flight1["origin"] == origin:
-                for flight2 in flights.values():
+                for flight2 in second_legs:
                     if (
                         flight2["destination"] == destination
                         and flight1["destination"] == flight2["origin"]
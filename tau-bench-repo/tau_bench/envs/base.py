@@ -1,8 +1,13 @@
 # Copyright Sierra
 
 import random
+import time
+from dataclasses import dataclass
 from hashlib import sha256
+from tau_bench.envs.index import IndexSpec, get_registry, index_data
+from tau_bench.envs.metrics import EnvMetrics
 from tau_bench.envs.tool import Tool
+from tau_bench.envs.validation import ArgumentValidationError, ArgumentValidator
 from typing import Any, Callable, Dict, List, Type, Optional, Set, Union, Tuple
 
 from tau_bench.envs.user import load_user, UserStrategy
@@ -26,7 +31,9 @@ Hashable = Union[str, int, float, Tuple["Hashable"], Tuple[Tuple[str, "Hashable"
 
 def to_hashable(item: ToHashable) -> Hashable:
     if isinstance(item, dict):
-        return tuple((key, to_hashable(value)) for key, value in sorted(item.items()))
+        # `dict.items` reads tracked tables (see envs/index.py) without wrapping every
+        # record; the result is the same as for the plain dict
+        return tuple((key, to_hashable(value)) for key, value in sorted(dict.items(item)))
     elif isinstance(item, list):
         return tuple(to_hashable(element) for element in item)
     elif isinstance(item, set):
@@ -35,6 +42,15 @@ def to_hashable(item: ToHashable) -> Hashable:
         return item
 
 
+@dataclass
+class ToolCallResult(object):
+    observation: str
+    duration_ms: float
+    error: bool = False
+    # rejected by argument validation before the tool ran
+    invalid: bool = False
+
+
 def consistent_hash(
     value: Hashable,
 ) -> str:
@@ -53,15 +69,30 @@ class Env(object):
         user_model: str,
         user_provider: Optional[str] = None,
         task_index: Optional[int] = None,
+        indexes: Optional[List[IndexSpec]] = None,
+        cached_tables: Optional[List[str]] = None,
+        validate_args: bool = False,
     ) -> None:
         super().__init__()
         self.data_load_func = data_load_func
-        self.data = data_load_func()
+        self.indexes = indexes if indexes is not None else []
+        self.cached_tables = cached_tables if cached_tables is not None else []
+        self.data = self.load_data()
         self.tools_map: Dict[str, Type[Tool]] = {
             tool.get_info()["function"]["name"]: tool for tool in tools
         }
         self.tools_info = [tool.get_info() for tool in tools]
+        # rejecting calls whose arguments do not match the tool schema changes what the
+        # agent observes, and with it the scores, so it is opt-in
+        self.validate_args = validate_args
+        self.validators: Dict[str, ArgumentValidator] = {
+            info["function"]["name"]: ArgumentValidator(info) for info in self.tools_info
+        }
+        self.validation_failures: Dict[str, int] = {}
+        self.metrics = EnvMetrics()
         self.terminate_tools = []
+        # tools that never modify the data, so calls to them may run concurrently
+        self.read_only_tools = []
         self.tasks = tasks
         if task_index is not None:
             self.task_index = task_index
@@ -79,38 +110,92 @@ class Env(object):
         if task_index is None:
             task_index = random.randint(0, len(self.tasks))
         self.task_index = task_index
-        self.data = self.data_load_func()
+        self.data = self.load_data()
         self.task = self.tasks[task_index]
         self.actions = []
+        self.validation_failures = {}
+        self.metrics = EnvMetrics()
         initial_observation = self.user.reset(instruction=self.task.instruction)
         return EnvResetResponse(
             observation=initial_observation, info=EnvInfo(task=self.task, source="user")
         )
 
+    def load_data(self) -> Dict[str, Any]:
+        data = self.data_load_func()
+        if len(self.indexes) > 0 or len(self.cached_tables) > 0:
+            data = index_data(
+                data,
+                self.indexes,
+                tables=self.cached_tables,
+                source=f"{self.data_load_func.__module__}.{self.data_load_func.__qualname__}",
+            )
+        return data
+
     def step(self, action: Action) -> EnvResponse:
+        if action.name in self.tools_map:
+            return self.record_tool_call(action, self.run_tool(action))
         self.actions.append(action)
 
         info = EnvInfo(task=self.task)
-        reward = 0
         done = False
         if action.name == RESPOND_ACTION_NAME:
             observation = self.user.step(action.kwargs["content"])
             info.source = "user"
             done = "###STOP###" in observation
-        elif action.name in self.tools_map:
-            try:
-                observation = self.tools_map[action.name].invoke(
-                    data=self.data, **action.kwargs
-                )
-            except Exception as e:
-                observation = f"Error: {e}"
-            info.source = action.name
-            if action.name in self.terminate_tools:
-                done = True
         else:
             observation = f"Unknown action {action.name}"
             info.source = action.name
+        return self._respond(observation, done, info)
+
+    def run_tool(self, action: Action) -> ToolCallResult:
+        """Invoke the tool of `action` without recording the call.
 
+        Calls to read-only tools may run concurrently, as long as each of them is then
+        passed to `record_tool_call` in the order the calls were made.
+        """
+        error, invalid = False, False
+        start = time.perf_counter()
+        try:
+            if self.validate_args:
+                self.validators[action.name].validate(action.kwargs)
+            observation = self.tools_map[action.name].invoke(
+                data=self.data, **action.kwargs
+            )
+        except ArgumentValidationError as e:
+            observation = f"Error: {e}"
+            error, invalid = True, True
+        except Exception as e:
+            observation = f"Error: {e}"
+            error = True
+        return ToolCallResult(
+            observation=observation,
+            duration_ms=(time.perf_counter() - start) * 1000,
+            error=error,
+            invalid=invalid,
+        )
+
+    def record_tool_call(
+        self, action: Action, result: ToolCallResult
+    ) -> EnvResponse:
+        """Record a call made with `run_tool`, as `step` would have, and respond to it."""
+        self.actions.append(action)
+        registry = get_registry(self.data)
+        if registry is not None:
+            registry.settle()
+        self.metrics.record_tool(
+            action.name, result.duration_ms, result.observation, result.error
+        )
+        if result.invalid:
+            self.validation_failures[action.name] = (
+                self.validation_failures.get(action.name, 0) + 1
+            )
+        info = EnvInfo(task=self.task, source=action.name)
+        return self._respond(
+            result.observation, action.name in self.terminate_tools, info
+        )
+
+    def _respond(self, observation: str, done: bool, info: EnvInfo) -> EnvResponse:
+        reward = 0
         if done:
             reward_res = self.calculate_reward()
             reward = reward_res.reward
@@ -122,6 +207,7 @@ class Env(object):
         return consistent_hash(to_hashable(self.data))
 
     def calculate_reward(self) -> RewardResult:
+        start = time.perf_counter()
         data_hash = self.get_data_hash()
         reward = 1.0
         actions = [
@@ -130,10 +216,17 @@ class Env(object):
 
         # Check if the database changes are correct. If they are not correct, then we set the reward to 0.
         # TODO: cache gt_data_hash in tasks.py (low priority)
-        self.data = self.data_load_func()
-        for action in self.task.actions:
-            if action.name not in self.terminate_tools:
-                self.step(action)
+        self.data = self.load_data()
+        # the ground truth replay is not part of the episode
+        metrics, self.metrics = self.metrics, EnvMetrics()
+        validation_failures, self.validation_failures = self.validation_failures, {}
+        try:
+            for action in self.task.actions:
+                if action.name not in self.terminate_tools:
+                    self.step(action)
+        finally:
+            self.metrics = metrics
+            self.validation_failures = validation_failures
         gt_data_hash = self.get_data_hash()
         info = RewardActionInfo(
             r_actions=data_hash == gt_data_hash, gt_data_hash=gt_data_hash
@@ -161,4 +254,5 @@ class Env(object):
                     reward = 0.0
             info = RewardOutputInfo(r_outputs=r_outputs, outputs=outputs)
             
+        self.metrics.record_reward((time.perf_counter() - start) * 1000)
         return RewardResult(reward=reward, info=info, actions=actions)
@@ -0,0 +1,514 @@
+# Copyright Sierra
+
+import itertools
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+Normalizer = Callable[[Any], Any]
+
+
+def casefold(value: Any) -> Any:
+    return value.lower() if isinstance(value, str) else value
+
+
+@dataclass(frozen=True)
+class IndexSpec(object):
+    """A declared index over one table of a domain's data.
+
+    Each path is `<table>.<field>[.<field>...]`, e.g. `orders.user_id` or
+    `users.address.zip`. Lists along a path fan out, so a record may be indexed under
+    several values. An index over several paths is keyed by the tuple of their values.
+    `normalize` is applied to both indexed and queried values, either one callable for
+    every path or one (optional) callable per path.
+    """
+
+    paths: Tuple[str, ...]
+    normalize: Union[Normalizer, Tuple[Optional[Normalizer], ...], None] = None
+
+    def __init__(
+        self,
+        *paths: str,
+        normalize: Union[Normalizer, Tuple[Optional[Normalizer], ...], None] = None,
+    ) -> None:
+        if len(paths) == 0:
+            raise ValueError("An index needs at least one path")
+        tables = {path.split(".")[0] for path in paths}
+        if len(tables) != 1 or any(len(path.split(".")) < 2 for path in paths):
+            raise ValueError(f"Index paths must be fields of a single table: {paths}")
+        if isinstance(normalize, tuple) and len(normalize) != len(paths):
+            raise ValueError("normalize must have one entry per path")
+        object.__setattr__(self, "paths", tuple(paths))
+        object.__setattr__(self, "normalize", normalize)
+
+    @property
+    def table(self) -> str:
+        return self.paths[0].split(".")[0]
+
+    @property
+    def fields(self) -> List[List[str]]:
+        return [path.split(".")[1:] for path in self.paths]
+
+    def normalizers(self) -> List[Optional[Normalizer]]:
+        if isinstance(self.normalize, tuple):
+            return list(self.normalize)
+        return [self.normalize] * len(self.paths)
+
+    def keys_for_values(self, values: Iterable[Any]) -> Any:
+        keys = tuple(
+            value if normalizer is None else normalizer(value)
+            for value, normalizer in zip(values, self.normalizers())
+        )
+        return keys[0] if len(keys) == 1 else keys
+
+    def keys_for_record(self, record: Any) -> List[Any]:
+        per_path = [_resolve(record, fields) for fields in self.fields]
+        return [self.keys_for_values(values) for values in itertools.product(*per_path)]
+
+
+def _resolve(value: Any, fields: List[str]) -> List[Any]:
+    if isinstance(value, list):
+        return [v for element in value for v in _resolve(element, fields)]
+    if len(fields) == 0:
+        return [value]
+    if not isinstance(value, dict) or fields[0] not in value:
+        return []
+    return _resolve(value[fields[0]], fields[1:])
+
+
+class _Owner(object):
+    """Routes mutations of a tracked container to the record that contains it."""
+
+    __slots__ = ("table", "key")
+
+    def __init__(self, table: "_TableState", key: str) -> None:
+        self.table = table
+        self.key = key
+
+    def owns(self, value: Any) -> bool:
+        owner = getattr(value, "_owner", None)
+        return owner is not None and owner.table is self.table and owner.key == self.key
+
+    def changed(self, *values: Any) -> None:
+        self.table.mark_dirty(self.key)
+        for value in values:
+            if isinstance(value, (dict, list)) and not self.owns(value):
+                # the caller still holds this container, so it is only swapped for a
+                # tracked copy once the current tool call has returned
+                self.table.mark_pending(self.key)
+
+
+class TrackedDict(dict):
+    __slots__ = ("_owner",)
+
+    def _changed(self, *values: Any) -> None:
+        owner = getattr(self, "_owner", None)
+        if owner is not None:
+            owner.changed(*values)
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        super().__setitem__(key, value)
+        self._changed(value)
+
+    def __delitem__(self, key: Any) -> None:
+        super().__delitem__(key)
+        self._changed()
+
+    def pop(self, *args: Any) -> Any:
+        value = super().pop(*args)
+        self._changed()
+        return value
+
+    def popitem(self) -> Tuple[Any, Any]:
+        item = super().popitem()
+        self._changed()
+        return item
+
+    def clear(self) -> None:
+        super().clear()
+        self._changed()
+
+    def setdefault(self, key: Any, default: Any = None) -> Any:
+        value = super().setdefault(key, default)
+        self._changed(value)
+        return value
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        new = dict(*args, **kwargs)
+        super().update(new)
+        self._changed(*new.values())
+
+    def __ior__(self, other: Any) -> "TrackedDict":
+        self.update(other)
+        return self
+
+    def __reduce_ex__(self, protocol: int) -> Any:
+        # copies and pickles are detached from the index, so they are plain dicts
+        return (dict, (dict(self),))
+
+
+class TrackedList(list):
+    __slots__ = ("_owner",)
+
+    def _changed(self, *values: Any) -> None:
+        owner = getattr(self, "_owner", None)
+        if owner is not None:
+            owner.changed(*values)
+
+    def __setitem__(self, index: Any, value: Any) -> None:
+        super().__setitem__(index, value)
+        if isinstance(index, slice):
+            self._changed(*self[index])
+        else:
+            self._changed(value)
+
+    def __delitem__(self, index: Any) -> None:
+        super().__delitem__(index)
+        self._changed()
+
+    def __iadd__(self, other: Iterable[Any]) -> "TrackedList":
+        self.extend(other)
+        return self
+
+    def __imul__(self, n: int) -> "TrackedList":
+        super().__imul__(n)
+        self._changed()
+        return self
+
+    def append(self, value: Any) -> None:
+        super().append(value)
+        self._changed(value)
+
+    def extend(self, values: Iterable[Any]) -> None:
+        values = list(values)
+        super().extend(values)
+        self._changed(*values)
+
+    def insert(self, index: int, value: Any) -> None:
+        super().insert(index, value)
+        self._changed(value)
+
+    def pop(self, *args: Any) -> Any:
+        value = super().pop(*args)
+        self._changed()
+        return value
+
+    def remove(self, value: Any) -> None:
+        super().remove(value)
+        self._changed()
+
+    def clear(self) -> None:
+        super().clear()
+        self._changed()
+
+    def sort(self, *args: Any, **kwargs: Any) -> None:
+        super().sort(*args, **kwargs)
+        self._changed()
+
+    def reverse(self) -> None:
+        super().reverse()
+        self._changed()
+
+    def __reduce_ex__(self, protocol: int) -> Any:
+        return (list, (list(self),))
+
+
+def _track(value: Any, owner: _Owner) -> Any:
+    """Return `value` with every nested container owned by `owner`.
+
+    Containers already tracked for the same record are kept, anything else is replaced
+    by a tracked copy.
+    """
+    if isinstance(value, dict):
+        tracked = value if owner.owns(value) else TrackedDict(value)
+        tracked._owner = owner
+        for key, element in dict.items(tracked):
+            if isinstance(element, (dict, list)):
+                dict.__setitem__(tracked, key, _track(element, owner))
+        return tracked
+    if isinstance(value, list):
+        tracked = value if owner.owns(value) else TrackedList(value)
+        tracked._owner = owner
+        for i, element in enumerate(tracked):
+            if isinstance(element, (dict, list)):
+                list.__setitem__(tracked, i, _track(element, owner))
+        return tracked
+    return value
+
+
+class TrackedTable(dict):
+    """A table (`data[<table>]`) whose records report every change they go through.
+
+    Records are swapped for tracked copies the first time they are handed out, before
+    any caller can hold a reference to them.
+    """
+
+    __slots__ = ("_state",)
+
+    def __getitem__(self, key: Any) -> Any:
+        return self._state.visible(key)
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        return self[key] if key in self else default
+
+    def items(self) -> Any:
+        self._state.track_all()
+        return dict.items(self)
+
+    def values(self) -> Any:
+        self._state.track_all()
+        return dict.values(self)
+
+    def copy(self) -> Dict[Any, Any]:
+        self._state.track_all()
+        return dict.copy(self)
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        dict.__setitem__(self, key, value)
+        self._state.record_set(key, value)
+
+    def __delitem__(self, key: Any) -> None:
+        dict.__delitem__(self, key)
+        self._state.mark_dirty(key)
+
+    def pop(self, key: Any, *args: Any) -> Any:
+        if key in self:
+            self._state.visible(key)
+        value = dict.pop(self, key, *args)
+        self._state.mark_dirty(key)
+        return value
+
+    def popitem(self) -> Tuple[Any, Any]:
+        self._state.track_all()
+        key, value = dict.popitem(self)
+        self._state.mark_dirty(key)
+        return key, value
+
+    def clear(self) -> None:
+        keys = list(self.keys())
+        dict.clear(self)
+        for key in keys:
+            self._state.mark_dirty(key)
+
+    def setdefault(self, key: Any, default: Any = None) -> Any:
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def __ior__(self, other: Any) -> "TrackedTable":
+        self.update(other)
+        return self
+
+    def __reduce_ex__(self, protocol: int) -> Any:
+        return (dict, (dict(self.items()),))
+
+
+class Index(object):
+    def __init__(self, spec: IndexSpec, state: "_TableState") -> None:
+        self.spec = spec
+        self.state = state
+        self.entries: Dict[str, List[Any]] = {}
+        self.buckets: Dict[Any, Set[str]] = {}
+        self.built = False
+
+    def build(self) -> None:
+        self.entries, self.buckets = {}, {}
+        for key, record in dict.items(self.state.table):
+            self._add(key, record)
+        self.built = True
+
+    def _add(self, key: str, record: Any) -> None:
+        index_keys = self.spec.keys_for_record(record)
+        self.entries[key] = index_keys
+        for index_key in index_keys:
+            self.buckets.setdefault(index_key, set()).add(key)
+
+    def _remove(self, key: str) -> None:
+        for index_key in self.entries.pop(key, []):
+            bucket = self.buckets.get(index_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if len(bucket) == 0:
+                    del self.buckets[index_key]
+
+    def refresh(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            self._remove(key)
+            if key in self.state.table:
+                self._add(key, dict.__getitem__(self.state.table, key))
+
+    def get(self, *values: Any) -> List[str]:
+        """Return the keys of the records matching `values`, in table order."""
+        with self.state.lock:
+            self.state.sync()
+            if not self.built:
+                self.build()
+            keys = list(self.buckets.get(self.spec.keys_for_values(values), ()))
+        return sorted(keys, key=self.state.ordinal)
+
+
+class _TableState(object):
+    def __init__(self, table: TrackedTable, specs: List[IndexSpec]) -> None:
+        self.table = table
+        # read-only tool calls may run concurrently, so lazy work (wrapping records,
+        # building and refreshing indexes) happens under this lock
+        self.lock = threading.RLock()
+        self.indexes = [Index(spec, self) for spec in specs]
+        self.ordinals = {key: i for i, key in enumerate(dict.keys(table))}
+        # bumped on every change, so an unchanged record is still at version 0
+        self.versions: Dict[str, int] = {}
+        self.tracked: Set[str] = set()
+        # records holding containers the current tool call may still mutate directly
+        self.pending: Set[str] = set()
+        self.dirty: Set[str] = set()
+        # serialized records of this snapshot as (version, json)
+        self.fragments: Dict[str, Tuple[int, str]] = {}
+        # bumped on every change to any record, for state derived from the whole table
+        self.revision = 0
+        # state derived from the whole table, keyed by name; each entry checks `revision`
+        self.derived: Dict[str, Any] = {}
+
+    def visible(self, key: str) -> Any:
+        record = dict.__getitem__(self.table, key)
+        if key in self.tracked or key in self.pending:
+            return record
+        with self.lock:
+            record = dict.__getitem__(self.table, key)
+            if key in self.tracked or key in self.pending:
+                return record
+            return self._track(key, record)
+
+    def _track(self, key: str, record: Any) -> Any:
+        record = _track(record, _Owner(self, key))
+        dict.__setitem__(self.table, key, record)
+        self.tracked.add(key)
+        return record
+
+    def track_all(self) -> None:
+        if len(self.tracked) + len(self.pending) < len(self.table):
+            for key in dict.keys(self.table):
+                self.visible(key)
+
+    def ordinal(self, key: str) -> int:
+        return self.ordinals[key]
+
+    def version(self, key: str) -> int:
+        return self.versions.get(key, 0)
+
+    def record_set(self, key: str, record: Any) -> None:
+        if key not in self.ordinals:
+            self.ordinals[key] = len(self.ordinals)
+        self.mark_dirty(key)
+        self.tracked.discard(key)
+        self.mark_pending(key)
+
+    def mark_dirty(self, key: str) -> None:
+        self.versions[key] = self.version(key) + 1
+        self.revision += 1
+        self.dirty.add(key)
+
+    def mark_pending(self, key: str) -> None:
+        self.pending.add(key)
+
+    def settle(self) -> None:
+        """Swap the containers written by the last tool call for tracked copies."""
+        pending, self.pending = self.pending, set()
+        for key in pending:
+            if key in self.table:
+                self._track(key, dict.__getitem__(self.table, key))
+
+    def sync(self) -> None:
+        if len(self.dirty) == 0 and len(self.pending) == 0:
+            return
+        keys = self.dirty | self.pending
+        self.dirty = set()
+        for index in self.indexes:
+            if index.built:
+                index.refresh(keys)
+
+
+class IndexRegistry(object):
+    def __init__(
+        self,
+        data: Dict[str, Any],
+        specs: List[IndexSpec],
+        tables: Iterable[str] = (),
+        source: Optional[str] = None,
+    ) -> None:
+        self.source = source
+        self.indexes: Dict[IndexSpec, Index] = {}
+        self.tables: Dict[str, _TableState] = {}
+        specs_by_table: Dict[str, List[IndexSpec]] = {table: [] for table in tables}
+        for spec in specs:
+            specs_by_table.setdefault(spec.table, []).append(spec)
+        for table_name, table_specs in specs_by_table.items():
+            table = TrackedTable(data[table_name])
+            state = _TableState(table, table_specs)
+            table._state = state
+            data[table_name] = table
+            self.tables[table_name] = state
+            for index in state.indexes:
+                self.indexes[index.spec] = index
+
+    def __contains__(self, spec: IndexSpec) -> bool:
+        return spec in self.indexes
+
+    def __getitem__(self, spec: IndexSpec) -> Index:
+        return self.indexes[spec]
+
+    def settle(self) -> None:
+        for state in self.tables.values():
+            state.settle()
+
+
+class IndexedData(dict):
+    """Domain data that carries the registry of its tracked tables and indexes."""
+
+    indexes: IndexRegistry
+
+
+def index_data(
+    data: Dict[str, Any],
+    specs: List[IndexSpec],
+    tables: Iterable[str] = (),
+    source: Optional[str] = None,
+) -> IndexedData:
+    """Wrap a freshly loaded data snapshot so that `specs` can be queried with `lookup`.
+
+    The tables of `specs` and the extra `tables` are tracked: every record keeps a
+    version that changes with it. Index contents are built on first query and then
+    refreshed only for the records that changed. `source` names where the snapshot was
+    loaded from, so that state derived from unchanged records can be shared by every
+    snapshot of the same source.
+    """
+    indexed = IndexedData(data)
+    indexed.indexes = IndexRegistry(indexed, specs, tables=tables, source=source)
+    return indexed
+
+
+def get_registry(data: Dict[str, Any]) -> Optional[IndexRegistry]:
+    return getattr(data, "indexes", None)
+
+
+def scan(data: Dict[str, Any], spec: IndexSpec, *values: Any) -> List[str]:
+    index_key = spec.keys_for_values(values)
+    return [
+        key
+        for key, record in data[spec.table].items()
+        if index_key in spec.keys_for_record(record)
+    ]
+
+
+def lookup(data: Dict[str, Any], spec: IndexSpec, *values: Any) -> List[str]:
+    """Return the keys of the records of `spec.table` matching `values`, in table order.
+
+    Falls back to a scan when `data` was not loaded with the index declared.
+    """
+    registry = get_registry(data)
+    if registry is not None and spec in registry:
+        return registry[spec].get(*values)
+    return scan(data, spec, *values)
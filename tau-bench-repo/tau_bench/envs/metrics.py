@@ -0,0 +1,171 @@
+# Copyright Sierra
+
+import bisect
+from typing import Any, Dict, List, Optional
+
+# upper bounds of the latency histogram buckets, the last bucket is unbounded
+LATENCY_BUCKETS_MS = [0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 50.0, 100.0, 250.0, 1000.0]
+
+# rough size of a token for English text and JSON, used to estimate prompt growth
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class ToolMetrics(object):
+    """Running totals of the calls to one tool."""
+
+    __slots__ = (
+        "calls",
+        "errors",
+        "total_latency_ms",
+        "max_latency_ms",
+        "latency_histogram",
+        "observation_bytes",
+        "max_observation_bytes",
+        "observation_tokens",
+    )
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.total_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+        self.latency_histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.observation_bytes = 0
+        self.max_observation_bytes = 0
+        self.observation_tokens = 0
+
+    def record(self, latency_ms: float, observation: str, error: bool) -> None:
+        self.calls += 1
+        if error:
+            self.errors += 1
+        self.total_latency_ms += latency_ms
+        if latency_ms > self.max_latency_ms:
+            self.max_latency_ms = latency_ms
+        self.latency_histogram[bisect.bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+        size = len(observation.encode("utf-8"))
+        self.observation_bytes += size
+        if size > self.max_observation_bytes:
+            self.max_observation_bytes = size
+        self.observation_tokens += estimate_tokens(observation)
+
+    def merge(self, other: "ToolMetrics") -> None:
+        self.calls += other.calls
+        self.errors += other.errors
+        self.total_latency_ms += other.total_latency_ms
+        self.max_latency_ms = max(self.max_latency_ms, other.max_latency_ms)
+        self.latency_histogram = [
+            a + b for a, b in zip(self.latency_histogram, other.latency_histogram)
+        ]
+        self.observation_bytes += other.observation_bytes
+        self.max_observation_bytes = max(
+            self.max_observation_bytes, other.max_observation_bytes
+        )
+        self.observation_tokens += other.observation_tokens
+
+    def latency_quantile(self, q: float) -> Optional[float]:
+        """Estimate the `q` quantile by the upper bound of the bucket that holds it."""
+        if self.calls == 0:
+            return None
+        rank = q * self.calls
+        seen = 0
+        for i, count in enumerate(self.latency_histogram):
+            seen += count
+            if seen >= rank and count > 0:
+                if i < len(LATENCY_BUCKETS_MS):
+                    return min(LATENCY_BUCKETS_MS[i], self.max_latency_ms)
+                return self.max_latency_ms
+        return self.max_latency_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "error_rate": self.errors / self.calls if self.calls > 0 else 0.0,
+            "total_latency_ms": self.total_latency_ms,
+            "mean_latency_ms": self.total_latency_ms / self.calls if self.calls > 0 else 0.0,
+            "max_latency_ms": self.max_latency_ms,
+            "latency_histogram": self.latency_histogram,
+            "observation_bytes": self.observation_bytes,
+            "max_observation_bytes": self.max_observation_bytes,
+            "observation_tokens": self.observation_tokens,
+        }
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "ToolMetrics":
+        metrics = cls()
+        metrics.calls = d["calls"]
+        metrics.errors = d["errors"]
+        metrics.total_latency_ms = d["total_latency_ms"]
+        metrics.max_latency_ms = d["max_latency_ms"]
+        metrics.latency_histogram = list(d["latency_histogram"])
+        metrics.observation_bytes = d["observation_bytes"]
+        metrics.max_observation_bytes = d["max_observation_bytes"]
+        metrics.observation_tokens = d["observation_tokens"]
+        return metrics
+
+
+class EnvMetrics(object):
+    """Tool call and reward computation metrics of one or more episodes."""
+
+    def __init__(self) -> None:
+        self.tools: Dict[str, ToolMetrics] = {}
+        self.reward_calls = 0
+        self.reward_latency_ms = 0.0
+
+    def record_tool(
+        self, tool_name: str, latency_ms: float, observation: str, error: bool
+    ) -> None:
+        metrics = self.tools.get(tool_name)
+        if metrics is None:
+            metrics = self.tools[tool_name] = ToolMetrics()
+        metrics.record(latency_ms, observation, error)
+
+    def record_reward(self, latency_ms: float) -> None:
+        self.reward_calls += 1
+        self.reward_latency_ms += latency_ms
+
+    def merge(self, other: "EnvMetrics") -> None:
+        for tool_name, metrics in other.tools.items():
+            if tool_name not in self.tools:
+                self.tools[tool_name] = ToolMetrics()
+            self.tools[tool_name].merge(metrics)
+        self.reward_calls += other.reward_calls
+        self.reward_latency_ms += other.reward_latency_ms
+
+    def total(self) -> ToolMetrics:
+        total = ToolMetrics()
+        for metrics in self.tools.values():
+            total.merge(metrics)
+        return total
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "tools": {
+                tool_name: metrics.to_dict()
+                for tool_name, metrics in sorted(self.tools.items())
+            },
+            "reward_calls": self.reward_calls,
+            "reward_latency_ms": self.reward_latency_ms,
+        }
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "EnvMetrics":
+        metrics = cls()
+        metrics.tools = {
+            tool_name: ToolMetrics.from_dict(tool_metrics)
+            for tool_name, tool_metrics in d["tools"].items()
+        }
+        metrics.reward_calls = d["reward_calls"]
+        metrics.reward_latency_ms = d["reward_latency_ms"]
+        return metrics
+
+
+def summarize(metrics: List[EnvMetrics]) -> EnvMetrics:
+    summary = EnvMetrics()
+    for m in metrics:
+        summary.merge(m)
+    return summary
@@ -2,6 +2,7 @@
 
 from tau_bench.envs.base import Env
 from tau_bench.envs.retail.data import load_data
+from tau_bench.envs.retail.indexes import CACHED_TABLES, INDEXES
 from tau_bench.envs.retail.rules import RULES
 from tau_bench.envs.retail.tools import ALL_TOOLS
 from tau_bench.envs.retail.wiki import WIKI
@@ -17,6 +18,7 @@ class MockRetailDomainEnv(Env):
         user_provider: Optional[str] = None,
         task_split: str = "test",
         task_index: Optional[int] = None,
+        validate_args: bool = False,
     ):
         match task_split:
             case "test":
@@ -37,5 +39,18 @@ class MockRetailDomainEnv(Env):
             user_model=user_model,
             user_provider=user_provider,
             task_index=task_index,
+            indexes=INDEXES,
+            cached_tables=CACHED_TABLES,
+            validate_args=validate_args,
         )
         self.terminate_tools = ["transfer_to_human_agents"]
+        self.read_only_tools = [
+            "calculate",
+            "find_user_id_by_email",
+            "find_user_id_by_name_zip",
+            "get_order_details",
+            "get_product_details",
+            "get_user_details",
+            "list_all_product_types",
+            "think",
+        ]
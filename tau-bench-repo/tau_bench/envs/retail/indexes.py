@@ -0,0 +1,16 @@
+# Copyright Sierra
+
+from tau_bench.envs.index import IndexSpec, casefold
+
+USERS_BY_EMAIL = IndexSpec("users.email", normalize=casefold)
+USERS_BY_NAME_ZIP = IndexSpec(
+    "users.name.first_name",
+    "users.name.last_name",
+    "users.address.zip",
+    normalize=(casefold, casefold, None),
+)
+
+INDEXES = [USERS_BY_EMAIL, USERS_BY_NAME_ZIP]
+
+# tables whose records are serialized whole by the get_*_details tools
+CACHED_TABLES = ["users", "orders", "products"]
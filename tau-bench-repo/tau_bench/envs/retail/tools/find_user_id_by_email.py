@@ -1,16 +1,17 @@
 # Copyright Sierra
 
 from typing import Any, Dict
+from tau_bench.envs.index import lookup
+from tau_bench.envs.retail.indexes import USERS_BY_EMAIL
 from tau_bench.envs.tool import Tool
 
 
 class FindUserIdByEmail(Tool):
     @staticmethod
     def invoke(data: Dict[str, Any], email: str) -> str:
-        users = data["users"]
-        for user_id, profile in users.items():
-            if profile["email"].lower() == email.lower():
-                return user_id
+        user_ids = lookup(data, USERS_BY_EMAIL, email)
+        if len(user_ids) > 0:
+            return user_ids[0]
         return "Error: user not found"
 
     @staticmethod
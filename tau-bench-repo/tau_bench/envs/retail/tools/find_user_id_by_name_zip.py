@@ -1,20 +1,17 @@
 # Copyright Sierra
 
 from typing import Any, Dict
+from tau_bench.envs.index import lookup
+from tau_bench.envs.retail.indexes import USERS_BY_NAME_ZIP
 from tau_bench.envs.tool import Tool
 
 
 class FindUserIdByNameZip(Tool):
     @staticmethod
     def invoke(data: Dict[str, Any], first_name: str, last_name: str, zip: str) -> str:
-        users = data["users"]
-        for user_id, profile in users.items():
-            if (
-                profile["name"]["first_name"].lower() == first_name.lower()
-                and profile["name"]["last_name"].lower() == last_name.lower()
-                and profile["address"]["zip"] == zip
-            ):
-                return user_id
+        user_ids = lookup(data, USERS_BY_NAME_ZIP, first_name, last_name, zip)
+        if len(user_ids) > 0:
+            return user_ids[0]
         return "Error: user not found"
 
     @staticmethod
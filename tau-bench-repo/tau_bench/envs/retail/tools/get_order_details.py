@@ -1,7 +1,7 @@
 # Copyright Sierra
 
-import json
 from typing import Any, Dict
+from tau_bench.envs.serialization import dumps_record
 from tau_bench.envs.tool import Tool
 
 
@@ -10,7 +10,7 @@ class GetOrderDetails(Tool):
     def invoke(data: Dict[str, Any], order_id: str) -> str:
         orders = data["orders"]
         if order_id in orders:
-            return json.dumps(orders[order_id])
+            return dumps_record(data, "orders", order_id)
         return "Error: order not found"
 
     @staticmethod
@@ -1,7 +1,7 @@
 # Copyright Sierra
 
-import json
 from typing import Any, Dict
+from tau_bench.envs.serialization import dumps_record
 from tau_bench.envs.tool import Tool
 
 
@@ -10,7 +10,7 @@ class GetProductDetails(Tool):
     def invoke(data: Dict[str, Any], product_id: str) -> str:
         products = data["products"]
         if product_id in products:
-            return json.dumps(products[product_id])
+            return dumps_record(data, "products", product_id)
         return "Error: product not found"
 
     @staticmethod
@@ -0,0 +1,66 @@
+# Copyright Sierra
+
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+from tau_bench.envs.index import get_registry
+
+# a process normally loads one source per domain, so this only bounds the number of
+# sources whose pristine records are kept; a source holds at most one entry per record
+MAX_PRISTINE_SOURCES = 8
+
+# serialized records that are still exactly as loaded, shared by every snapshot of the
+# same source: source -> (table, key) -> json
+_pristine: "OrderedDict[str, Dict[Tuple[str, str], str]]" = OrderedDict()
+_pristine_lock = threading.Lock()
+
+
+def _pristine_fragments(source: str) -> Dict[Tuple[str, str], str]:
+    with _pristine_lock:
+        fragments = _pristine.get(source)
+        if fragments is None:
+            fragments = _pristine[source] = {}
+            while len(_pristine) > MAX_PRISTINE_SOURCES:
+                _pristine.popitem(last=False)
+        else:
+            _pristine.move_to_end(source)
+        return fragments
+
+
+def dumps(obj: Any) -> str:
+    """Serialize a tool observation.
+
+    Observations are compared as text, so this must stay byte-identical to `json.dumps`
+    with its default arguments.
+    """
+    return json.dumps(obj)
+
+
+def dumps_record(data: Dict[str, Any], table: str, key: str) -> str:
+    """Serialize `data[table][key]`, reusing the output of earlier calls when possible.
+
+    Only records of tracked tables are cached: unchanged records share one serialization
+    across snapshots of the same source, changed ones are serialized again once per
+    change. Anything else is serialized on every call.
+    """
+    registry = get_registry(data)
+    state = registry.tables.get(table) if registry is not None else None
+    record = data[table][key]
+    if state is None or key in state.pending:
+        return dumps(record)
+    version = state.version(key)
+    if version == 0 and registry.source is not None:
+        fragments = _pristine_fragments(registry.source)
+        fragment = fragments.get((table, key))
+        if fragment is None:
+            fragment = dumps(record)
+            fragments[(table, key)] = fragment
+        return fragment
+    cached = state.fragments.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    fragment = dumps(record)
+    state.fragments[key] = (version, fragment)
+    return fragment
@@ -1,10 +1,19 @@
 # Copyright Sierra
 
 import abc
+import contextvars
 import enum
-from litellm import completion
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from tau_bench.cassette import normalize
+from tau_bench.ledger import completion
 
-from typing import Optional, List, Dict, Any, Union
+from typing import Optional, List, Dict, Any, Tuple, Union
 
 
 class BaseUserSimulationEnv(abc.ABC):
@@ -34,7 +43,111 @@ class HumanUserSimulationEnv(BaseUserSimulationEnv):
         return 0
 
 
+class ScriptedUserSimulationEnv(BaseUserSimulationEnv):
+    """Opens with the instruction and ends the conversation at the first response."""
+
+    def reset(self, instruction: Optional[str] = None) -> str:
+        return instruction if instruction is not None else "Hi!"
+
+    def step(self, content: str) -> str:
+        return "###STOP###"
+
+    def get_total_cost(self) -> float:
+        return 0
+
+
+class UserResponseCache(object):
+    """A persistent cache of user simulator messages keyed by conversation prefix.
+
+    Only use it where replaying an earlier sample is acceptable, it removes the
+    variance between runs and trials on the turns it serves. Entries are keyed by
+    strategy, model and the normalized messages sent to the model, the least recently
+    used ones are evicted once the cache grows past `max_bytes`.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if os.path.dirname(path) != "":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries "
+            "(key TEXT PRIMARY KEY, message TEXT, size INTEGER, last_used REAL)"
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def key(strategy: str, model: str, provider: str, messages: List[Dict[str, Any]]) -> str:
+        encoded = json.dumps(
+            [strategy, model, provider, normalize(messages)], sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT message FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute(
+                "UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+            self.conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, message: Dict[str, Any]) -> None:
+        encoded = json.dumps(message)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                (key, encoded, len(encoded), time.time()),
+            )
+            self.evict()
+            self.conn.commit()
+
+    def evict(self) -> None:
+        (total,) = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+        if total <= self.max_bytes:
+            return
+        rows = self.conn.execute("SELECT key, size FROM entries ORDER BY last_used").fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self.conn.executemany("DELETE FROM entries WHERE key = ?", evicted)
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+
+_user_cache: Optional[UserResponseCache] = None
+
+
+def use_user_cache(cache: Optional[UserResponseCache]) -> None:
+    """Serve the LLM and ReAct user simulators from `cache`, or always call the model if None."""
+    global _user_cache
+    _user_cache = cache
+
+
+def get_user_cache() -> Optional[UserResponseCache]:
+    return _user_cache
+
+
 class LLMUserSimulationEnv(BaseUserSimulationEnv):
+    strategy = "llm"
+    # whether `complete_message` may serve this simulator from the user cache
+    cacheable = True
+
     def __init__(self, model: str, provider: str) -> None:
         super().__init__()
         self.messages: List[Dict[str, Any]] = []
@@ -43,14 +156,36 @@ class LLMUserSimulationEnv(BaseUserSimulationEnv):
         self.total_cost = 0.0
         self.reset()
 
-    def generate_next_message(self, messages: List[Dict[str, Any]]) -> str:
+    def complete_message(self, messages: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], bool]:
+        """Return the next message and whether it comes from the cache."""
+        cache = _user_cache if self.cacheable else None
+        key = None
+        if cache is not None:
+            key = UserResponseCache.key(self.strategy, self.model, self.provider, messages)
+            message = cache.get(key)
+            if message is not None:
+                self.cached_turns += 1
+                return message, True
         res = completion(
+            role="user",
             model=self.model, custom_llm_provider=self.provider, messages=messages
         )
-        message = res.choices[0].message
-        self.messages.append(message.model_dump())
-        self.total_cost = res._hidden_params["response_cost"]
-        return message.content
+        message = res.choices[0].message.model_dump()
+        self.total_cost += res._hidden_params["response_cost"] or 0
+        if cache is not None:
+            cache.put(key, message)
+        return message, False
+
+    def append_message(self, message: Dict[str, Any], cached: bool) -> None:
+        # the marker stays out of the messages, they are sent to the model as they are
+        if cached:
+            self.cached_message_indices.append(len(self.messages))
+        self.messages.append(message)
+
+    def generate_next_message(self, messages: List[Dict[str, Any]]) -> str:
+        message, cached = self.complete_message(messages)
+        self.append_message(message, cached)
+        return message["content"]
 
     def build_system_prompt(self, instruction: Optional[str]) -> str:
         instruction_display = (
@@ -68,6 +203,9 @@ Rules:
 - Try to make the conversation as natural as possible, and stick to the personalities in the instruction."""
 
     def reset(self, instruction: Optional[str] = None) -> str:
+        self.total_cost = 0.0
+        self.cached_turns = 0
+        self.cached_message_indices = []
         self.messages = [
             {
                 "role": "system",
@@ -86,6 +224,8 @@ Rules:
 
 
 class ReactUserSimulationEnv(LLMUserSimulationEnv):
+    strategy = "react"
+
     def __init__(self, model: str, provider: str) -> None:
         super().__init__(model=model, provider=provider)
         self.reset()
@@ -115,15 +255,14 @@ User Response:
 <the user response (this will be parsed and sent to the agent)>"""
 
     def generate_next_message(self, messages: List[Dict[str, Any]]) -> str:
-        res = completion(
-            model=self.model, custom_llm_provider=self.provider, messages=messages
-        )
-        message = res.choices[0].message
-        self.messages.append(message.model_dump())
-        self.total_cost = res._hidden_params["response_cost"]
-        return self.parse_response(message.content)
+        message, cached = self.complete_message(messages)
+        self.append_message(message, cached)
+        return self.parse_response(message["content"])
 
     def reset(self, instruction: Optional[str] = None) -> str:
+        self.total_cost = 0.0
+        self.cached_turns = 0
+        self.cached_message_indices = []
         self.messages = [
             {
                 "role": "system",
@@ -154,22 +293,63 @@ User Response:
 
 
 class VerifyUserSimulationEnv(LLMUserSimulationEnv):
-    def __init__(self, model: str, provider: str, max_attempts: int = 3) -> None:
+    def __init__(
+        self, model: str, provider: str, max_attempts: int = 3, concurrent: bool = False
+    ) -> None:
         self.model = model
         self.provider = provider
         self.max_attempts = max_attempts
+        # generate and verify all attempts at once instead of one after the other
+        self.concurrent = concurrent
+        self.cost_lock = threading.Lock()
         self.reset()
 
+    def generate_candidate(self, messages: List[Dict[str, Any]]) -> Tuple[Any, bool]:
+        res = completion(
+            role="user",
+            model=self.model, custom_llm_provider=self.provider, messages=messages
+        )
+        message = res.choices[0].message
+        with self.cost_lock:
+            self.total_cost += res._hidden_params["response_cost"] or 0
+        return message, verify(self.model, self.provider, message, messages)
+
+    def generate_concurrently(self, messages: List[Dict[str, Any]]) -> str:
+        """Return the first verified candidate, or the last one if none is.
+
+        Candidates still running when one is verified are abandoned, their cost is still
+        counted when they finish.
+        """
+        # abandoned candidates must not see the messages appended after this turn
+        messages = list(messages)
+        executor = ThreadPoolExecutor(max_workers=self.max_attempts)
+        pending = {
+            # the ledger of the episode lives in the caller's context
+            executor.submit(contextvars.copy_context().run, self.generate_candidate, messages)
+            for _ in range(self.max_attempts)
+        }
+        cur_message = None
+        try:
+            while len(pending) > 0:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    cur_message, verified = future.result()
+                    if verified:
+                        self.messages.append(cur_message.model_dump())
+                        return cur_message.content
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        assert cur_message is not None
+        return cur_message.content
+
     def generate_next_message(self, messages: List[Dict[str, Any]]) -> str:
+        if self.concurrent:
+            return self.generate_concurrently(messages)
         attempts = 0
         cur_message = None
         while attempts < self.max_attempts:
-            res = completion(
-                model=self.model, custom_llm_provider=self.provider, messages=messages
-            )
-            cur_message = res.choices[0].message
-            self.total_cost = res._hidden_params["response_cost"]
-            if verify(self.model, self.provider, cur_message, messages):
+            cur_message, verified = self.generate_candidate(messages)
+            if verified:
                 self.messages.append(cur_message.model_dump())
                 return cur_message.content
             attempts += 1
@@ -177,6 +357,9 @@ class VerifyUserSimulationEnv(LLMUserSimulationEnv):
         return cur_message.content
 
     def reset(self, instruction: Optional[str] = None) -> str:
+        self.total_cost = 0.0
+        self.cached_turns = 0
+        self.cached_message_indices = []
         self.messages = [
             {
                 "role": "system",
@@ -225,6 +408,7 @@ Your answer will be parsed, so do not include any other text than the classifica
 
 Classification:"""
     res = completion(
+        role="user",
         model=model,
         custom_llm_provider=provider,
         messages=[{"role": "user", "content": prompt}],
@@ -259,6 +443,7 @@ Reflection:
 Response:
 <the response (this will be parsed and sent to the agent)>"""
     res = completion(
+        role="user",
         model=model,
         custom_llm_provider=provider,
         messages=[{"role": "user", "content": prompt}],
@@ -268,6 +453,9 @@ Response:
 
 
 class ReflectionUserSimulationEnv(LLMUserSimulationEnv):
+    # whether a candidate is kept depends on the verifier, which is not part of the key
+    cacheable = False
+
     def __init__(self, model: str, provider: str, max_attempts: int = 2) -> None:
         self.model = model
         self.provider = provider
@@ -292,6 +480,9 @@ class ReflectionUserSimulationEnv(LLMUserSimulationEnv):
         return initial_response
 
     def reset(self, instruction: Optional[str] = None) -> str:
+        self.total_cost = 0.0
+        self.cached_turns = 0
+        self.cached_message_indices = []
         self.messages = [
             {
                 "role": "system",
@@ -314,7 +505,9 @@ class UserStrategy(enum.Enum):
     LLM = "llm"
     REACT = "react"
     VERIFY = "verify"
+    VERIFY_CONCURRENT = "verify-concurrent"
     REFLECTION = "reflection"
+    SCRIPTED = "scripted"
 
 
 def load_user(
@@ -344,10 +537,18 @@ def load_user(
         if provider is None:
             raise ValueError("Verify user strategy requires a model provider")
         return VerifyUserSimulationEnv(model=model, provider=provider)
+    elif user_strategy == UserStrategy.VERIFY_CONCURRENT:
+        if model is None:
+            raise ValueError("Verify user strategy requires a model")
+        if provider is None:
+            raise ValueError("Verify user strategy requires a model provider")
+        return VerifyUserSimulationEnv(model=model, provider=provider, concurrent=True)
     elif user_strategy == UserStrategy.REFLECTION:
         if model is None:
             raise ValueError("Reflection user strategy requires a model")
         if provider is None:
             raise ValueError("Reflection user strategy requires a model provider")
         return ReflectionUserSimulationEnv(model=model, provider=provider)
+    elif user_strategy == UserStrategy.SCRIPTED:
+        return ScriptedUserSimulationEnv()
     raise ValueError(f"Unknown user strategy {user_strategy}")
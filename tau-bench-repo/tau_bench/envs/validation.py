@@ -0,0 +1,133 @@
+# Copyright Sierra
+
+from typing import Any, Callable, Dict, List, Optional
+
+# (value, path, errors) -> None, appends one message per violation to `errors`
+Check = Callable[[Any, str, List[str]], None]
+
+JSON_TYPES: Dict[str, Callable[[Any], bool]] = {
+    "string": lambda value: isinstance(value, str),
+    "integer": lambda value: isinstance(value, int) and not isinstance(value, bool),
+    "number": lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    "boolean": lambda value: isinstance(value, bool),
+    "array": lambda value: isinstance(value, list),
+    "object": lambda value: isinstance(value, dict),
+    "null": lambda value: value is None,
+}
+
+
+class ArgumentValidationError(ValueError):
+    def __init__(self, tool_name: str, errors: List[str]) -> None:
+        super().__init__(f"invalid arguments for {tool_name}: {'; '.join(errors)}")
+        self.tool_name = tool_name
+        self.errors = errors
+
+
+def _join(path: str, field: Any) -> str:
+    if isinstance(field, int):
+        return f"{path}[{field}]"
+    return field if path == "" else f"{path}.{field}"
+
+
+def _where(path: str) -> str:
+    return "arguments" if path == "" else f"'{path}'"
+
+
+def compile_schema(schema: Dict[str, Any], strict: bool = False) -> Check:
+    """Compile the subset of JSON schema used by tool parameters into a single check.
+
+    Supports `type`, `enum`, `properties`, `required`, `additionalProperties` and
+    `items`. With `strict`, properties that are not declared are rejected, as a tool's
+    `invoke` would fail on them anyway.
+    """
+    checks: List[Check] = []
+
+    types = schema.get("type")
+    if types is not None:
+        type_names = [types] if isinstance(types, str) else list(types)
+        predicates = [JSON_TYPES[type_name] for type_name in type_names]
+        expected = " or ".join(type_names)
+
+        def check_type(value: Any, path: str, errors: List[str]) -> None:
+            if not any(predicate(value) for predicate in predicates):
+                errors.append(
+                    f"{_where(path)} must be of type {expected}, got {type(value).__name__}"
+                )
+
+        checks.append(check_type)
+
+    if "enum" in schema:
+        options = list(schema["enum"])
+
+        def check_enum(value: Any, path: str, errors: List[str]) -> None:
+            if value not in options:
+                errors.append(f"{_where(path)} must be one of {options}, got {value!r}")
+
+        checks.append(check_enum)
+
+    properties = {
+        name: compile_schema(subschema)
+        for name, subschema in schema.get("properties", {}).items()
+    }
+    required: List[str] = list(schema.get("required", []))
+    additional = schema.get("additionalProperties", not strict)
+    if len(properties) > 0 or len(required) > 0 or additional is not True:
+        extra: Optional[Check] = (
+            compile_schema(additional) if isinstance(additional, dict) else None
+        )
+
+        def check_object(value: Any, path: str, errors: List[str]) -> None:
+            if not isinstance(value, dict):
+                return
+            for name in required:
+                if name not in value:
+                    errors.append(f"missing required argument '{_join(path, name)}'")
+            for name, element in value.items():
+                if name in properties:
+                    properties[name](element, _join(path, name), errors)
+                elif extra is not None:
+                    extra(element, _join(path, name), errors)
+                elif additional is False:
+                    errors.append(f"unexpected argument '{_join(path, name)}'")
+
+        checks.append(check_object)
+
+    if "items" in schema:
+        check_item = compile_schema(schema["items"])
+
+        def check_items(value: Any, path: str, errors: List[str]) -> None:
+            if not isinstance(value, list):
+                return
+            for i, element in enumerate(value):
+                check_item(element, _join(path, i), errors)
+
+        checks.append(check_items)
+
+    if len(checks) == 1:
+        return checks[0]
+
+    def check_all(value: Any, path: str, errors: List[str]) -> None:
+        for check in checks:
+            check(value, path, errors)
+
+    return check_all
+
+
+class ArgumentValidator(object):
+    """Validates the arguments of a tool call against the tool's declared parameters."""
+
+    def __init__(self, tool_info: Dict[str, Any]) -> None:
+        self.tool_name = tool_info["function"]["name"]
+        self.check = compile_schema(
+            tool_info["function"].get("parameters", {"type": "object"}), strict=True
+        )
+
+    def errors(self, kwargs: Dict[str, Any]) -> List[str]:
+        errors: List[str] = []
+        self.check(kwargs, "", errors)
+        return errors
+
+    def validate(self, kwargs: Dict[str, Any]) -> None:
+        errors = self.errors(kwargs)
+        if len(errors) > 0:
+            raise ArgumentValidationError(self.tool_name, errors)
@@ -0,0 +1,164 @@
+# Copyright Sierra
+
+import collections
+import contextvars
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+
+class LatencyTracker(object):
+    """Recent latencies of one model, to find how long a call usually takes."""
+
+    def __init__(self, window: int = 200) -> None:
+        self.latencies: Deque[float] = collections.deque(maxlen=window)
+
+    def record(self, latency_ms: float) -> None:
+        self.latencies.append(latency_ms)
+
+    def quantile(self, q: float) -> float:
+        latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+
+class Hedger(object):
+    """Sends a duplicate of a completion call that is slower than usual for its model.
+
+    A call that has not returned after the `quantile` latency of its model's recent
+    calls is sent again, and the first of the two to succeed is returned. The other
+    cannot be interrupted, it finishes in the background and is reported to `on_extra`
+    so its cost is accounted for. At most `max_hedge_rate` of the calls are hedged, and
+    no call is hedged before its model has `min_samples` latencies.
+    """
+
+    def __init__(
+        self,
+        quantile: float = 0.95,
+        max_hedge_rate: float = 0.1,
+        min_samples: int = 20,
+        max_workers: int = 512,
+    ) -> None:
+        self.quantile = quantile
+        self.max_hedge_rate = max_hedge_rate
+        self.min_samples = min_samples
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.trackers: Dict[Tuple[str, Optional[str]], LatencyTracker] = collections.defaultdict(
+            LatencyTracker
+        )
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def hedge_delay(self, model_key: Tuple[str, Optional[str]]) -> Optional[float]:
+        """Return how long to wait before hedging a call, or None if it may not be hedged."""
+        with self.lock:
+            tracker = self.trackers[model_key]
+            if len(tracker.latencies) < self.min_samples:
+                return None
+            if self.hedges + 1 > self.max_hedge_rate * self.calls:
+                return None
+            return tracker.quantile(self.quantile)
+
+    def submit(self, fn: Callable[..., Any], kwargs: Dict[str, Any]) -> Future:
+        start = time.perf_counter()
+
+        def timed() -> Tuple[Any, float]:
+            res = fn(**kwargs)
+            return res, (time.perf_counter() - start) * 1000
+
+        # the ledger of the episode lives in the caller's context
+        return self.executor.submit(contextvars.copy_context().run, timed)
+
+    def completion(
+        self,
+        fn: Callable[..., Any],
+        on_extra: Optional[Callable[[Optional[Any], float, Optional[BaseException]], None]] = None,
+        **kwargs: Any,
+    ) -> Any:
+        model_key = (kwargs.get("model", ""), kwargs.get("custom_llm_provider"))
+        with self.lock:
+            self.calls += 1
+        delay = self.hedge_delay(model_key)
+        if delay is None:
+            start = time.perf_counter()
+            res = fn(**kwargs)
+            self.record_latency(model_key, (time.perf_counter() - start) * 1000)
+            return res
+        primary = self.submit(fn, kwargs)
+        done, _ = wait([primary], timeout=delay / 1000)
+        if len(done) > 0:
+            res, latency_ms = primary.result()
+            self.record_latency(model_key, latency_ms)
+            return res
+        with self.lock:
+            self.hedges += 1
+
+        def record_primary(future: Future) -> None:
+            # the primary latency is what the model would have taken unhedged, whichever
+            # call wins; a failed primary took at least the hedge delay
+            if future.exception() is None:
+                self.record_latency(model_key, future.result()[1])
+            else:
+                self.record_latency(model_key, delay)
+
+        primary.add_done_callback(record_primary)
+        hedge = self.submit(fn, kwargs)
+        futures = [primary, hedge]
+        pending = set(futures)
+        winner: Optional[Future] = None
+        while winner is None and len(pending) > 0:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            # the primary wins a tie
+            winner = next(
+                (f for f in futures if f in done and f.exception() is None), None
+            )
+        if winner is None:
+            # both failed, the primary's error is raised and the hedge's reported
+            if on_extra is not None:
+                report_extra(hedge, on_extra)
+            error = primary.exception()
+            assert error is not None
+            raise error
+        res, _ = winner.result()
+        if winner is hedge:
+            with self.lock:
+                self.hedge_wins += 1
+        if on_extra is not None:
+            # the loser may have failed, finished with the winner or still be running
+            for other in futures:
+                if other is not winner:
+                    other.add_done_callback(lambda f: report_extra(f, on_extra))
+        return res
+
+    def record_latency(self, model_key: Tuple[str, Optional[str]], latency_ms: float) -> None:
+        with self.lock:
+            self.trackers[model_key].record(latency_ms)
+
+    def hedge_rate(self) -> float:
+        return self.hedges / self.calls if self.calls > 0 else 0.0
+
+
+def report_extra(
+    future: Future,
+    on_extra: Callable[[Optional[Any], float, Optional[BaseException]], None],
+) -> None:
+    if future.exception() is not None:
+        on_extra(None, 0.0, future.exception())
+        return
+    res, latency_ms = future.result()
+    on_extra(res, latency_ms, None)
+
+
+_hedger: Optional[Hedger] = None
+
+
+def use_hedger(hedger: Optional[Hedger]) -> None:
+    """Hedge every non-streamed agent and user completion with `hedger`, or none if None."""
+    global _hedger
+    _hedger = hedger
+
+
+def get_hedger() -> Optional[Hedger]:
+    return _hedger
@@ -0,0 +1,220 @@
+# Copyright Sierra
+
+import contextlib
+import contextvars
+import random
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+import litellm
+from pydantic import BaseModel
+
+from tau_bench.agents.usage import get_usage
+from tau_bench.cassette import call_scope, completion as cassette_completion
+from tau_bench.hedging import get_hedger
+
+
+class LLMCall(BaseModel):
+    role: str
+    model: str
+    provider: Optional[str] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_prompt_tokens: int = 0
+    cost: float = 0.0
+    latency_ms: float = 0.0
+    error: Optional[str] = None
+    # failed attempts before the one that returned or raised
+    retries: int = 0
+    # a hedged duplicate that lost the race, its cost is the overhead of hedging
+    hedge: bool = False
+
+
+class UsageLedger(object):
+    """Every LLM call made while the ledger is active, see `recording`.
+
+    A call is recorded once with the number of attempts it retried, see `completion`.
+    """
+
+    def __init__(self) -> None:
+        self.calls: List[LLMCall] = []
+        self.lock = threading.Lock()
+
+    def record(self, call: LLMCall) -> None:
+        with self.lock:
+            self.calls.append(call)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Roll the calls up by role and model, keyed as `role:model`."""
+        summary: Dict[str, Dict[str, Any]] = {}
+        with self.lock:
+            calls = list(self.calls)
+        for call in calls:
+            key = f"{call.role}:{call.model}"
+            if key not in summary:
+                summary[key] = new_usage_summary()
+            entry = summary[key]
+            entry["calls"] += 1
+            entry["errors"] += 1 if call.error is not None else 0
+            entry["retries"] += call.retries
+            entry["prompt_tokens"] += call.prompt_tokens
+            entry["completion_tokens"] += call.completion_tokens
+            entry["cached_prompt_tokens"] += call.cached_prompt_tokens
+            entry["cost"] += call.cost
+            entry["latency_ms"] += call.latency_ms
+            if call.hedge:
+                entry["hedges"] += 1
+                entry["hedge_cost"] += call.cost
+        return summary
+
+
+def new_usage_summary() -> Dict[str, Any]:
+    return {
+        "calls": 0,
+        "errors": 0,
+        "retries": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "cached_prompt_tokens": 0,
+        "cost": 0.0,
+        "latency_ms": 0.0,
+        "hedges": 0,
+        "hedge_cost": 0.0,
+    }
+
+
+def merge_summaries(summaries: List[Dict[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    merged: Dict[str, Dict[str, Any]] = {}
+    for summary in summaries:
+        for key, entry in summary.items():
+            if key not in merged:
+                merged[key] = new_usage_summary()
+            for field, value in entry.items():
+                merged[key][field] += value
+    return merged
+
+
+_ledger: contextvars.ContextVar[Optional[UsageLedger]] = contextvars.ContextVar(
+    "ledger", default=None
+)
+
+
+@contextlib.contextmanager
+def recording(ledger: UsageLedger) -> Iterator[UsageLedger]:
+    """Record the LLM calls of the current thread into `ledger`."""
+    token = _ledger.set(ledger)
+    try:
+        yield ledger
+    finally:
+        _ledger.reset(token)
+
+
+def record_call(call: LLMCall) -> None:
+    ledger = _ledger.get()
+    if ledger is not None:
+        ledger.record(call)
+
+
+def usage_call(role: str, kwargs: Dict[str, Any], res: Any, latency_ms: float) -> LLMCall:
+    usage = get_usage(res)
+    return LLMCall(
+        role=role,
+        model=kwargs.get("model", ""),
+        provider=kwargs.get("custom_llm_provider"),
+        prompt_tokens=usage["prompt_tokens"],
+        completion_tokens=usage["completion_tokens"],
+        cached_prompt_tokens=usage["cached_prompt_tokens"],
+        cost=res._hidden_params.get("response_cost") or 0.0,
+        latency_ms=latency_ms,
+    )
+
+
+# transient provider errors, as retried by the provider SDKs
+RETRYABLE_ERRORS = (
+    litellm.RateLimitError,
+    litellm.APIConnectionError,
+    litellm.Timeout,
+    litellm.InternalServerError,
+    litellm.ServiceUnavailableError,
+)
+# the retries the OpenAI SDK makes by default
+DEFAULT_NUM_RETRIES = 2
+
+
+def retry_delay(attempt: int, error: BaseException, backoff_max: float = 30.0) -> float:
+    """Exponential backoff with full jitter, or the delay the provider asked for."""
+    response = getattr(error, "response", None)
+    retry_after = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+    if retry_after is not None:
+        try:
+            return min(float(retry_after), backoff_max)
+        except ValueError:
+            pass
+    return random.uniform(0, min(backoff_max, 0.5 * 2**attempt))
+
+
+def completion(role: str = "agent", num_retries: int = DEFAULT_NUM_RETRIES, **kwargs: Any) -> Any:
+    """`litellm.completion` through the active cassette and hedger, recorded in the active ledger.
+
+    Transient errors are retried here, up to `num_retries` times, rather than inside the
+    provider SDK, so the ledger knows how many attempts each call took. Streamed calls
+    are returned as is, their consumer records them with `record_call` once it has read
+    what it needs, without their retries.
+    """
+    start = time.perf_counter()
+    hedger = get_hedger()
+    ledger = _ledger.get()
+    # retries the SDK made on its own would not be counted
+    kwargs.setdefault("max_retries", 0)
+
+    def on_extra(res: Optional[Any], latency_ms: float, error: Optional[BaseException]) -> None:
+        # runs once the losing call finishes, possibly after this call returned
+        if ledger is None:
+            return
+        call = (
+            usage_call(role, kwargs, res, latency_ms)
+            if res is not None
+            else LLMCall(role=role, model=kwargs.get("model", ""), error=type(error).__name__)
+        )
+        ledger.record(call.model_copy(update={"hedge": True}))
+
+    retries = 0
+    # retries and hedges of this call replay the same cassette entry
+    with call_scope():
+        while True:
+            try:
+                if hedger is not None and not kwargs.get("stream", False):
+                    res = hedger.completion(cassette_completion, on_extra=on_extra, **kwargs)
+                else:
+                    res = cassette_completion(**kwargs)
+                break
+            except RETRYABLE_ERRORS as e:
+                if retries >= num_retries:
+                    record_failure(role, kwargs, e, start, retries)
+                    raise
+                time.sleep(retry_delay(retries, e))
+                retries += 1
+            except Exception as e:
+                record_failure(role, kwargs, e, start, retries)
+                raise
+    if kwargs.get("stream", False):
+        return res
+    call = usage_call(role, kwargs, res, (time.perf_counter() - start) * 1000)
+    record_call(call.model_copy(update={"retries": retries}))
+    return res
+
+
+def record_failure(
+    role: str, kwargs: Dict[str, Any], error: BaseException, start: float, retries: int
+) -> None:
+    record_call(
+        LLMCall(
+            role=role,
+            model=kwargs.get("model", ""),
+            provider=kwargs.get("custom_llm_provider"),
+            latency_ms=(time.perf_counter() - start) * 1000,
+            error=type(error).__name__,
+            retries=retries,
+        )
+    )
@@ -0,0 +1,350 @@
+# Copyright Sierra
+
+"""A local OpenAI-compatible chat completions server that plays both sides of a task.
+
+The simulated user opens with a `[task N]` marker, and the agent then replays the
+ground-truth actions of task N one per turn (as `tool_calls` when the request carries
+tools, in the ReAct `Action:` format otherwise) before answering with the task outputs,
+at which point the user stops. Point the harness at it with e.g.
+
+    OPENAI_API_BASE=http://127.0.0.1:8000/v1 OPENAI_API_KEY=mock python run.py \\
+        --model mock --model-provider openai --user-model mock --user-model-provider openai \\
+        --max-concurrency 1000
+
+Latency, server errors and rate limiting are injected at configurable rates, and
+`GET /stats` reports request counters.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from tau_bench.envs import get_env
+from tau_bench.envs.metrics import estimate_tokens
+from tau_bench.types import RESPOND_ACTION_NAME, RESPOND_ACTION_FIELD_NAME, Task
+
+USER_PROMPT_PREFIX = "You are a user interacting with an agent."
+SUPERVISOR_PROMPT_PREFIX = "You are a supervisor of the Agent in the conversation."
+TASK_MARKER = re.compile(r"\[task (\d+)\]")
+STOP = "###STOP###"
+
+STATUS_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 429: "Too Many Requests", 500: "Internal Server Error"}
+
+
+def get_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--env", type=str, choices=["retail", "airline"], default="retail")
+    parser.add_argument("--task-split", type=str, default="test", choices=["train", "test", "dev"])
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Mean latency of a completion")
+    parser.add_argument(
+        "--latency-dist",
+        type=str,
+        default="fixed",
+        choices=["fixed", "exponential", "lognormal"],
+        help="Distribution of the completion latency around its mean",
+    )
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Sigma of the lognormal latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests rejected with a 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After of 429 responses, in seconds")
+    parser.add_argument("--stream-chunk-chars", type=int, default=16, help="Characters per streamed chunk")
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args()
+
+
+class MockLLM(object):
+    """Generates the next message of either side of a ground-truth conversation."""
+
+    def __init__(self, tasks: List[Task]) -> None:
+        self.tasks = tasks
+        self.task_by_instruction = {}
+        for i, task in enumerate(tasks):
+            self.task_by_instruction.setdefault(task.instruction, i)
+
+    def reply(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        messages = request["messages"]
+        system = content_text(messages[0]) if len(messages) > 0 else ""
+        if system.startswith(USER_PROMPT_PREFIX):
+            return {"role": "assistant", "content": self.user_reply(system, messages)}
+        if len(messages) == 1 and content_text(messages[0]).startswith(SUPERVISOR_PROMPT_PREFIX):
+            return {"role": "assistant", "content": "true"}
+        return self.agent_reply(messages, tools=request.get("tools"))
+
+    def user_reply(self, system: str, messages: List[Dict[str, Any]]) -> str:
+        if any(m["role"] == "assistant" for m in messages):
+            response = STOP
+        else:
+            task_index = next(
+                (i for instruction, i in self.task_by_instruction.items() if instruction in system),
+                None,
+            )
+            response = "Hi, I need some help." if task_index is None else f"Hi, I need some help. [task {task_index}]"
+        if "User Response:" in system:
+            return f"User Response:\n{response}"
+        return response
+
+    def agent_reply(
+        self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        match = None
+        for message in messages:
+            if message["role"] == "user":
+                match = TASK_MARKER.search(content_text(message))
+                break
+        if match is None:
+            return {"role": "assistant", "content": "How can I help you?"}
+        task_index = int(match.group(1))
+        task = self.tasks[task_index]
+        actions = [a for a in task.actions if a.name != RESPOND_ACTION_NAME]
+        step = sum(1 for m in messages if m["role"] == "assistant")
+        if step < len(actions):
+            name, kwargs = actions[step].name, actions[step].kwargs
+        else:
+            name = RESPOND_ACTION_NAME
+            kwargs = {RESPOND_ACTION_FIELD_NAME: " ".join(task.outputs) or "Is there anything else?"}
+        if tools is None:
+            action = json.dumps({"name": name, "arguments": kwargs})
+            return {"role": "assistant", "content": f"Thought:\nNext step.\nAction:\n{action}"}
+        if name == RESPOND_ACTION_NAME:
+            return {"role": "assistant", "content": kwargs[RESPOND_ACTION_FIELD_NAME]}
+        return {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [
+                {
+                    "id": f"call_{task_index}_{step}",
+                    "type": "function",
+                    "function": {"name": name, "arguments": json.dumps(kwargs)},
+                }
+            ],
+        }
+
+
+def content_text(message: Dict[str, Any]) -> str:
+    content = message.get("content")
+    if isinstance(content, list):
+        return "".join(block.get("text", "") for block in content if isinstance(block, dict))
+    return content or ""
+
+
+def usage(messages: List[Dict[str, Any]], reply: Dict[str, Any]) -> Dict[str, int]:
+    prompt_tokens = sum(estimate_tokens(content_text(m)) for m in messages)
+    completion_tokens = estimate_tokens(content_text(reply)) + sum(
+        estimate_tokens(c["function"]["arguments"]) for c in reply.get("tool_calls") or []
+    )
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+class MockServer(object):
+    def __init__(self, llm: MockLLM, args: argparse.Namespace) -> None:
+        self.llm = llm
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.stats = {
+            "requests": 0,
+            "completions": 0,
+            "errors": 0,
+            "rate_limited": 0,
+            "in_flight": 0,
+            "max_in_flight": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+        }
+        self.started = time.time()
+
+    def latency(self) -> float:
+        mean = self.args.latency_ms / 1000
+        if mean <= 0:
+            return 0.0
+        if self.args.latency_dist == "exponential":
+            return self.random.expovariate(1 / mean)
+        if self.args.latency_dist == "lognormal":
+            sigma = self.args.latency_sigma
+            # mu chosen so that the distribution has the requested mean
+            return self.random.lognormvariate(math.log(mean) - sigma**2 / 2, sigma)
+        return mean
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, value = line.decode("latin-1").split(":", 1)
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", "0")))
+                await self.dispatch(method, path.split("?")[0], body, writer)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(
+        self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter
+    ) -> None:
+        self.stats["requests"] += 1
+        if method == "GET" and path == "/stats":
+            elapsed = time.time() - self.started
+            await send_json(writer, 200, {**self.stats, "completions_per_second": self.stats["completions"] / elapsed})
+            return
+        if method == "GET" and path in ("/models", "/v1/models"):
+            await send_json(writer, 200, {"object": "list", "data": [{"id": "mock", "object": "model"}]})
+            return
+        if method != "POST" or path not in ("/chat/completions", "/v1/chat/completions"):
+            await send_json(writer, 404, {"error": {"message": f"Unknown route {method} {path}"}})
+            return
+        try:
+            request = json.loads(body)
+        except json.JSONDecodeError as e:
+            await send_json(writer, 400, {"error": {"message": str(e)}})
+            return
+        self.stats["in_flight"] += 1
+        self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+        try:
+            await self.complete(request, writer)
+        finally:
+            self.stats["in_flight"] -= 1
+
+    async def complete(self, request: Dict[str, Any], writer: asyncio.StreamWriter) -> None:
+        draw = self.random.random()
+        if draw < self.args.rate_limit_rate:
+            self.stats["rate_limited"] += 1
+            await send_json(
+                writer,
+                429,
+                {"error": {"message": "Rate limit exceeded", "type": "rate_limit_error"}},
+                extra_headers={"Retry-After": str(self.args.retry_after)},
+            )
+            return
+        await asyncio.sleep(self.latency())
+        if draw < self.args.rate_limit_rate + self.args.error_rate:
+            self.stats["errors"] += 1
+            await send_json(writer, 500, {"error": {"message": "Injected server error", "type": "server_error"}})
+            return
+        reply = self.llm.reply(request)
+        token_usage = usage(request["messages"], reply)
+        self.stats["completions"] += 1
+        self.stats["prompt_tokens"] += token_usage["prompt_tokens"]
+        self.stats["completion_tokens"] += token_usage["completion_tokens"]
+        response_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        model = request.get("model", "mock")
+        if request.get("stream", False):
+            await self.stream(writer, response_id, created, model, reply, token_usage)
+            return
+        await send_json(
+            writer,
+            200,
+            {
+                "id": response_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": reply,
+                        "finish_reason": "tool_calls" if reply.get("tool_calls") else "stop",
+                    }
+                ],
+                "usage": token_usage,
+            },
+        )
+
+    async def stream(
+        self,
+        writer: asyncio.StreamWriter,
+        response_id: str,
+        created: int,
+        model: str,
+        reply: Dict[str, Any],
+        token_usage: Dict[str, int],
+    ) -> None:
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\nTransfer-Encoding: chunked\r\n\r\n"
+        )
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None, **extra: Any) -> None:
+            event = {
+                "id": response_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                **extra,
+            }
+            write_chunk(writer, f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+
+        chunk({"role": "assistant", "content": ""})
+        content = reply.get("content") or ""
+        size = max(1, self.args.stream_chunk_chars)
+        for i in range(0, len(content), size):
+            chunk({"content": content[i : i + size]})
+            await writer.drain()
+        for i, tool_call in enumerate(reply.get("tool_calls") or []):
+            chunk({"tool_calls": [{"index": i, **tool_call}]})
+        chunk({}, finish_reason="tool_calls" if reply.get("tool_calls") else "stop", usage=token_usage)
+        write_chunk(writer, b"data: [DONE]\n\n")
+        write_chunk(writer, b"")
+        await writer.drain()
+
+
+def write_chunk(writer: asyncio.StreamWriter, data: bytes) -> None:
+    writer.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+
+
+async def send_json(
+    writer: asyncio.StreamWriter,
+    status: int,
+    payload: Dict[str, Any],
+    extra_headers: Optional[Dict[str, str]] = None,
+) -> None:
+    body = json.dumps(payload).encode("utf-8")
+    headers = {
+        "Content-Type": "application/json",
+        "Content-Length": str(len(body)),
+        **(extra_headers or {}),
+    }
+    head = f"HTTP/1.1 {status} {STATUS_REASONS.get(status, '')}\r\n" + "".join(
+        f"{key}: {value}\r\n" for key, value in headers.items()
+    )
+    writer.write(head.encode("latin-1") + b"\r\n" + body)
+    await writer.drain()
+
+
+async def serve(args: argparse.Namespace) -> None:
+    env = get_env(args.env, user_strategy="human", user_model="mock", task_split=args.task_split, task_index=0)
+    server = MockServer(MockLLM(env.tasks), args)
+    listener = await asyncio.start_server(server.handle, args.host, args.port, backlog=4096)
+    print(f"Mock LLM serving {len(env.tasks)} {args.env}/{args.task_split} tasks on http://{args.host}:{args.port}/v1")
+    async with listener:
+        await listener.serve_forever()
+
+
+def main() -> None:
+    asyncio.run(serve(get_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import argparse
+import time
 from typing import Any, TypeVar
 
 from pydantic import BaseModel
@@ -80,6 +81,19 @@ class API(object):
                     method = wrapper(method)
                 setattr(cls, method_name, method)
 
+    def cache_key(self) -> dict[str, Any]:
+        """The models and strategies the answers of the API depend on."""
+        return {
+            "binary_classify_models": self.binary_classify_models,
+            "classify_models": self.classify_models,
+            "parse_models": self.parse_models,
+            "generate_models": self.generate_models,
+            "parse_force_models": self.parse_force_models,
+            "score_models": self.score_models,
+            "sampling_strategy": self.sampling_strategy,
+            "request_router": self.request_router,
+        }
+
     @classmethod
     def from_general_model(
         cls,
@@ -232,9 +246,18 @@ class API(object):
         if isinstance(sampling_strategy, EnsembleSamplingStrategy):
             return self._run_with_sampling_strategy(models, datapoint, sampling_strategy)
         model = self.request_router.route(dp=datapoint, available_models=models)
-        return self._run_with_sampling_strategy(
-            models=[model], datapoint=datapoint, sampling_strategy=sampling_strategy
-        )
+        start = time.perf_counter()
+        try:
+            res = self._run_with_sampling_strategy(
+                models=[model], datapoint=datapoint, sampling_strategy=sampling_strategy
+            )
+        except Exception:
+            self.request_router.observe(
+                model, datapoint, (time.perf_counter() - start) * 1000, error=True
+            )
+            raise
+        self.request_router.observe(model, datapoint, (time.perf_counter() - start) * 1000)
+        return res
 
     def classify(
         self,
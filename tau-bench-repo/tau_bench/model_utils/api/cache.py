@@ -1,20 +1,28 @@
+import abc
 import functools
 import hashlib
 import inspect
+import json
+import os
+import pickle
+import sqlite3
 import threading
-from collections import defaultdict
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from enum import Enum
 from multiprocessing import Lock
 from typing import Any, Callable, TypeVar
 
 from pydantic import BaseModel
+from pydantic_core import PydanticSerializationError
 
 T = TypeVar("T")
 
 USE_CACHE = True
 _USE_CACHE_LOCK = Lock()
-cache: dict[str, tuple[T, threading.Event]] = {}
-lock = threading.Lock()
-conditions = defaultdict(threading.Condition)
 
 
 def disable_cache():
@@ -29,59 +37,458 @@ def enable_cache():
         USE_CACHE = True
 
 
-def hash_item(item: Any) -> int:
-    if isinstance(item, dict):
-        return hash(tuple({k: hash_item(v) for k, v in sorted(item.items())}))
-    elif isinstance(item, list):
-        return hash(tuple([hash_item(x) for x in item]))
-    elif isinstance(item, set):
-        return hash(frozenset([hash_item(x) for x in item]))
-    elif isinstance(item, tuple):
-        return hash(tuple([hash_item(x) for x in item]))
-    elif isinstance(item, BaseModel):
-        return hash_item(item.model_json_schema())
-    return hash(item)
+@dataclass
+class CacheMetrics:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    # calls that waited for the same call in flight in this or another process
+    dedup_waits: int = 0
+
+
+class CacheStore(abc.ABC):
+    """Where `cache_call_w_dedup` keeps results, keyed by `hash_func_call`.
+
+    `acquire` and `release` lease a key to one caller across processes, stores that live
+    in a single process always grant the lease.
+    """
+
+    def __init__(self) -> None:
+        self.cache_metrics = CacheMetrics()
+        self.metrics_lock = threading.Lock()
+
+    @abc.abstractmethod
+    def get(self, key: str, record: bool = True) -> tuple[bool, Any]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def put(self, key: str, value: Any) -> None:
+        raise NotImplementedError
+
+    def acquire(self, key: str) -> bool:
+        return True
+
+    def release(self, key: str) -> None:
+        pass
+
+    def leased(self, key: str) -> bool:
+        return False
+
+    def count(self, **increments: int) -> None:
+        with self.metrics_lock:
+            for name, increment in increments.items():
+                setattr(self.cache_metrics, name, getattr(self.cache_metrics, name) + increment)
+
+    def metrics(self) -> dict[str, int]:
+        with self.metrics_lock:
+            return asdict(self.cache_metrics)
+
+
+class MemoryLRUStore(CacheStore):
+    """Results of this process, the least recently used are evicted past `max_entries`."""
+
+    def __init__(self, max_entries: int | None = 10_000, ttl_s: float | None = None) -> None:
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str, record: bool = True) -> tuple[bool, Any]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.ttl_s is not None and time.time() - entry[0] > self.ttl_s:
+                del self.entries[key]
+                self.count(expirations=1)
+                entry = None
+            if entry is None:
+                if record:
+                    self.count(misses=1)
+                return False, None
+            self.entries.move_to_end(key)
+        if record:
+            self.count(hits=1)
+        return True, entry[1]
+
+    def put(self, key: str, value: Any) -> None:
+        with self.lock:
+            self.entries[key] = (time.time(), value)
+            self.entries.move_to_end(key)
+            evicted = 0
+            while self.max_entries is not None and len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                evicted += 1
+        if evicted > 0:
+            self.count(evictions=evicted)
+
+
+class SQLiteStore(CacheStore):
+    """Pickled results in a SQLite file, shared by every process that opens it.
+
+    The least recently used entries are evicted once the file holds more than `max_bytes`
+    of results, and entries older than `ttl_s` are dropped when read. A call in flight
+    holds a lease on its key so other processes wait for its result instead of making
+    the same call, a lease expires after `lease_s` in case its process died.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int | None = 1024 * 1024 * 1024,
+        ttl_s: float | None = None,
+        lease_s: float = 600.0,
+    ) -> None:
+        super().__init__()
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self.lease_s = lease_s
+        self.owner = uuid.uuid4().hex
+        self.lock = threading.Lock()
+        if os.path.dirname(path) != "":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries "
+            "(key TEXT PRIMARY KEY, value BLOB, size INTEGER, created REAL, last_used REAL)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, owner TEXT, expires REAL)"
+        )
+
+    def get(self, key: str, record: bool = True) -> tuple[bool, Any]:
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value, created FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.ttl_s is not None and now - row[1] > self.ttl_s:
+                self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.count(expirations=1)
+                row = None
+            if row is None:
+                if record:
+                    self.count(misses=1)
+                return False, None
+            self.conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (now, key))
+        if record:
+            self.count(hits=1)
+        return True, pickle.loads(row[0])
+
+    def put(self, key: str, value: Any) -> None:
+        try:
+            encoded = pickle.dumps(value)
+        except Exception:
+            # e.g. an instance of a type defined in a function, it is only deduplicated
+            return
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                    (key, encoded, len(encoded), now, now),
+                )
+                evicted = self.evict()
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        if evicted > 0:
+            self.count(evictions=evicted)
+
+    def evict(self) -> int:
+        if self.max_bytes is None:
+            return 0
+        (total,) = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+        if total <= self.max_bytes:
+            return 0
+        rows = self.conn.execute("SELECT key, size FROM entries ORDER BY last_used").fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self.conn.executemany("DELETE FROM entries WHERE key = ?", evicted)
+        return len(evicted)
+
+    def acquire(self, key: str) -> bool:
+        now = time.time()
+        with self.lock:
+            self.conn.execute("DELETE FROM leases WHERE key = ? AND expires < ?", (key, now))
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO leases VALUES (?, ?, ?)",
+                (key, self.owner, now + self.lease_s),
+            )
+            return cursor.rowcount == 1
+
+    def release(self, key: str) -> None:
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM leases WHERE key = ? AND owner = ?", (key, self.owner)
+            )
+
+    def leased(self, key: str) -> bool:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM leases WHERE key = ? AND expires >= ?", (key, time.time())
+            ).fetchone()
+        return row is not None
+
+
+_store: CacheStore = MemoryLRUStore()
+
+
+def set_cache_store(store: CacheStore) -> None:
+    """Keep the results of every cached API call in `store` from now on."""
+    global _store
+    _store = store
+
 
+def get_cache_store() -> CacheStore:
+    return _store
 
-def hash_func_call(func: Callable[..., Any], args: tuple[Any], kwargs: dict[str, Any]) -> str:
-    bound_args = inspect.signature(func).bind(*args, **kwargs)
-    bound_args.apply_defaults()
-    standardized_args = sorted(bound_args.arguments.items())
-    arg_hash = hash_item(standardized_args)
-    hashed_func = id(func)
-    call = (hashed_func, arg_hash)
-    return hashlib.md5(str(call).encode()).hexdigest()
+
+def cache_metrics() -> dict[str, int]:
+    return _store.metrics()
+
+
+_schema_fingerprints: "weakref.WeakKeyDictionary[type, str]" = weakref.WeakKeyDictionary()
+_schema_lock = threading.Lock()
+
+
+def schema_fingerprint(typ: type[BaseModel]) -> str:
+    """A hash of the JSON schema of `typ`, computed once per type."""
+    fingerprint = _schema_fingerprints.get(typ)
+    if fingerprint is None:
+        schema = json.dumps(typ.model_json_schema(), sort_keys=True)
+        fingerprint = hashlib.sha256(schema.encode("utf-8")).hexdigest()
+        with _schema_lock:
+            _schema_fingerprints[typ] = fingerprint
+    return fingerprint
+
+
+class KeyEncoder(object):
+    """Encodes values canonically in a single pass, the same in every process.
+
+    Each value is tagged with its kind so e.g. `1`, `1.0`, `True` and `"1"` differ, and
+    strings are length-prefixed rather than escaped. Other objects, like the API and its
+    models, are keyed by what their `cache_key()` method returns, e.g. a model's name and
+    temperature but not its client, and cannot be encoded without one. An object met
+    again, like a model shared by the API's model lists, reuses its first encoding.
+    """
+
+    def __init__(self) -> None:
+        self.parts: list[str] = []
+        self.objects: dict[int, str] = {}
+
+    def encode(self, item: Any) -> None:
+        parts = self.parts
+        if isinstance(item, str):
+            parts.append(f"s{len(item)}:")
+            parts.append(item)
+        elif item is None:
+            parts.append("n")
+        elif isinstance(item, bool):
+            parts.append("T" if item else "F")
+        elif isinstance(item, int):
+            parts.append(f"i{item};")
+        elif isinstance(item, float):
+            parts.append(f"f{item!r};")
+        elif isinstance(item, (list, tuple)):
+            parts.append("[")
+            for x in item:
+                self.encode(x)
+            parts.append("]")
+        elif isinstance(item, dict):
+            parts.append("{")
+            for k, v in sorted(item.items(), key=lambda kv: str(kv[0])):
+                self.encode(str(k))
+                self.encode(v)
+            parts.append("}")
+        elif isinstance(item, (set, frozenset)):
+            encoded = []
+            for x in item:
+                encoder = KeyEncoder()
+                encoder.encode(x)
+                encoded.append("".join(encoder.parts))
+            parts.append("<")
+            parts.extend(sorted(encoded))
+            parts.append(">")
+        elif isinstance(item, Enum):
+            parts.append("e")
+            self.encode(item.value)
+        elif isinstance(item, BaseModel):
+            self.encode(type(item).__qualname__)
+            try:
+                self.encode(item.model_dump_json())
+            except PydanticSerializationError:
+                # e.g. a datapoint holding the type to parse into
+                self.encode({name: getattr(item, name) for name in type(item).model_fields})
+        elif isinstance(item, type):
+            if issubclass(item, BaseModel):
+                parts.append(f"j{schema_fingerprint(item)}")
+            else:
+                self.encode(f"{item.__module__}.{item.__qualname__}")
+        elif id(item) in self.objects:
+            parts.append(self.objects[id(item)])
+        else:
+            cache_key = getattr(item, "cache_key", None)
+            if cache_key is None:
+                raise TypeError(
+                    f"Cannot key a call on a {type(item).__qualname__}, "
+                    "it has no cache_key() method"
+                )
+            start = len(parts)
+            parts.append("o")
+            self.encode(f"{type(item).__module__}.{type(item).__qualname__}")
+            self.encode(cache_key())
+            self.objects[id(item)] = "".join(parts[start:])
+
+    def digest(self) -> str:
+        return hashlib.sha256("".join(self.parts).encode("utf-8", "surrogatepass")).hexdigest()
+
+
+class ArgBinder(object):
+    """Binds the arguments of calls to `func` by name, like `inspect.Signature.bind`.
+
+    The signature is inspected once, calls with only positional-or-keyword parameters
+    are then bound without it.
+    """
+
+    def __init__(self, func: Callable[..., Any]) -> None:
+        self.signature = inspect.signature(func)
+        params = list(self.signature.parameters.values())
+        self.simple = all(p.kind == inspect.Parameter.POSITIONAL_OR_KEYWORD for p in params)
+        self.names = [p.name for p in params]
+        self.name_set = set(self.names)
+        self.defaults = {
+            p.name: p.default for p in params if p.default is not inspect.Parameter.empty
+        }
+
+    def bind(self, args: tuple[Any], kwargs: dict[str, Any]) -> dict[str, Any]:
+        if not self.simple or len(args) > len(self.names):
+            return self.bind_with_signature(args, kwargs)
+        arguments = dict(zip(self.names, args))
+        for name, value in kwargs.items():
+            if name in arguments or name not in self.name_set:
+                return self.bind_with_signature(args, kwargs)
+            arguments[name] = value
+        if len(arguments) < len(self.names):
+            for name in self.names:
+                if name not in arguments:
+                    if name not in self.defaults:
+                        return self.bind_with_signature(args, kwargs)
+                    arguments[name] = self.defaults[name]
+        return arguments
+
+    def bind_with_signature(self, args: tuple[Any], kwargs: dict[str, Any]) -> dict[str, Any]:
+        # also raises the usual TypeError for a call that does not match
+        bound_args = self.signature.bind(*args, **kwargs)
+        bound_args.apply_defaults()
+        return dict(bound_args.arguments)
+
+
+def hash_func_call(
+    func: Callable[..., Any],
+    args: tuple[Any],
+    kwargs: dict[str, Any],
+    binder: ArgBinder | None = None,
+) -> str:
+    if binder is None:
+        binder = ArgBinder(func)
+    encoder = KeyEncoder()
+    encoder.encode(f"{func.__module__}.{func.__qualname__}")
+    encoder.encode(binder.bind(args, kwargs))
+    return encoder.digest()
+
+
+class InFlightCall(object):
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+in_flight: dict[str, InFlightCall] = {}
+lock = threading.Lock()
+# keys whose call is being made by this thread, a nested call with the same key is not cached
+held = threading.local()
+
+
+def call_with_lease(
+    store: CacheStore, key: str, func: Callable[..., T], args: tuple[Any], kwargs: dict[str, Any]
+) -> T:
+    waited = False
+    while not store.acquire(key):
+        # another process makes this call, wait for its result or for its lease to go
+        if not waited:
+            store.count(dedup_waits=1)
+            waited = True
+        while store.leased(key):
+            time.sleep(0.05)
+        found, result = store.get(key, record=False)
+        if found:
+            return result
+    try:
+        found, result = store.get(key, record=False)
+        if found:
+            return result
+        result = func(*args, **kwargs)
+        store.put(key, result)
+        return result
+    finally:
+        store.release(key)
 
 
 def cache_call_w_dedup(func: Callable[..., T]) -> Callable[..., T]:
+    """Cache the results of `func` in the cache store, making each distinct call once.
+
+    Concurrent identical calls wait for the first one and share its result or its
+    exception. Exceptions are not cached, a failed call is made again next time.
+    """
+
+    binder = ArgBinder(func)
+
     @functools.wraps(func)
     def wrapper(*args: Any, **kwargs: Any) -> T:
         if not USE_CACHE:
             return func(*args, **kwargs)
-        key = hash_func_call(func=func, args=args, kwargs=kwargs)
-        if key in cache:
-            result, event = cache[key]
-            if event.is_set():
-                return result
-        else:
+        key = hash_func_call(func=func, args=args, kwargs=kwargs, binder=binder)
+        keys = getattr(held, "keys", None)
+        if keys is None:
+            keys = held.keys = set()
+        if key in keys:
+            return func(*args, **kwargs)
+        store = _store
+        found, result = store.get(key)
+        if found:
+            return result
+        with lock:
+            call = in_flight.get(key)
+            is_owner = call is None
+            if is_owner:
+                call = in_flight[key] = InFlightCall()
+        if not is_owner:
+            store.count(dedup_waits=1)
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        keys.add(key)
+        try:
+            call.result = call_with_lease(store, key, func, args, kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            keys.discard(key)
             with lock:
-                cache[key] = (None, threading.Event())
-
-        condition = conditions[key]
-        with condition:
-            if cache[key][1].is_set():
-                return cache[key][0]
-            if not cache[key][0]:
-                try:
-                    result = func(*args, **kwargs)
-                    with lock:
-                        cache[key] = (result, threading.Event())
-                        cache[key][1].set()
-                except Exception as e:
-                    with lock:
-                        cache[key] = (e, threading.Event())
-                        cache[key][1].set()
-                    raise e
-            return cache[key][0]
+                del in_flight[key]
+            call.event.set()
 
     return wrapper
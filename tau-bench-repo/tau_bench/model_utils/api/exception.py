@@ -1,9 +1,9 @@
 import json
 import os
 import time
-from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Callable, TypeVar
 
+from tau_bench.model_utils.executor import SAMPLES, get_executor
 from tau_bench.model_utils.model.exception import ModelError, Result
 
 T = TypeVar("T")
@@ -53,8 +53,9 @@ def execute_and_filter_model_errors(
         except ModelError as e:
             return Result(value=None, error=e)
 
-    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
-        results = list(executor.map(_invoke_w_o_llm_error, funcs))
+    results = get_executor().map(
+        _invoke_w_o_llm_error, funcs, max_concurrency=max_concurrency, level=SAMPLES
+    )
 
     errors: list[ModelError] = []
     values = []
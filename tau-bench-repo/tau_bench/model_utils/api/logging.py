@@ -1,16 +1,21 @@
+import atexit
 import functools
-import inspect
+import gzip
 import json
-from multiprocessing import Lock
+import os
+import queue
+import shutil
+import threading
+import time
+from dataclasses import asdict, dataclass
 from typing import Any
 
 from pydantic import BaseModel
 
+from tau_bench.model_utils.api.cache import ArgBinder
 from tau_bench.model_utils.api.sample import SamplingStrategy
 from tau_bench.model_utils.model.utils import optionalize_type
 
-log_files = {}
-
 
 def prep_for_json_serialization(obj: Any, from_parse_method: bool = False):
     # TODO: refine type annotations
@@ -40,35 +45,227 @@ def prep_for_json_serialization(obj: Any, from_parse_method: bool = False):
         raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
 
 
+@dataclass
+class LogWriterConfig:
+    max_queue: int = 10_000
+    batch_size: int = 256
+    flush_interval_s: float = 1.0
+    # rotate the file once it grows past this size, never if None
+    max_bytes: int | None = None
+    # compress rotated files with "gzip" or "zstd", the latter needs `zstandard`
+    compression: str | None = None
+
+
+@dataclass
+class LogWriterMetrics:
+    enqueued: int = 0
+    written: int = 0
+    dropped: int = 0
+    errors: int = 0
+    batches: int = 0
+    rotations: int = 0
+
+
+class LogRecord(object):
+    def __init__(
+        self, cls_name: str, method_name: str, kwargs: dict[str, Any], response: Any
+    ) -> None:
+        self.cls_name = cls_name
+        self.method_name = method_name
+        self.kwargs = kwargs
+        self.response = response
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "cls_name": self.cls_name,
+                "method_name": self.method_name,
+                "kwargs": {
+                    k: prep_for_json_serialization(
+                        v, from_parse_method=self.method_name in ["parse", "async_parse"]
+                    )
+                    for k, v in self.kwargs.items()
+                },
+                "response": prep_for_json_serialization(self.response),
+            }
+        )
+
+
+class LogWriter(object):
+    """Appends API call records to a JSONL file from a background thread.
+
+    Callers serialize their records as they submit them, so arguments or responses
+    changed after the call do not reach the log. The writer writes them in batches of
+    up to `batch_size`, at least every `flush_interval_s`. Records that do not fit in
+    the queue are dropped and counted rather than blocking the caller, and records that
+    cannot be serialized or written are counted as errors without raising.
+    """
+
+    def __init__(self, path: str, config: LogWriterConfig | None = None) -> None:
+        self.path = path
+        self.config = config if config is not None else LogWriterConfig()
+        if self.config.compression not in (None, "gzip", "zstd"):
+            raise ValueError(f"Unknown compression: {self.config.compression}")
+        if self.config.compression == "zstd":
+            import zstandard  # noqa: F401, fail now rather than at the first rotation
+        # serialized records, and flush markers set once every record before them is written
+        self.queue: queue.Queue[str | threading.Event] = queue.Queue(
+            maxsize=self.config.max_queue
+        )
+        self.lock = threading.Lock()
+        self.log_metrics = LogWriterMetrics()
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+
+    def submit(self, record: LogRecord) -> None:
+        try:
+            line = f"{record.to_json()}\n"
+        except Exception:
+            with self.lock:
+                self.log_metrics.errors += 1
+            return
+        try:
+            self.queue.put_nowait(line)
+        except queue.Full:
+            with self.lock:
+                self.log_metrics.dropped += 1
+            return
+        with self.lock:
+            self.log_metrics.enqueued += 1
+
+    def loop(self) -> None:
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.config.flush_interval_s
+            while len(batch) < self.config.batch_size and isinstance(batch[-1], str):
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            lines = [item for item in batch if isinstance(item, str)]
+            try:
+                self.write(lines)
+            except Exception:
+                # a failed batch must not stop the writer, its records are lost
+                with self.lock:
+                    self.log_metrics.errors += max(len(lines), 1)
+            finally:
+                for item in batch:
+                    if isinstance(item, threading.Event):
+                        item.set()
+                    self.queue.task_done()
+
+    def write(self, lines: list[str]) -> None:
+        errors = 0
+        if len(lines) > 0:
+            try:
+                with open(self.path, "a") as f:
+                    f.write("".join(lines))
+            except OSError:
+                errors += len(lines)
+                lines = []
+        with self.lock:
+            self.log_metrics.written += len(lines)
+            self.log_metrics.errors += errors
+            self.log_metrics.batches += 1 if len(lines) > 0 else 0
+        if self.config.max_bytes is not None and os.path.exists(self.path):
+            if os.path.getsize(self.path) > self.config.max_bytes:
+                try:
+                    self.rotate()
+                except Exception:
+                    # the file keeps growing, the rotation is retried after the next batch
+                    with self.lock:
+                        self.log_metrics.errors += 1
+
+    def rotate(self) -> None:
+        with self.lock:
+            rotation = self.log_metrics.rotations
+        rotated = f"{self.path}.{time.strftime('%Y%m%d-%H%M%S')}.{os.getpid()}.{rotation}"
+        os.replace(self.path, rotated)
+        if self.config.compression == "gzip":
+            with open(rotated, "rb") as src, gzip.open(f"{rotated}.gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(rotated)
+        elif self.config.compression == "zstd":
+            import zstandard
+
+            with open(rotated, "rb") as src, open(f"{rotated}.zst", "wb") as dst:
+                zstandard.ZstdCompressor().copy_stream(src, dst)
+            os.remove(rotated)
+        with self.lock:
+            self.log_metrics.rotations += 1
+
+    def flush(self, timeout_s: float | None = 30.0) -> bool:
+        """Wait until every record submitted so far is written, at most `timeout_s`.
+
+        Return whether they were, never wait for a writer whose thread is gone.
+        """
+        if not self.thread.is_alive():
+            return False
+        deadline = None if timeout_s is None else time.monotonic() + timeout_s
+        done = threading.Event()
+        try:
+            self.queue.put(done, timeout=timeout_s)
+        except queue.Full:
+            return False
+        return done.wait(None if deadline is None else max(deadline - time.monotonic(), 0.0))
+
+    def metrics(self) -> dict[str, int]:
+        with self.lock:
+            return asdict(self.log_metrics)
+
+
+log_writers: dict[str, LogWriter] = {}
+_log_writers_lock = threading.Lock()
+
+
+def get_log_writer(path: str, config: LogWriterConfig | None = None) -> LogWriter:
+    """Return the writer shared by every API logging to `path`.
+
+    The config only applies when the writer is created.
+    """
+    with _log_writers_lock:
+        if path not in log_writers:
+            log_writers[path] = LogWriter(path, config)
+        return log_writers[path]
+
+
+def flush_logs() -> None:
+    with _log_writers_lock:
+        writers = list(log_writers.values())
+    for writer in writers:
+        writer.flush()
+
+
+def log_writer_metrics() -> dict[str, dict[str, int]]:
+    with _log_writers_lock:
+        return {path: writer.metrics() for path, writer in log_writers.items()}
+
+
+atexit.register(flush_logs)
+
+
 def log_call(func):
+    binder = ArgBinder(func)
+
     @functools.wraps(func)
     def wrapper(self, *args, **kwargs):
         response = func(self, *args, **kwargs)
         log_file = getattr(self, "_log_file", None)
         if log_file is not None:
-            if log_file not in log_files:
-                log_files[log_file] = Lock()
-            sig = inspect.signature(func)
-            bound_args = sig.bind(self, *args, **kwargs)
-            bound_args.apply_defaults()
-            all_args = bound_args.arguments
+            all_args = binder.bind((self, *args), kwargs)
             all_args.pop("self", None)
-
-            cls_name = self.__class__.__name__
-            log_entry = {
-                "cls_name": cls_name,
-                "method_name": func.__name__,
-                "kwargs": {
-                    k: prep_for_json_serialization(
-                        v, from_parse_method=func.__name__ in ["parse", "async_parse"]
-                    )
-                    for k, v in all_args.items()
-                },
-                "response": prep_for_json_serialization(response),
-            }
-            with log_files[log_file]:
-                with open(log_file, "a") as f:
-                    f.write(f"{json.dumps(log_entry)}\n")
+            get_log_writer(log_file).submit(
+                LogRecord(
+                    cls_name=self.__class__.__name__,
+                    method_name=func.__name__,
+                    kwargs=all_args,
+                    response=response,
+                )
+            )
         return response
 
     return wrapper
@@ -1,9 +1,17 @@
 import abc
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
 
 from pydantic import BaseModel
 
+from tau_bench.model_utils.api.cache import KeyEncoder
 from tau_bench.model_utils.api.datapoint import Datapoint, ScoreDatapoint
+from tau_bench.model_utils.model.completion import approx_prompt_str
 from tau_bench.model_utils.model.model import Model
+from tau_bench.model_utils.model.utils import approx_num_tokens
 
 
 class RequestRouter(abc.ABC):
@@ -11,8 +19,22 @@ class RequestRouter(abc.ABC):
     def route(self, dp: Datapoint, available_models: list[Model]) -> Model:
         raise NotImplementedError
 
+    def observe(
+        self,
+        model: Model,
+        dp: Datapoint,
+        latency_ms: float,
+        error: bool = False,
+        cost: float | None = None,
+    ) -> None:
+        """Called with the outcome of every call routed to `model`, routers may learn from it."""
+        pass
+
 
 class FirstModelRequestRouter(RequestRouter):
+    def cache_key(self) -> None:
+        return None
+
     def route(self, dp: Datapoint, available_models: list[Model]) -> Model:
         supporting_models = [model for model in available_models if model.supports_dp(dp)]
         if len(supporting_models) == 0:
@@ -35,6 +57,9 @@ class PromptedLLMCapabilityScoreModel:
             model = ClaudeModel()
         self.model = model
 
+    def cache_key(self) -> dict[str, Any]:
+        return {"model": self.model}
+
     def score_dp(self, dp: Datapoint, examples: list[ScoreDatapoint] | None = None) -> float:
         return (
             self.model.score(
@@ -52,6 +77,9 @@ class MinimumCapabilityRequestRouter(RequestRouter):
     def __init__(self, capability_score_model: CapabilityScoreModel) -> None:
         self.capability_score_model = capability_score_model
 
+    def cache_key(self) -> dict[str, Any]:
+        return {"capability_score_model": self.capability_score_model}
+
     def route(self, dp: Datapoint, available_models: list[Model]) -> Model:
         supporting_models = [model for model in available_models if model.supports_dp(dp)]
         if len(supporting_models) == 0:
@@ -71,15 +99,242 @@ class MinimumCapabilityRequestRouter(RequestRouter):
         return minimum_model
 
 
+def dp_fingerprint(dp: Datapoint) -> str:
+    """A hash of the task of `dp`, its response left out."""
+    encoder = KeyEncoder()
+    encoder.encode(type(dp).__name__)
+    encoder.encode(
+        {name: getattr(dp, name) for name in type(dp).model_fields if name != "response"}
+    )
+    return encoder.digest()
+
+
+class CachedCapabilityScoreModel(CapabilityScoreModel):
+    """Scores each distinct datapoint once, keeping the `max_entries` most recent scores."""
+
+    def __init__(
+        self, capability_score_model: CapabilityScoreModel, max_entries: int = 10_000
+    ) -> None:
+        self.capability_score_model = capability_score_model
+        self.max_entries = max_entries
+        self._scores: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def score_dp(self, dp: Datapoint) -> float:
+        key = dp_fingerprint(dp)
+        with self._lock:
+            if key in self._scores:
+                self._scores.move_to_end(key)
+                self._hits += 1
+                return self._scores[key]
+            self._misses += 1
+        score = self.capability_score_model.score_dp(dp)
+        with self._lock:
+            self._scores[key] = score
+            while len(self._scores) > self.max_entries:
+                self._scores.popitem(last=False)
+        return score
+
+    def metrics(self) -> dict[str, int]:
+        with self._lock:
+            return {"hits": self._hits, "misses": self._misses, "entries": len(self._scores)}
+
+    def cache_key(self) -> dict[str, Any]:
+        # the same scores, whether they were cached or not
+        return {"capability_score_model": self.capability_score_model}
+
+
+def prompt_size_bucket(dp: Datapoint) -> int:
+    """The power of two of the approximate prompt tokens of `dp`, latency grows with it."""
+    return int(math.log2(max(approx_num_tokens(approx_prompt_str(dp)), 1)))
+
+
+class EWMA(object):
+    def __init__(self, alpha: float) -> None:
+        self.alpha = alpha
+        self.value: float | None = None
+        self.count = 0
+
+    def update(self, x: float) -> None:
+        self.value = x if self.value is None else self.alpha * x + (1 - self.alpha) * self.value
+        self.count += 1
+
+
+class ModelStats(object):
+    """What calls to one model cost for prompts of one size bucket."""
+
+    def __init__(self, alpha: float) -> None:
+        self.latency_ms = EWMA(alpha)
+        self.cost = EWMA(alpha)
+        self.error_rate = EWMA(alpha)
+        self.observed_at: float | None = None
+
+    def decayed_error_rate(self, half_life_s: float, now: float) -> float:
+        """The error rate, halved for every `half_life_s` since the last observation."""
+        if self.error_rate.value is None or self.observed_at is None:
+            return 0.0
+        return self.error_rate.value * 0.5 ** ((now - self.observed_at) / half_life_s)
+
+
+class OnlineSLORequestRouter(RequestRouter):
+    """Routes each datapoint to the cheapest capable model expected to meet the SLO.
+
+    Latency, error rate and cost are learned from the calls observed for each model, as
+    an exponentially weighted moving average by prompt size bucket. Until a model has
+    `min_observations` in a bucket, its own `get_latency` and `get_approx_cost` estimates
+    are used, and a model without a latency estimate is tried so that it gets one. The
+    cost of a call is the model's estimate unless the caller observes the billed cost.
+
+    A model is eligible if it supports the datapoint, is at least as capable as the
+    datapoint requires and its error rate is at most `max_error_rate`. Among the
+    eligible models expected to be within `max_latency_ms` and `max_cost`, the cheapest
+    then fastest is picked, if none is, the one that misses the SLO by the least.
+
+    A model excluded for its error rate gets no calls to learn from, so its error rate
+    halves for every `error_half_life_s` without an observation, until it is tried again.
+    """
+
+    def __init__(
+        self,
+        capability_score_model: CapabilityScoreModel | None = None,
+        max_latency_ms: float | None = None,
+        max_cost: float | None = None,
+        max_error_rate: float = 0.5,
+        alpha: float = 0.2,
+        min_observations: int = 3,
+        error_half_life_s: float = 60.0,
+    ) -> None:
+        if capability_score_model is not None and not isinstance(
+            capability_score_model, CachedCapabilityScoreModel
+        ):
+            capability_score_model = CachedCapabilityScoreModel(capability_score_model)
+        self.capability_score_model = capability_score_model
+        self.max_latency_ms = max_latency_ms
+        self.max_cost = max_cost
+        self.max_error_rate = max_error_rate
+        self.alpha = alpha
+        self.min_observations = min_observations
+        self.error_half_life_s = error_half_life_s
+        # learned at run time, so not part of the cache key
+        self._stats: dict[tuple[int, int], ModelStats] = {}
+        self._lock = threading.Lock()
+
+    def cache_key(self) -> dict[str, Any]:
+        return {
+            "capability_score_model": self.capability_score_model,
+            "max_latency_ms": self.max_latency_ms,
+            "max_cost": self.max_cost,
+            "max_error_rate": self.max_error_rate,
+            "alpha": self.alpha,
+            "min_observations": self.min_observations,
+            "error_half_life_s": self.error_half_life_s,
+        }
+
+    def model_stats(self, model: Model, bucket: int) -> ModelStats:
+        with self._lock:
+            key = (id(model), bucket)
+            if key not in self._stats:
+                self._stats[key] = ModelStats(self.alpha)
+            return self._stats[key]
+
+    def predict(
+        self, model: Model, dp: Datapoint, bucket: int
+    ) -> tuple[float | None, float, float]:
+        """Return the expected latency, or None if unknown, cost and error rate of a call."""
+        stats = self.model_stats(model, bucket)
+        with self._lock:
+            observed = stats.latency_ms.count >= self.min_observations
+            latency_ms = stats.latency_ms.value if observed else None
+            cost = stats.cost.value if observed else None
+            error_rate = stats.decayed_error_rate(self.error_half_life_s, time.monotonic())
+        if latency_ms is None:
+            prior = model.get_latency(dp)
+            latency_ms = prior if prior > 0 else None
+        if cost is None:
+            cost = model.get_approx_cost(dp)
+        return latency_ms, cost, error_rate
+
+    def slo_excess(self, latency_ms: float, cost: float) -> float:
+        """How far past the SLO a call is, as a fraction of its limits, 0 within it."""
+        excess = 0.0
+        if self.max_latency_ms is not None:
+            excess = max(excess, latency_ms / self.max_latency_ms - 1)
+        if self.max_cost is not None and self.max_cost > 0:
+            excess = max(excess, cost / self.max_cost - 1)
+        return excess
+
+    def route(self, dp: Datapoint, available_models: list[Model]) -> Model:
+        supporting_models = [model for model in available_models if model.supports_dp(dp)]
+        if len(supporting_models) == 0:
+            raise ValueError(f"No supporting models found from {available_models}")
+        required_capability = (
+            self.capability_score_model.score_dp(dp)
+            if self.capability_score_model is not None
+            else 0.0
+        )
+        capable_models = [
+            model for model in supporting_models if model.get_capability() >= required_capability
+        ]
+        if len(capable_models) == 0:
+            raise ValueError(f"No model found with capability >= {required_capability}")
+        bucket = prompt_size_bucket(dp)
+        predictions = [(model, *self.predict(model, dp, bucket)) for model in capable_models]
+        reliable = [p for p in predictions if p[3] <= self.max_error_rate]
+        if len(reliable) > 0:
+            predictions = reliable
+        for model, latency_ms, _, _ in predictions:
+            if latency_ms is None:
+                return model
+        return min(
+            predictions,
+            key=lambda p: (self.slo_excess(p[1], p[2]), p[2], p[1]),
+        )[0]
+
+    def observe(
+        self,
+        model: Model,
+        dp: Datapoint,
+        latency_ms: float,
+        error: bool = False,
+        cost: float | None = None,
+    ) -> None:
+        stats = self.model_stats(model, prompt_size_bucket(dp))
+        if cost is None:
+            cost = model.get_approx_cost(dp)
+        with self._lock:
+            now = time.monotonic()
+            if stats.error_rate.value is not None:
+                # the error rate restarts from its decayed value
+                stats.error_rate.value = stats.decayed_error_rate(self.error_half_life_s, now)
+            stats.observed_at = now
+            stats.error_rate.update(1.0 if error else 0.0)
+            if not error:
+                stats.latency_ms.update(latency_ms)
+                stats.cost.update(cost)
+
+
 def request_router_factory(
-    router_id: str, capability_score_model: CapabilityScoreModel | None = None
+    router_id: str,
+    capability_score_model: CapabilityScoreModel | None = None,
+    max_latency_ms: float | None = None,
+    max_cost: float | None = None,
 ) -> RequestRouter:
     if router_id == "first-model":
         return FirstModelRequestRouter()
     elif router_id == "minimum-capability":
         if capability_score_model is None:
             raise ValueError("CapabilityScoreModel is required for minimum-capability router")
-        return MinimumCapabilityRequestRouter(capability_score_model=capability_score_model)
+        return MinimumCapabilityRequestRouter(
+            capability_score_model=CachedCapabilityScoreModel(capability_score_model)
+        )
+    elif router_id == "online-slo":
+        return OnlineSLORequestRouter(
+            capability_score_model=capability_score_model,
+            max_latency_ms=max_latency_ms,
+            max_cost=max_cost,
+        )
     raise ValueError(f"Unknown router_id: {router_id}")
 
 
@@ -1,12 +1,15 @@
 import abc
 import functools
+import threading
+from collections import Counter
 from multiprocessing import Lock
 from typing import Any, Callable, TypeVar
 
 from pydantic import BaseModel
 
 from tau_bench.model_utils.api.exception import APIError, execute_and_filter_model_errors
-from tau_bench.model_utils.model.exception import ModelError
+from tau_bench.model_utils.executor import SAMPLES, EarlyMapResult, get_executor
+from tau_bench.model_utils.model.exception import ModelError, Result
 from tau_bench.model_utils import func_tools
 
 T = TypeVar("T")
@@ -37,6 +40,9 @@ def catch_model_errors(func: Callable[..., T]) -> Callable[..., T]:
 
 
 class SingleSamplingStrategy(SamplingStrategy):
+    def cache_key(self) -> None:
+        return None
+
     @catch_model_errors
     def execute(self, invocable_or_invokables: Callable[..., T]) -> T:
         assert isinstance(invocable_or_invokables, Callable)
@@ -48,6 +54,9 @@ class RedundantSamplingStrategy(SamplingStrategy):
         assert n > 0
         self.n = n
 
+    def cache_key(self) -> dict[str, Any]:
+        return {"n": self.n}
+
     @catch_model_errors
     def execute(self, invocable_or_invokables: Callable[..., T] | list[Callable[..., T]]) -> T:
         results = execute_and_filter_model_errors(
@@ -64,6 +73,9 @@ class RetrySamplingStrategy(SamplingStrategy):
         assert max_retries > 0
         self.max_retries = max_retries
 
+    def cache_key(self) -> dict[str, Any]:
+        return {"max_retries": self.max_retries}
+
     @catch_model_errors
     def execute(self, invocable_or_invokables: Callable[..., T]) -> T:
         assert isinstance(invocable_or_invokables, Callable)
@@ -78,6 +90,94 @@ class RetrySamplingStrategy(SamplingStrategy):
         raise first_error
 
 
+class VotingMetrics(object):
+    """What deciding votes early saved, across the calls of a sampling strategy."""
+
+    def __init__(self) -> None:
+        self.votes = 0
+        self.early_decisions = 0
+        # samples never requested, their cost is saved
+        self.calls_skipped = 0
+        # samples in flight when the vote was decided, their results are ignored
+        self.calls_ignored = 0
+        # how long the ignored samples ran past the decision
+        self.latency_saved_s = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, outcome: EarlyMapResult) -> None:
+        with self.lock:
+            self.votes += 1
+            self.early_decisions += 1 if outcome.skipped + outcome.in_flight > 0 else 0
+            self.calls_skipped += outcome.skipped
+            self.calls_ignored += outcome.in_flight
+
+    def add_latency_saved(self, seconds: float) -> None:
+        with self.lock:
+            self.latency_saved_s += seconds
+
+    def to_dict(self) -> dict[str, Any]:
+        with self.lock:
+            return {
+                "votes": self.votes,
+                "early_decisions": self.early_decisions,
+                "calls_skipped": self.calls_skipped,
+                "calls_ignored": self.calls_ignored,
+                "latency_saved_s": self.latency_saved_s,
+            }
+
+
+def vote(
+    invocables: list[Callable[[], T]],
+    decided: Callable[[list[T], int], bool],
+    max_concurrency: int | None,
+    panic_on_first_model_error: bool,
+    voting_metrics: VotingMetrics,
+) -> tuple[list[T], list[ModelError]]:
+    """Sample until `decided(values, completed)` holds, or every invocable has answered.
+
+    Model errors count as completed samples without a value, unless
+    `panic_on_first_model_error` is set, then the first one is raised.
+    """
+
+    def invoke(invocable: Callable[[], T]) -> Result:
+        if panic_on_first_model_error:
+            return Result(value=invocable(), error=None)
+        try:
+            return Result(value=invocable(), error=None)
+        except ModelError as e:
+            return Result(value=None, error=e)
+
+    outcome = get_executor().map_until(
+        invoke,
+        invocables,
+        until=lambda outcomes: decided(
+            [o.value for o in outcomes if o.error is None], len(outcomes)
+        ),
+        max_concurrency=max_concurrency,
+        level=SAMPLES,
+        on_settled=voting_metrics.add_latency_saved,
+    )
+    voting_metrics.record(outcome)
+    values = [o.value for o in outcome.results if o.error is None]
+    errors = [o.error for o in outcome.results if o.error is not None]
+    return values, errors
+
+
+def vote_key(result: Any) -> str:
+    if isinstance(result, BaseModel):
+        return result.model_dump_json()
+    return str(result)
+
+
+def majority_decided(values: list[Any], remaining: int) -> bool:
+    """Whether the leading value stays ahead whatever the `remaining` samples return."""
+    counts = sorted(Counter(vote_key(value) for value in values).values(), reverse=True)
+    if len(counts) == 0:
+        return False
+    runner_up = counts[1] if len(counts) > 1 else 0
+    return counts[0] > runner_up + remaining
+
+
 class MajoritySamplingStrategy(SamplingStrategy):
     def __init__(
         self,
@@ -88,49 +188,40 @@ class MajoritySamplingStrategy(SamplingStrategy):
         self.n = n
         self.max_concurrency = max_concurrency if max_concurrency is not None else n
         self.panic_on_first_model_error = panic_on_first_model_error
+        self._voting_metrics = VotingMetrics()
+
+    def cache_key(self) -> dict[str, Any]:
+        # the concurrency changes how fast votes come in, not how they are counted
+        return {"n": self.n, "panic_on_first_model_error": self.panic_on_first_model_error}
 
     @catch_model_errors
     def execute(self, invocable_or_invokables: Callable[..., T] | list[Callable[..., T]]) -> T:
-        if self.panic_on_first_model_error:
-            if isinstance(invocable_or_invokables, Callable):
-                results = list(
-                    func_tools.map(
-                        lambda _: invocable_or_invokables(),
-                        range(self.n),
-                        max_concurrency=self.max_concurrency,
-                    )
-                )
-            else:
-                results = list(
-                    func_tools.map(
-                        lambda invocable: invocable(),
-                        invocable_or_invokables,
-                        max_concurrency=self.max_concurrency,
-                    )
-                )
-        else:
-            results = execute_and_filter_model_errors(
-                (
-                    [lambda: invocable_or_invokables() for _ in range(self.n)]
-                    if isinstance(invocable_or_invokables, Callable)
-                    else invocable_or_invokables
-                ),
-                max_concurrency=self.max_concurrency,
-            )
-        if not self.panic_on_first_model_error and len(results) == 0:
+        invocables = (
+            [invocable_or_invokables] * self.n
+            if isinstance(invocable_or_invokables, Callable)
+            else invocable_or_invokables
+        )
+        results, _ = vote(
+            invocables,
+            lambda values, completed: majority_decided(values, len(invocables) - completed),
+            max_concurrency=self.max_concurrency,
+            panic_on_first_model_error=self.panic_on_first_model_error,
+            voting_metrics=self._voting_metrics,
+        )
+        if len(results) == 0:
             raise SamplingError(
                 "No results from majority sampling (all calls resulted in LLM errors)"
             )
         return get_majority(results)
 
+    def voting_metrics(self) -> dict[str, Any]:
+        return self._voting_metrics.to_dict()
+
 
 def get_majority(results: list[T]) -> T:
     grouped: dict[str, Any] = {}
     for result in results:
-        if isinstance(result, BaseModel):
-            key = result.model_dump_json()
-        else:
-            key = str(result)
+        key = vote_key(result)
         if key not in grouped:
             # for now, just store duplicate results for the count
             grouped[key] = [result]
@@ -147,6 +238,9 @@ class EnsembleSamplingStrategy(SamplingStrategy):
         self.max_concurrency = max_concurrency
         self.panic_on_first_model_error = panic_on_first_model_error
 
+    def cache_key(self) -> dict[str, Any]:
+        return {"panic_on_first_model_error": self.panic_on_first_model_error}
+
     @catch_model_errors
     def execute(self, invocable_or_invokables: Callable[..., T] | list[Callable[..., T]]) -> T:
         if not isinstance(invocable_or_invokables, list) or len(invocable_or_invokables) < 2:
@@ -157,6 +251,7 @@ class EnsembleSamplingStrategy(SamplingStrategy):
                     lambda invocable: invocable(),
                     invocable_or_invokables,
                     max_concurrency=self.max_concurrency,
+                    level=SAMPLES,
                 )
             )
         else:
@@ -180,39 +275,36 @@ class UnanimousSamplingStrategy(SamplingStrategy):
         self.n = n
         self.max_concurrency = max_concurrency if max_concurrency is not None else n
         self.panic_on_first_model_error = panic_on_first_model_error
+        self._voting_metrics = VotingMetrics()
+
+    def cache_key(self) -> dict[str, Any]:
+        return {"n": self.n, "panic_on_first_model_error": self.panic_on_first_model_error}
 
     @catch_model_errors
     def execute(self, invocable_or_invokables: Callable[..., T] | list[Callable[..., T]]) -> T:
-        if self.panic_on_first_model_error:
-            if isinstance(invocable_or_invokables, Callable):
-                results = list(
-                    func_tools.map(
-                        lambda _: invocable_or_invokables(),
-                        range(self.n),
-                        max_concurrency=self.max_concurrency,
-                    )
-                )
-            else:
-                results = list(
-                    func_tools.map(
-                        lambda invocable: invocable(),
-                        invocable_or_invokables,
-                        max_concurrency=self.max_concurrency,
-                    )
-                )
-        else:
-            results = execute_and_filter_model_errors(
-                (
-                    [lambda: invocable_or_invokables() for _ in range(self.n)]
-                    if isinstance(invocable_or_invokables, Callable)
-                    else invocable_or_invokables
-                ),
-                max_concurrency=self.max_concurrency,
-            )
-        if len(set(results)) > 1:
+        invocables = (
+            [invocable_or_invokables] * self.n
+            if isinstance(invocable_or_invokables, Callable)
+            else invocable_or_invokables
+        )
+        # a single disagreement decides the vote
+        results, errors = vote(
+            invocables,
+            lambda values, _: len({vote_key(value) for value in values}) > 1,
+            max_concurrency=self.max_concurrency,
+            panic_on_first_model_error=self.panic_on_first_model_error,
+            voting_metrics=self._voting_metrics,
+        )
+        if len(results) == 0:
+            assert len(errors) > 0
+            raise errors[0]
+        if len({vote_key(result) for result in results}) > 1:
             raise SamplingError("Results are not unanimous")
         return results[0]
 
+    def voting_metrics(self) -> dict[str, Any]:
+        return self._voting_metrics.to_dict()
+
 
 class SamplingError(Exception):
     pass
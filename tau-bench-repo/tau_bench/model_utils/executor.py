@@ -0,0 +1,252 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Generic, Iterable, TypeVar
+
+T = TypeVar("T")
+U = TypeVar("U")
+
+# work fanned out by a caller of the API, e.g. one call per trajectory
+PIPELINE = "pipeline"
+# samples of a single API call, e.g. the votes of majority sampling
+SAMPLES = "samples"
+
+
+class ConcurrencyBudget(object):
+    """At most `limit` helper threads at a time, within the budget of `parent` if any."""
+
+    def __init__(self, name: str, limit: int, parent: "ConcurrencyBudget | None" = None) -> None:
+        self.name = name
+        self.limit = limit
+        self.parent = parent
+        self.in_use = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self.lock:
+            if self.in_use >= self.limit:
+                return False
+            self.in_use += 1
+        if self.parent is not None and not self.parent.try_acquire():
+            with self.lock:
+                self.in_use -= 1
+            return False
+        with self.lock:
+            self.peak = max(self.peak, self.in_use)
+        return True
+
+    def release(self) -> None:
+        with self.lock:
+            self.in_use -= 1
+        if self.parent is not None:
+            self.parent.release()
+
+
+class EarlyMapResult(Generic[U]):
+    def __init__(self) -> None:
+        self.results: list[U] = []
+        self.decided = False
+        self.error: BaseException | None = None
+        self.started = 0
+        self.finished = 0
+        # items never started, and started items whose results came too late
+        self.skipped = 0
+        self.in_flight = 0
+
+
+class SharedExecutor(object):
+    """One bounded thread pool for every concurrent map of `tau_bench.model_utils`.
+
+    The caller of `map` works through the items itself, helped by as many pool threads
+    as the budget of the map's level and the pool's `max_workers` allow at that moment.
+    Nested maps, like majority sampling inside a pipeline over trajectories, therefore
+    never wait for a thread and never deadlock: once the budgets are spent they run in
+    the calling thread.
+    """
+
+    def __init__(self, max_workers: int = 64, level_limits: dict[str, int] | None = None) -> None:
+        if level_limits is None:
+            level_limits = {PIPELINE: max_workers // 2, SAMPLES: max_workers - max_workers // 2}
+        # levels get disjoint shares of the pool, samples can then never starve the pipeline
+        if sum(level_limits.values()) > max_workers:
+            raise ValueError(f"Level limits {level_limits} exceed {max_workers} workers")
+        self.max_workers = max_workers
+        self.root = ConcurrencyBudget("root", max_workers)
+        self.levels = {
+            name: ConcurrencyBudget(name, limit, parent=self.root)
+            for name, limit in level_limits.items()
+        }
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="model-utils")
+        self.lock = threading.Lock()
+        self.maps = 0
+        self.helpers = 0
+        self.denied_helpers = 0
+        self.peak_threads = threading.active_count()
+
+    def map(
+        self,
+        func: Callable[[T], U],
+        iterable: Iterable[T],
+        max_concurrency: int | None = None,
+        level: str = PIPELINE,
+        on_done: Callable[[], None] | None = None,
+    ) -> list[U]:
+        """Return `[func(x) for x in iterable]`, raising the first error by position."""
+        items = list(iterable)
+        results: list[Any] = [None] * len(items)
+        errors: list[BaseException | None] = [None] * len(items)
+        next_index = [0]
+        index_lock = threading.Lock()
+
+        def work() -> None:
+            while True:
+                with index_lock:
+                    i = next_index[0]
+                    next_index[0] += 1
+                if i >= len(items):
+                    return
+                try:
+                    results[i] = func(items[i])
+                except BaseException as e:
+                    errors[i] = e
+                if on_done is not None:
+                    on_done()
+
+        budget = self.levels[level]
+        num_helpers = min(len(items), max_concurrency or len(items)) - 1
+        helpers: list[Future] = []
+        for _ in range(num_helpers):
+            if not budget.try_acquire():
+                with self.lock:
+                    self.denied_helpers += num_helpers - len(helpers)
+                break
+            # each helper needs a context of its own, e.g. for the usage ledger
+            helpers.append(
+                self.pool.submit(self.run_helper, budget, contextvars.copy_context(), work)
+            )
+        with self.lock:
+            self.maps += 1
+            self.helpers += len(helpers)
+        work()
+        for helper in helpers:
+            helper.result()
+        for error in errors:
+            if error is not None:
+                raise error
+        return results
+
+    def map_until(
+        self,
+        func: Callable[[T], U],
+        iterable: Iterable[T],
+        until: Callable[[list[U]], bool],
+        max_concurrency: int | None = None,
+        level: str = SAMPLES,
+        on_settled: Callable[[float], None] | None = None,
+    ) -> "EarlyMapResult[U]":
+        """Run `func` over `iterable` until `until` holds for the results so far.
+
+        Results are gathered in completion order. Once `until` holds, items not started
+        are skipped and calls in flight are left to finish in the background with their
+        results ignored, `on_settled` then gets the seconds they ran past the return.
+        The first error stops the map and is raised.
+        """
+        items = list(iterable)
+        state = EarlyMapResult[U]()
+        cond = threading.Condition()
+        returned_at: list[float] = []
+
+        def next_item() -> int | None:
+            with cond:
+                if state.decided or state.error is not None or state.started == len(items):
+                    return None
+                state.started += 1
+                return state.started - 1
+
+        def work() -> None:
+            while (i := next_item()) is not None:
+                result, error = None, None
+                try:
+                    result = func(items[i])
+                except BaseException as e:
+                    error = e
+                with cond:
+                    state.finished += 1
+                    if state.decided or state.error is not None:
+                        pass
+                    elif error is not None:
+                        state.error = error
+                    else:
+                        state.results.append(result)
+                        state.decided = until(state.results)
+                    settled = state.finished == state.started and len(returned_at) > 0
+                    cond.notify_all()
+                if settled and on_settled is not None:
+                    on_settled(time.perf_counter() - returned_at[0])
+
+        budget = self.levels[level]
+        helpers = 0
+        while helpers < min(len(items), max_concurrency or len(items)) and budget.try_acquire():
+            self.pool.submit(self.run_helper, budget, contextvars.copy_context(), work)
+            helpers += 1
+        with self.lock:
+            self.maps += 1
+            self.helpers += helpers
+        if helpers == 0:
+            # no thread to spare, sample one at a time, which still stops early
+            work()
+        with cond:
+            cond.wait_for(
+                lambda: state.decided
+                or state.error is not None
+                or state.finished == len(items)
+            )
+            state.skipped = len(items) - state.started
+            state.in_flight = state.started - state.finished
+            if state.in_flight > 0:
+                returned_at.append(time.perf_counter())
+        if state.error is not None:
+            raise state.error
+        return state
+
+    def run_helper(
+        self, budget: ConcurrencyBudget, context: contextvars.Context, work: Callable[[], None]
+    ) -> None:
+        with self.lock:
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+        try:
+            context.run(work)
+        finally:
+            budget.release()
+
+    def metrics(self) -> dict[str, Any]:
+        with self.lock:
+            return {
+                "maps": self.maps,
+                "helpers": self.helpers,
+                "denied_helpers": self.denied_helpers,
+                "peak_threads": self.peak_threads,
+                "peak_helpers": {
+                    "root": self.root.peak,
+                    **{name: budget.peak for name, budget in self.levels.items()},
+                },
+            }
+
+
+_executor = SharedExecutor()
+
+
+def set_executor(executor: SharedExecutor) -> None:
+    """Run every concurrent map of `tau_bench.model_utils` on `executor` from now on."""
+    global _executor
+    _executor = executor
+
+
+def get_executor() -> SharedExecutor:
+    return _executor
+
+
+def executor_metrics() -> dict[str, Any]:
+    return _executor.metrics()
@@ -1,5 +1,6 @@
 from typing import Callable, Iterable, TypeVar
 
+from tau_bench.model_utils.executor import PIPELINE
 from tau_bench.model_utils.func_tools.map import map
 
 T = TypeVar("T")
@@ -11,7 +12,9 @@ def filter(
     func: Callable[[T], bool],
     iterable: Iterable[T],
     max_concurrency: int | None = None,
+    level: str = PIPELINE,
 ) -> Iterable[T]:
     assert max_concurrency is None or max_concurrency > 0
-    bits = map(func, iterable=iterable, max_concurrency=max_concurrency)
+    iterable = list(iterable)
+    bits = map(func, iterable=iterable, max_concurrency=max_concurrency, level=level)
     return [x for x, y in zip(iterable, bits) if y]
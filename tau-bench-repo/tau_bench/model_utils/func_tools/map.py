@@ -1,6 +1,7 @@
-from concurrent.futures import ThreadPoolExecutor
 from typing import Callable, Iterable, TypeVar
 
+from tau_bench.model_utils.executor import PIPELINE, get_executor
+
 T = TypeVar("T")
 U = TypeVar("U")
 
@@ -10,11 +11,15 @@ def map(
     iterable: Iterable[T],
     max_concurrency: int | None = None,
     use_tqdm: bool = False,
+    level: str = PIPELINE,
 ) -> Iterable[U]:
     assert max_concurrency is None or max_concurrency > 0
-    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
-        if use_tqdm:
-            from tqdm import tqdm
+    if use_tqdm:
+        from tqdm import tqdm
 
-            return list(tqdm(executor.map(func, iterable), total=len(iterable)))
-        return executor.map(func, iterable)
+        items = list(iterable)
+        with tqdm(total=len(items)) as pbar:
+            return get_executor().map(
+                func, items, max_concurrency=max_concurrency, level=level, on_done=pbar.update
+            )
+    return get_executor().map(func, iterable, max_concurrency=max_concurrency, level=level)
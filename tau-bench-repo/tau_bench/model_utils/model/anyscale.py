@@ -2,8 +2,13 @@ import os
 
 from tau_bench.model_utils.api.datapoint import Datapoint
 from tau_bench.model_utils.model.chat import ChatModel, Message
-from tau_bench.model_utils.model.completion import approx_cost_for_datapoint, approx_prompt_str
+from tau_bench.model_utils.model.completion import (
+    approx_cost_for_datapoint,
+    approx_latency_for_datapoint,
+    approx_prompt_str,
+)
 from tau_bench.model_utils.model.general_model import wrap_temperature
+from tau_bench.model_utils.model.http_client import HTTPClientConfig, sdk_client_kwargs
 from tau_bench.model_utils.model.utils import approx_num_tokens
 
 API_KEY_ENV_VAR = "ANYSCALE_API_KEY"
@@ -36,8 +41,9 @@ class AnyscaleModel(ChatModel):
         model: str,
         api_key: str | None = None,
         temperature: float = 0.0,
+        http_config: HTTPClientConfig | None = None,
     ) -> None:
-        from openai import AsyncOpenAI, OpenAI
+        from openai import AsyncOpenAI, OpenAI, Timeout
 
         self.model = model
 
@@ -46,8 +52,9 @@ class AnyscaleModel(ChatModel):
             api_key = os.getenv(API_KEY_ENV_VAR)
             if api_key is None:
                 raise ValueError(f"{API_KEY_ENV_VAR} environment variable is not set")
-        self.client = OpenAI(api_key=api_key, base_url=BASE_URL)
-        self.async_client = AsyncOpenAI(api_key=api_key, base_url=BASE_URL)
+        client_kwargs = sdk_client_kwargs(http_config, timeout_cls=Timeout)
+        self.client = OpenAI(api_key=api_key, base_url=BASE_URL, **client_kwargs)
+        self.async_client = AsyncOpenAI(api_key=api_key, base_url=BASE_URL, **client_kwargs)
         self.temperature = temperature
 
     def generate_message(
@@ -77,7 +84,9 @@ class AnyscaleModel(ChatModel):
         latency_per_output_token = LATENCY_MS_PER_OUTPUT_TOKEN_MAP.get(
             self.model, LATENCY_MS_PER_OUTPUT_TOKEN_FALLBACK
         )
-        return approx_cost_for_datapoint(dp=dp, price_per_input_token=latency_per_output_token)
+        return approx_latency_for_datapoint(
+            dp=dp, latency_ms_per_output_token=latency_per_output_token
+        )
 
     def get_capability(self) -> float:
         return CAPABILITY_SCORE_MAP.get(self.model, CAPABILITY_SCORE_FALLBACK)
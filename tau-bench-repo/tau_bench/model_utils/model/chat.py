@@ -293,6 +293,9 @@ def build_classify_state(
 
 
 class ChatModel(GeneralModel):
+    def cache_key(self) -> dict[str, Any]:
+        return {"model": self.model, "temperature": self.temperature}
+
     @abc.abstractmethod
     def generate_message(
         self, messages: list[Message], force_json: bool, temperature: float | None = None
@@ -3,8 +3,13 @@ import os
 
 from tau_bench.model_utils.api.datapoint import Datapoint
 from tau_bench.model_utils.model.chat import ChatModel, Message
-from tau_bench.model_utils.model.completion import approx_cost_for_datapoint, approx_prompt_str
+from tau_bench.model_utils.model.completion import (
+    approx_cost_for_datapoint,
+    approx_latency_for_datapoint,
+    approx_prompt_str,
+)
 from tau_bench.model_utils.model.general_model import wrap_temperature
+from tau_bench.model_utils.model.http_client import HTTPClientConfig, sdk_client_kwargs
 from tau_bench.model_utils.model.utils import approx_num_tokens
 
 DEFAULT_CLAUDE_MODEL = "claude-3-5-sonnet-20240620"
@@ -38,8 +43,9 @@ class ClaudeModel(ChatModel):
         model: str | None = None,
         api_key: str | None = None,
         temperature: float = 0.0,
+        http_config: HTTPClientConfig | None = None,
     ) -> None:
-        from anthropic import Anthropic, AsyncAnthropic
+        from anthropic import Anthropic, AsyncAnthropic, Timeout
 
         if model is None:
             self.model = DEFAULT_CLAUDE_MODEL
@@ -52,10 +58,13 @@ class ClaudeModel(ChatModel):
             if api_key is None:
                 raise ValueError(f"{ENV_VAR_API_KEY} environment variable is not set")
         # `anthropic-beta` header is needed for the 8192 context length (https://docs.anthropic.com/en/docs/about-claude/models)
+        client_kwargs = sdk_client_kwargs(http_config, timeout_cls=Timeout)
         self.client = Anthropic(
-            api_key=api_key, default_headers={"anthropic-beta": "max-tokens-3-5-sonnet-2024-07-15"}
+            api_key=api_key,
+            default_headers={"anthropic-beta": "max-tokens-3-5-sonnet-2024-07-15"},
+            **client_kwargs,
         )
-        self.async_client = AsyncAnthropic(api_key=api_key)
+        self.async_client = AsyncAnthropic(api_key=api_key, **client_kwargs)
         self.temperature = temperature
 
     def get_approx_cost(self, dp: Datapoint) -> float:
@@ -66,7 +75,9 @@ class ClaudeModel(ChatModel):
         latency_per_output_token = LATENCY_MS_PER_OUTPUT_TOKEN_MAP.get(
             self.model, LATENCY_MS_PER_OUTPUT_TOKEN_FALLBACK
         )
-        return approx_cost_for_datapoint(dp=dp, price_per_input_token=latency_per_output_token)
+        return approx_latency_for_datapoint(
+            dp=dp, latency_ms_per_output_token=latency_per_output_token
+        )
 
     def get_capability(self) -> float:
         return CAPABILITY_SCORE_MAP.get(self.model, CAPABILITY_SCORE_FALLBACK)
@@ -241,6 +241,9 @@ def build_generate_state(
 
 
 class CompletionModel(GeneralModel):
+    def cache_key(self) -> dict[str, Any]:
+        return {"model": self.model, "temperature": self.temperature}
+
     @abc.abstractmethod
     def generate_from_prompt(self, prompt: str, temperature: float | None = None) -> str:
         raise NotImplementedError
@@ -512,8 +515,11 @@ def approx_cost_for_datapoint(
     dp: Datapoint,
     price_per_input_token: float,
 ) -> float:
-    """For now, we approximate the cost of a datapoint as the cost of the input (output tokens are priced as input tokens as well)."""
-    prompt = approx_prompt_str(dp, include_response=True)
+    """For now, we approximate the cost of a datapoint as the cost of the input (output tokens are priced as input tokens as well).
+
+    A request datapoint has no response yet, its cost is that of the prompt alone.
+    """
+    prompt = approx_prompt_str(dp, include_response=dp.response is not None)
     assert isinstance(prompt, str)
     return price_per_input_token * approx_num_tokens(prompt)
 
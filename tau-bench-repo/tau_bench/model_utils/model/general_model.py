@@ -12,6 +12,7 @@ from tau_bench.model_utils.api.datapoint import (
     ScoreDatapoint,
 )
 from tau_bench.model_utils.api.types import PartialObj
+from tau_bench.model_utils.model.http_client import HTTPClientConfig
 from tau_bench.model_utils.model.model import (
     BinaryClassifyModel,
     ClassifyModel,
@@ -142,36 +143,37 @@ def model_factory(
     base_url: str | None = None,
     api_key: str | None = None,
     temperature: float = 0.0,
+    http_config: HTTPClientConfig | None = None,
 ) -> GeneralModel:
     if isinstance(platform, str):
         platform = Platform(platform)
     if platform == Platform.OPENAI:
         from tau_bench.model_utils.model.openai import OpenAIModel
 
-        return OpenAIModel(model=model_id, api_key=api_key, temperature=temperature)
+        return OpenAIModel(model=model_id, api_key=api_key, temperature=temperature, http_config=http_config)
     elif platform == Platform.MISTRAL:
         from tau_bench.model_utils.model.mistral import MistralModel
 
-        return MistralModel(model=model_id, api_key=api_key, temperature=temperature)
+        return MistralModel(model=model_id, api_key=api_key, temperature=temperature, http_config=http_config)
     elif platform == Platform.ANTHROPIC:
         from tau_bench.model_utils.model.claude import ClaudeModel
 
-        return ClaudeModel(model=model_id, api_key=api_key, temperature=temperature)
+        return ClaudeModel(model=model_id, api_key=api_key, temperature=temperature, http_config=http_config)
     elif platform == Platform.XAI:
         from tau_bench.model_utils.model.grok import GrokModel
 
-        return GrokModel(model=model_id, api_key=api_key, temperature=temperature)
+        return GrokModel(model=model_id, api_key=api_key, temperature=temperature, http_config=http_config)
 
     elif platform == Platform.ANYSCALE:
         from tau_bench.model_utils.model.anyscale import AnyscaleModel
 
-        return AnyscaleModel(model=model_id, api_key=api_key, temperature=temperature)
+        return AnyscaleModel(model=model_id, api_key=api_key, temperature=temperature, http_config=http_config)
     elif platform == Platform.OUTLINES:
         if base_url is None:
             raise ValueError("base_url must be provided for custom models")
         from tau_bench.model_utils.model.outlines_completion import OutlinesCompletionModel
 
-        return OutlinesCompletionModel(model=model_id, base_url=base_url, temperature=temperature)
+        return OutlinesCompletionModel(model=model_id, base_url=base_url, temperature=temperature, http_config=http_config)
     elif platform == Platform.VLLM_CHAT:
         if base_url is None:
             raise ValueError("base_url must be provided for custom models")
@@ -182,10 +184,11 @@ def model_factory(
             base_url=base_url,
             api_key="sk-no-api-key-required" if api_key is None else api_key,
             temperature=temperature,
+            http_config=http_config,
         )
     else:
         if base_url is None:
             raise ValueError("base_url must be provided for custom models")
         from tau_bench.model_utils.model.vllm_completion import VLLMCompletionModel
 
-        return VLLMCompletionModel(model=model_id, base_url=base_url, temperature=temperature)
+        return VLLMCompletionModel(model=model_id, base_url=base_url, temperature=temperature, http_config=http_config)
@@ -2,8 +2,13 @@ import os
 
 from tau_bench.model_utils.api.datapoint import Datapoint
 from tau_bench.model_utils.model.chat import ChatModel, Message
-from tau_bench.model_utils.model.completion import approx_cost_for_datapoint, approx_prompt_str
+from tau_bench.model_utils.model.completion import (
+    approx_cost_for_datapoint,
+    approx_latency_for_datapoint,
+    approx_prompt_str,
+)
 from tau_bench.model_utils.model.general_model import wrap_temperature
+from tau_bench.model_utils.model.http_client import HTTPClientConfig, sdk_client_kwargs
 from tau_bench.model_utils.model.utils import approx_num_tokens
 
 DEFAULT_GROK_MODEL = "grok-3"
@@ -45,6 +50,7 @@ class GrokModel(ChatModel):
         model: str | None = None,
         api_key: str | None = None,
         temperature: float = 0.0,
+        http_config: HTTPClientConfig | None = None,
     ) -> None:
         if model is None:
             self.model = DEFAULT_GROK_MODEL
@@ -58,6 +64,7 @@ class GrokModel(ChatModel):
 
         self.api_key = api_key
         self.temperature = temperature
+        self.http_config = http_config if http_config is not None else HTTPClientConfig()
 
     def generate_message(
         self,
@@ -87,6 +94,8 @@ class GrokModel(ChatModel):
                 temperature=wrap_temperature(temperature),
                 api_key=self.api_key,
                 response_format={"type": "json_object" if force_json else "text"},
+                timeout=self.http_config.read_timeout,
+                num_retries=self.http_config.max_retries,
             )
 
             content = response.choices[0].message.content
@@ -110,7 +119,9 @@ class GrokModel(ChatModel):
         latency_per_output_token = LATENCY_MS_PER_OUTPUT_TOKEN_MAP.get(
             self.model, LATENCY_MS_PER_OUTPUT_TOKEN_FALLBACK
         )
-        return approx_cost_for_datapoint(dp=dp, price_per_input_token=latency_per_output_token)
+        return approx_latency_for_datapoint(
+            dp=dp, latency_ms_per_output_token=latency_per_output_token
+        )
 
     def get_capability(self) -> float:
         return CAPABILITY_SCORE_MAP.get(self.model, CAPABILITY_SCORE_FALLBACK)
@@ -0,0 +1,147 @@
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+@dataclass
+class HTTPClientConfig:
+    max_connections: int = 64
+    connect_timeout: float = 10.0
+    read_timeout: float = 600.0
+    max_retries: int = 3
+    backoff_base: float = 0.5
+    backoff_max: float = 30.0
+
+
+@dataclass
+class PoolMetrics:
+    requests: int = 0
+    retries: int = 0
+    failures: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+    connections_opened: int = 0
+
+
+def backoff_delay(attempt: int, config: HTTPClientConfig, retry_after: str | None = None) -> float:
+    """Exponential backoff with full jitter, or the delay the server asked for."""
+    if retry_after is not None:
+        try:
+            return min(float(retry_after), config.backoff_max)
+        except ValueError:
+            pass
+    return random.uniform(0, min(config.backoff_max, config.backoff_base * 2**attempt))
+
+
+class HTTPClient(object):
+    """A keep-alive connection pool for one backend, with timeouts and retries.
+
+    At most `max_connections` requests are in flight at a time, further callers wait
+    for a free connection. Connection errors and responses with a status in
+    `RETRY_STATUS_CODES` are retried up to `max_retries` times.
+    """
+
+    def __init__(self, config: HTTPClientConfig | None = None) -> None:
+        self.config = config if config is not None else HTTPClientConfig()
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.config.max_connections,
+            pool_block=True,
+        )
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+        self.lock = threading.Lock()
+        self.pool_metrics = PoolMetrics()
+
+    def post_json(self, url: str, json: dict[str, Any]) -> Any:
+        with self.lock:
+            self.pool_metrics.requests += 1
+            self.pool_metrics.in_flight += 1
+            self.pool_metrics.max_in_flight = max(
+                self.pool_metrics.max_in_flight, self.pool_metrics.in_flight
+            )
+        try:
+            return self.post_with_retries(url, json)
+        except Exception:
+            with self.lock:
+                self.pool_metrics.failures += 1
+            raise
+        finally:
+            with self.lock:
+                self.pool_metrics.in_flight -= 1
+
+    def post_with_retries(self, url: str, json: dict[str, Any]) -> Any:
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                res = self.session.post(
+                    url,
+                    json=json,
+                    timeout=(self.config.connect_timeout, self.config.read_timeout),
+                )
+                if res.status_code not in RETRY_STATUS_CODES or attempt >= self.config.max_retries:
+                    res.raise_for_status()
+                    return res.json()
+                retry_after = res.headers.get("Retry-After")
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.config.max_retries:
+                    raise
+            with self.lock:
+                self.pool_metrics.retries += 1
+            time.sleep(backoff_delay(attempt, self.config, retry_after))
+            attempt += 1
+
+    def metrics(self) -> dict[str, int]:
+        metrics = asdict(self.pool_metrics)
+        pools = self.adapter.poolmanager.pools
+        metrics["connections_opened"] = sum(pools[key].num_connections for key in pools.keys())
+        return metrics
+
+
+_clients: dict[str, HTTPClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_http_client(name: str, config: HTTPClientConfig | None = None) -> HTTPClient:
+    """Return the client shared by every model of the backend `name`.
+
+    The config only applies when the client is created.
+    """
+    with _clients_lock:
+        if name not in _clients:
+            _clients[name] = HTTPClient(config)
+        return _clients[name]
+
+
+def http_client_metrics() -> dict[str, dict[str, int]]:
+    with _clients_lock:
+        return {name: client.metrics() for name, client in _clients.items()}
+
+
+def sdk_client_kwargs(
+    config: HTTPClientConfig | None = None, timeout_cls: type | None = None
+) -> dict[str, Any]:
+    """Timeouts and retries for the provider SDK clients, which pool their own connections.
+
+    `timeout_cls` is the SDK's `Timeout`, e.g. `openai.Timeout`, SDKs without one take the
+    read timeout in seconds.
+    """
+    if config is None:
+        config = HTTPClientConfig()
+    return {
+        "timeout": (
+            timeout_cls(config.read_timeout, connect=config.connect_timeout)
+            if timeout_cls is not None
+            else config.read_timeout
+        ),
+        "max_retries": config.max_retries,
+    }
@@ -2,8 +2,13 @@ import os
 
 from tau_bench.model_utils.api.datapoint import Datapoint
 from tau_bench.model_utils.model.chat import ChatModel, Message
-from tau_bench.model_utils.model.completion import approx_cost_for_datapoint, approx_prompt_str
+from tau_bench.model_utils.model.completion import (
+    approx_cost_for_datapoint,
+    approx_latency_for_datapoint,
+    approx_prompt_str,
+)
 from tau_bench.model_utils.model.general_model import wrap_temperature
+from tau_bench.model_utils.model.http_client import HTTPClientConfig, sdk_client_kwargs
 from tau_bench.model_utils.model.utils import approx_num_tokens
 
 DEFAULT_MISTRAL_MODEL = "mistral-large-latest"
@@ -31,7 +36,11 @@ MAX_CONTEXT_LENGTH_FALLBACK = 128000
 
 class MistralModel(ChatModel):
     def __init__(
-        self, model: str | None = None, api_key: str | None = None, temperature: float = 0.0
+        self,
+        model: str | None = None,
+        api_key: str | None = None,
+        temperature: float = 0.0,
+        http_config: HTTPClientConfig | None = None,
     ) -> None:
         from mistralai.async_client import MistralAsyncClient
         from mistralai.client import MistralClient
@@ -46,8 +55,9 @@ class MistralModel(ChatModel):
             api_key = os.getenv("MISTRAL_API_KEY")
             if api_key is None:
                 raise ValueError("MISTRAL_API_KEY environment variable is not set")
-        self.client = MistralClient(api_key=api_key)
-        self.async_client = MistralAsyncClient(api_key=api_key)
+        client_kwargs = sdk_client_kwargs(http_config)
+        self.client = MistralClient(api_key=api_key, **client_kwargs)
+        self.async_client = MistralAsyncClient(api_key=api_key, **client_kwargs)
         self.temperature = temperature
 
     def generate_message(
@@ -77,7 +87,9 @@ class MistralModel(ChatModel):
         latency_per_output_token = LATENCY_MS_PER_OUTPUT_TOKEN_MAP.get(
             self.model, LATENCY_MS_PER_OUTPUT_TOKEN_FALLBACK
         )
-        return approx_cost_for_datapoint(dp=dp, price_per_input_token=latency_per_output_token)
+        return approx_latency_for_datapoint(
+            dp=dp, latency_ms_per_output_token=latency_per_output_token
+        )
 
     def get_capability(self) -> float:
         return CAPABILITY_SCORE_MAP.get(self.model, CAPABILITY_SCORE_FALLBACK)
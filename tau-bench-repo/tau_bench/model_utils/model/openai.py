@@ -2,8 +2,13 @@ import os
 
 from tau_bench.model_utils.api.datapoint import Datapoint
 from tau_bench.model_utils.model.chat import ChatModel, Message
-from tau_bench.model_utils.model.completion import approx_cost_for_datapoint, approx_prompt_str
+from tau_bench.model_utils.model.completion import (
+    approx_cost_for_datapoint,
+    approx_latency_for_datapoint,
+    approx_prompt_str,
+)
 from tau_bench.model_utils.model.general_model import wrap_temperature
+from tau_bench.model_utils.model.http_client import HTTPClientConfig, sdk_client_kwargs
 from tau_bench.model_utils.model.utils import approx_num_tokens
 
 DEFAULT_OPENAI_MODEL = "gpt-4o-2024-08-06"
@@ -67,8 +72,9 @@ class OpenAIModel(ChatModel):
         model: str | None = None,
         api_key: str | None = None,
         temperature: float = 0.0,
+        http_config: HTTPClientConfig | None = None,
     ) -> None:
-        from openai import AsyncOpenAI, OpenAI
+        from openai import AsyncOpenAI, OpenAI, Timeout
 
         if model is None:
             self.model = DEFAULT_OPENAI_MODEL
@@ -80,8 +86,9 @@ class OpenAIModel(ChatModel):
             api_key = os.getenv(API_KEY_ENV_VAR)
             if api_key is None:
                 raise ValueError(f"{API_KEY_ENV_VAR} environment variable is not set")
-        self.client = OpenAI(api_key=api_key)
-        self.async_client = AsyncOpenAI(api_key=api_key)
+        client_kwargs = sdk_client_kwargs(http_config, timeout_cls=Timeout)
+        self.client = OpenAI(api_key=api_key, **client_kwargs)
+        self.async_client = AsyncOpenAI(api_key=api_key, **client_kwargs)
         self.temperature = temperature
 
     def generate_message(
@@ -111,7 +118,9 @@ class OpenAIModel(ChatModel):
         latency_per_output_token = LATENCY_MS_PER_OUTPUT_TOKEN_MAP.get(
             self.model, LATENCY_MS_PER_OUTPUT_TOKEN_FALLBACK
         )
-        return approx_cost_for_datapoint(dp=dp, price_per_input_token=latency_per_output_token)
+        return approx_latency_for_datapoint(
+            dp=dp, latency_ms_per_output_token=latency_per_output_token
+        )
 
     def get_capability(self) -> float:
         return CAPABILITY_SCORE_MAP.get(self.model, CAPABILITY_SCORE_FALLBACK)
@@ -20,6 +20,7 @@ class OutlinesCompletionModel(VLLMCompletionModel):
             force_json=True,
             schema=schema,
             temperature=temperature,
+            client=self.http_client,
         )
         return self.handle_parse_force_response(prompt=prompt, content=res)
 
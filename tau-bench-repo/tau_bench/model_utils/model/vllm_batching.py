@@ -0,0 +1,123 @@
+import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any
+
+from tau_bench.model_utils.model.http_client import HTTPClient
+from tau_bench.model_utils.model.vllm_utils import generate_batch_request
+
+
+class BatchDispatcher(object):
+    """Coalesces concurrent completion requests into batched requests to a vLLM server.
+
+    `submit` blocks its caller until the completion of its prompt is available. Prompts
+    submitted with the same sampling arguments are queued together, and a queue is sent
+    as one request when it reaches `max_batch_size` prompts or when its first prompt has
+    waited `max_wait_ms`, whichever comes first. Up to `max_in_flight` batches are sent
+    at a time. `close` must be called once the dispatcher is no longer needed.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        model: str,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        max_in_flight: int = 8,
+        client: HTTPClient | None = None,
+    ) -> None:
+        self.url = url
+        self.model = model
+        self.client = client
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.cond = threading.Condition()
+        # sampling arguments -> (arrival time of the oldest prompt, queued prompts)
+        self.queues: dict[tuple[Any, ...], tuple[float, list[tuple[str, Future]]]] = {}
+        self.executor = ThreadPoolExecutor(max_workers=max_in_flight)
+        self.num_batches = 0
+        self.num_prompts = 0
+        self.closed = False
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+
+    def submit(
+        self,
+        prompt: str,
+        temperature: float = 0.0,
+        force_json: bool = False,
+        **req_body_kwargs: Any,
+    ) -> str:
+        future: Future = Future()
+        key = (temperature, force_json, json.dumps(req_body_kwargs, sort_keys=True))
+        with self.cond:
+            if self.closed:
+                raise RuntimeError("BatchDispatcher is closed")
+            if key not in self.queues:
+                self.queues[key] = (time.monotonic(), [])
+            self.queues[key][1].append((prompt, future))
+            self.cond.notify()
+        return future.result()
+
+    def take_ready(self) -> tuple[list[tuple[tuple[Any, ...], list[tuple[str, Future]]]], float | None]:
+        """Pop the queues that are due and return them with the time until the next one is.
+
+        Once closed, every queue is due.
+        """
+        now = time.monotonic()
+        ready = []
+        timeout = None
+        for key, (first, queued) in list(self.queues.items()):
+            wait = first + self.max_wait_ms / 1000 - now
+            if len(queued) >= self.max_batch_size or wait <= 0 or self.closed:
+                del self.queues[key]
+                for i in range(0, len(queued), self.max_batch_size):
+                    ready.append((key, queued[i : i + self.max_batch_size]))
+            elif timeout is None or wait < timeout:
+                timeout = wait
+        return ready, timeout
+
+    def loop(self) -> None:
+        while True:
+            with self.cond:
+                ready, timeout = self.take_ready()
+                while len(ready) == 0 and not self.closed:
+                    self.cond.wait(timeout=timeout)
+                    ready, timeout = self.take_ready()
+                closed = self.closed
+            for key, batch in ready:
+                self.num_batches += 1
+                self.num_prompts += len(batch)
+                self.executor.submit(self.send, key, batch)
+            if closed:
+                return
+
+    def close(self) -> None:
+        """Send the prompts still queued, then stop the dispatch thread and the senders."""
+        with self.cond:
+            if self.closed:
+                return
+            self.closed = True
+            self.cond.notify()
+        self.thread.join()
+        self.executor.shutdown(wait=True)
+
+    def send(self, key: tuple[Any, ...], batch: list[tuple[str, Future]]) -> None:
+        temperature, force_json, req_body_kwargs = key
+        try:
+            texts = generate_batch_request(
+                url=self.url,
+                model=self.model,
+                prompts=[prompt for prompt, _ in batch],
+                temperature=temperature,
+                force_json=force_json,
+                client=self.client,
+                **json.loads(req_body_kwargs),
+            )
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), text in zip(batch, texts):
+            future.set_result(text)
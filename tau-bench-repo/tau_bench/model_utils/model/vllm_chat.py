@@ -1,7 +1,14 @@
+from typing import Any
+
 from tau_bench.model_utils.api.datapoint import Datapoint
 from tau_bench.model_utils.model.chat import ChatModel, Message
-from tau_bench.model_utils.model.completion import approx_cost_for_datapoint, approx_prompt_str
+from tau_bench.model_utils.model.completion import (
+    approx_cost_for_datapoint,
+    approx_latency_for_datapoint,
+    approx_prompt_str,
+)
 from tau_bench.model_utils.model.general_model import wrap_temperature
+from tau_bench.model_utils.model.http_client import HTTPClientConfig, sdk_client_kwargs
 from tau_bench.model_utils.model.utils import approx_num_tokens
 
 PRICE_PER_INPUT_TOKEN_MAP = {
@@ -58,17 +65,22 @@ class VLLMChatModel(ChatModel):
         capability: float | None = None,
         latency_ms_per_output_token: float | None = None,
         max_context_length: int | None = None,
+        http_config: HTTPClientConfig | None = None,
     ) -> None:
-        from openai import AsyncOpenAI, OpenAI
+        from openai import AsyncOpenAI, OpenAI, Timeout
 
         self.model = model
+        self.base_url = base_url
+        client_kwargs = sdk_client_kwargs(http_config, timeout_cls=Timeout)
         self.client = OpenAI(
             base_url=base_url,
             api_key=api_key,
+            **client_kwargs,
         )
         self.async_client = AsyncOpenAI(
             base_url=base_url,
             api_key=api_key,
+            **client_kwargs,
         )
         self.temperature = temperature
         self.price_per_input_token = (
@@ -92,13 +104,19 @@ class VLLMChatModel(ChatModel):
             else MAX_CONTEXT_LENGTH_MAP.get(model, MAX_CONTEXT_LENGTH_FALLBACK)
         )
 
+    def cache_key(self) -> dict[str, Any]:
+        # a self-hosted model name says little about the weights behind it
+        return {**super().cache_key(), "base_url": self.base_url}
+
     def get_approx_cost(self, dp: Datapoint) -> float:
         cost_per_token = self.price_per_input_token
         return approx_cost_for_datapoint(dp=dp, price_per_input_token=cost_per_token)
 
     def get_latency(self, dp: Datapoint) -> float:
         latency_per_output_token = self.latency_ms_per_output_token
-        return approx_cost_for_datapoint(dp=dp, price_per_input_token=latency_per_output_token)
+        return approx_latency_for_datapoint(
+            dp=dp, latency_ms_per_output_token=latency_per_output_token
+        )
 
     def get_capability(self) -> float:
         return CAPABILITY_SCORE_MAP.get(self.model, CAPABILITY_SCORE_FALLBACK)
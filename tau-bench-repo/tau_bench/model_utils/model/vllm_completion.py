@@ -1,4 +1,5 @@
 import os
+import weakref
 from typing import Any
 
 from pydantic import BaseModel
@@ -7,10 +8,17 @@ from tau_bench.model_utils.api.datapoint import Datapoint
 from tau_bench.model_utils.model.completion import (
     CompletionModel,
     approx_cost_for_datapoint,
+    approx_latency_for_datapoint,
     approx_prompt_str,
 )
+from tau_bench.model_utils.model.http_client import HTTPClientConfig, get_http_client
 from tau_bench.model_utils.model.utils import approx_num_tokens
-from tau_bench.model_utils.model.vllm_utils import generate_request
+from tau_bench.model_utils.model.vllm_batching import BatchDispatcher
+from tau_bench.model_utils.model.vllm_utils import (
+    NATIVE_ENDPOINT,
+    generate_batch_request,
+    generate_request,
+)
 
 PRICE_PER_INPUT_TOKEN_MAP = {
     "Qwen/Qwen2-0.5B-Instruct": 0.0,
@@ -66,10 +74,20 @@ class VLLMCompletionModel(CompletionModel):
         capability: float | None = None,
         latency_ms_per_output_token: float | None = None,
         max_context_length: int | None = None,
+        batch_window_ms: float | None = None,
+        max_batch_size: int = 32,
+        http_config: HTTPClientConfig | None = None,
     ) -> None:
         self.model = model
         self.base_url = base_url
         self.url = os.path.join(base_url, endpoint)
+        self.openai_compatible = endpoint.strip("/") != NATIVE_ENDPOINT
+        if batch_window_ms is not None and not self.openai_compatible:
+            # a batch is one request, so it cannot follow the native endpoint's semantics
+            raise ValueError(
+                "Batching needs an OpenAI-compatible completions endpoint such as "
+                f"'v1/completions', got endpoint={endpoint!r}"
+            )
         self.temperature = temperature
         self.price_per_input_token = (
             price_per_input_token
@@ -91,18 +109,66 @@ class VLLMCompletionModel(CompletionModel):
             if max_context_length is not None
             else MAX_CONTEXT_LENGTH_MAP.get(model, MAX_CONTEXT_LENGTH_FALLBACK)
         )
+        # every model served from the same base url shares one connection pool
+        self.http_client = get_http_client(f"vllm:{base_url}", http_config)
+        # concurrent calls are batched into one request when a batching window is set
+        self.dispatcher = (
+            BatchDispatcher(
+                url=self.url,
+                model=model,
+                max_batch_size=max_batch_size,
+                max_wait_ms=batch_window_ms,
+                client=self.http_client,
+            )
+            if batch_window_ms is not None
+            else None
+        )
+        # the dispatch thread keeps the dispatcher alive, so it is closed with the model
+        self._finalizer = (
+            weakref.finalize(self, self.dispatcher.close)
+            if self.dispatcher is not None
+            else None
+        )
+
+    def cache_key(self) -> dict[str, Any]:
+        return {**super().cache_key(), "url": self.url}
+
+    def close(self) -> None:
+        """Stop batching, once the prompts already submitted are sent."""
+        if self._finalizer is not None:
+            self._finalizer()
+
+    def complete(self, prompt: str, temperature: float, force_json: bool = False) -> str:
+        if self.dispatcher is not None:
+            return self.dispatcher.submit(
+                prompt=prompt, temperature=temperature, force_json=force_json
+            )
+        if self.openai_compatible:
+            return generate_batch_request(
+                url=self.url,
+                model=self.model,
+                prompts=[prompt],
+                temperature=temperature,
+                force_json=force_json,
+                client=self.http_client,
+            )[0]
+        return generate_request(
+            url=self.url,
+            prompt=prompt,
+            temperature=temperature,
+            force_json=force_json,
+            client=self.http_client,
+        )
 
     def generate_from_prompt(self, prompt: str, temperature: float = 0.0) -> str:
-        return generate_request(url=self.url, prompt=prompt, temperature=temperature)
+        return self.complete(prompt=prompt, temperature=temperature)
 
     def parse_force_from_prompt(
         self, prompt: str, typ: BaseModel | dict[str, Any], temperature: float | None = None
     ) -> dict[str, Any]:
         if temperature is None:
             temperature = self.temperature
-        res = generate_request(
-            url=self.url, prompt=prompt, force_json=True, temperature=temperature
-        )
+        res = self.complete(prompt=prompt, temperature=temperature, force_json=True)
         return self.handle_parse_force_response(prompt=prompt, content=res)
 
     def get_approx_cost(self, dp: Datapoint) -> float:
@@ -111,7 +177,9 @@ class VLLMCompletionModel(CompletionModel):
 
     def get_latency(self, dp: Datapoint) -> float:
         latency_per_output_token = self.latency_ms_per_output_token
-        return approx_cost_for_datapoint(dp=dp, price_per_input_token=latency_per_output_token)
+        return approx_latency_for_datapoint(
+            dp=dp, latency_ms_per_output_token=latency_per_output_token
+        )
 
     def get_capability(self) -> float:
         return CAPABILITY_SCORE_MAP.get(self.model, CAPABILITY_SCORE_FALLBACK)
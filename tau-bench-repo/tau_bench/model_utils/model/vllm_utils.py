@@ -1,8 +1,11 @@
 from typing import Any
 
-import requests
-
 from tau_bench.model_utils.model.general_model import wrap_temperature
+from tau_bench.model_utils.model.http_client import HTTPClient, get_http_client
+
+# vLLM's native endpoint, which takes a single prompt; any other endpoint is taken to be
+# an OpenAI-compatible completions endpoint
+NATIVE_ENDPOINT = "generate"
 
 
 def generate_request(
@@ -10,6 +13,7 @@ def generate_request(
     prompt: str,
     temperature: float = 0.0,
     force_json: bool = False,
+    client: HTTPClient | None = None,
     **req_body_kwargs: Any,
 ) -> str:
     args = {
@@ -21,12 +25,9 @@ def generate_request(
     if force_json:
         # the prompt will have a suffix of '```json\n' to indicate that the response should be a JSON object
         args["stop"] = ["```"]
-    res = requests.post(
-        url,
-        json=args,
-    )
-    res.raise_for_status()
-    json_res = res.json()
+    if client is None:
+        client = get_http_client("vllm")
+    json_res = client.post_json(url, json=args)
     if "text" not in json_res:
         raise ValueError(f"Unexpected response: {json_res}")
     elif len(json_res["text"]) == 0:
@@ -34,3 +35,38 @@ def generate_request(
     text = json_res["text"][0]
     assert isinstance(text, str)
     return text.removeprefix(prompt)
+
+
+def generate_batch_request(
+    url: str,
+    model: str,
+    prompts: list[str],
+    temperature: float = 0.0,
+    force_json: bool = False,
+    client: HTTPClient | None = None,
+    **req_body_kwargs: Any,
+) -> list[str]:
+    """Complete several prompts with one request to an OpenAI-compatible completions endpoint.
+
+    Each completion is checked and stripped of its prompt like in `generate_request`.
+    """
+    args = {
+        "model": model,
+        "prompt": prompts,
+        "temperature": wrap_temperature(temperature),
+        "max_tokens": 4096,
+        **req_body_kwargs,
+    }
+    if force_json:
+        args["stop"] = ["```"]
+    if client is None:
+        client = get_http_client("vllm")
+    json_res = client.post_json(url, json=args)
+    if "choices" not in json_res:
+        raise ValueError(f"Unexpected response: {json_res}")
+    texts: list[str | None] = [None] * len(prompts)
+    for choice in json_res["choices"]:
+        texts[choice["index"]] = choice["text"]
+    if any(text is None for text in texts):
+        raise ValueError(f"Empty response: {json_res}")
+    return [text.removeprefix(prompt) for prompt, text in zip(prompts, texts)]
@@ -3,6 +3,7 @@
 import os
 import json
 import random
+import time
 import traceback
 from math import comb
 import multiprocessing
@@ -11,19 +12,30 @@ from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor
 
 from tau_bench.envs import get_env
+from tau_bench.envs.metrics import EnvMetrics, summarize
 from tau_bench.agents.base import Agent
+from tau_bench.agents.history import get_history_policy
 from tau_bench.types import EnvRunResult, RunConfig
 from litellm import provider_list
-from tau_bench.envs.user import UserStrategy
+from tau_bench.envs.user import UserResponseCache, UserStrategy, use_user_cache
+from tau_bench.cassette import Cassette, CassetteMode, Episode, episode, use_cassette
+from tau_bench.hedging import Hedger, use_hedger
+from tau_bench.ledger import UsageLedger, merge_summaries, recording
 
 
 def run(config: RunConfig) -> List[EnvRunResult]:
     assert config.env in ["retail", "airline"], "Only retail and airline envs are supported"
     assert config.model_provider in provider_list, "Invalid model provider"
     assert config.user_model_provider in provider_list, "Invalid user model provider"
-    assert config.agent_strategy in ["tool-calling", "act", "react", "few-shot"], "Invalid agent strategy"
+    assert config.agent_strategy in ["tool-calling", "act", "react", "few-shot", "oracle"], "Invalid agent strategy"
     assert config.task_split in ["train", "test", "dev"], "Invalid task split"
     assert config.user_strategy in [item.value for item in UserStrategy], "Invalid user strategy"
+    assert config.few_shot_selection in ["random", "bm25"], "Invalid few-shot selection"
+    assert config.cassette_mode in [item.value for item in CassetteMode], "Invalid cassette mode"
+    if config.agent_strategy == "oracle" and config.user_strategy != UserStrategy.SCRIPTED.value:
+        # the oracle never asks the user anything, an LLM user would only add cost
+        print(f"Replacing user strategy {config.user_strategy} with scripted for the oracle agent")
+        config = config.model_copy(update={"user_strategy": UserStrategy.SCRIPTED.value})
 
     random.seed(config.seed)
     time_str = datetime.now().strftime("%m%d%H%M%S")
@@ -31,6 +43,24 @@ def run(config: RunConfig) -> List[EnvRunResult]:
     if not os.path.exists(config.log_dir):
         os.makedirs(config.log_dir)
 
+    cassette = None
+    if config.cassette_dir is not None:
+        cassette = Cassette(config.cassette_dir, mode=CassetteMode(config.cassette_mode))
+        print(f"Using cassette {config.cassette_dir} in {config.cassette_mode} mode")
+    use_cassette(cassette)
+    user_cache = None
+    if config.user_cache_path is not None:
+        user_cache = UserResponseCache(
+            config.user_cache_path, max_bytes=config.user_cache_max_mb * 1024 * 1024
+        )
+        print(f"Using user response cache {config.user_cache_path}")
+    use_user_cache(user_cache)
+    hedger = None
+    if config.hedge_quantile is not None:
+        hedger = Hedger(quantile=config.hedge_quantile, max_hedge_rate=config.hedge_max_rate)
+        print(f"Hedging completions slower than p{config.hedge_quantile * 100:g} (at most {config.hedge_max_rate * 100:g}% of calls)")
+    use_hedger(hedger)
+
     print(f"Loading user with strategy: {config.user_strategy}")
     env = get_env(
         config.env,
@@ -38,6 +68,7 @@ def run(config: RunConfig) -> List[EnvRunResult]:
         user_model=config.user_model,
         user_provider=config.user_model_provider,
         task_split=config.task_split,
+        validate_args=config.validate_args,
     )
     agent = agent_factory(
         tools_info=env.tools_info,
@@ -55,6 +86,7 @@ def run(config: RunConfig) -> List[EnvRunResult]:
         print(
             f"Running tasks {config.start_index} to {end_index} (checkpoint path: {ckpt_path})"
     )
+    start_time = time.perf_counter()
     for i in range(config.num_trials):
         if config.task_ids and len(config.task_ids) > 0:
             idxs = config.task_ids
@@ -64,35 +96,65 @@ def run(config: RunConfig) -> List[EnvRunResult]:
             random.shuffle(idxs)
 
         def _run(idx: int) -> EnvRunResult:
-            isolated_env = get_env(
-                config.env,
-                user_strategy=config.user_strategy,
-                user_model=config.user_model,
-                task_split=config.task_split,
-                user_provider=config.user_model_provider,
-                task_index=idx,
-            )
+            ledger = UsageLedger()
+            # the user simulator already speaks when the env is created
+            cassette_episode = Episode(trial=i, task=idx)
+            with recording(ledger), episode(cassette_episode):
+                isolated_env = get_env(
+                    config.env,
+                    user_strategy=config.user_strategy,
+                    user_model=config.user_model,
+                    task_split=config.task_split,
+                    user_provider=config.user_model_provider,
+                    task_index=idx,
+                    validate_args=config.validate_args,
+                )
 
             print(f"Running task {idx}")
+            start = time.perf_counter()
             try:
-                res = agent.solve(
-                    env=isolated_env,
-                    task_index=idx,
-                )
+                with recording(ledger), episode(cassette_episode):
+                    res = agent.solve(
+                        env=isolated_env,
+                        task_index=idx,
+                    )
                 result = EnvRunResult(
                     task_id=idx,
                     reward=res.reward,
-                    info=res.info,
+                    info={
+                        **res.info,
+                        "validation_failures": isolated_env.validation_failures,
+                        "metrics": isolated_env.metrics.to_dict(),
+                        "duration_ms": (time.perf_counter() - start) * 1000,
+                        **(
+                            {
+                                # the user side of the conversation and which of its messages came from the cache
+                                "user_traj": isolated_env.user.messages,
+                                "user_cached_turns": isolated_env.user.cached_turns,
+                                "user_cached_messages": isolated_env.user.cached_message_indices,
+                            }
+                            if user_cache is not None and hasattr(isolated_env.user, "cached_turns")
+                            else {}
+                        ),
+                    },
                     traj=res.messages,
                     trial=i,
+                    usage=ledger.summary(),
                 )
             except Exception as e:
                 result = EnvRunResult(
                     task_id=idx,
                     reward=0.0,
-                    info={"error": str(e), "traceback": traceback.format_exc()},
+                    info={
+                        "error": str(e),
+                        "traceback": traceback.format_exc(),
+                        "validation_failures": isolated_env.validation_failures,
+                        "metrics": isolated_env.metrics.to_dict(),
+                        "duration_ms": (time.perf_counter() - start) * 1000,
+                    },
                     traj=[],
                     trial=i,
+                    usage=ledger.summary(),
                 )
             print(
                 "✅" if result.reward == 1 else "❌",
@@ -113,7 +175,21 @@ def run(config: RunConfig) -> List[EnvRunResult]:
             res = list(executor.map(_run, idxs))
             results.extend(res)
 
+    elapsed = time.perf_counter() - start_time
     display_metrics(results)
+    print(f"⚡ Throughput: {len(results)} episodes in {elapsed:.2f}s ({len(results) / elapsed:.2f} episodes/s)")
+    if cassette is not None:
+        print(f"📼 Cassette: {cassette.hits} hits, {cassette.misses} misses")
+    if hedger is not None:
+        print(
+            f"🪁 Hedging: {hedger.hedges} of {hedger.calls} calls hedged ({hedger.hedge_rate() * 100:.1f}%), "
+            f"{hedger.hedge_wins} won by the hedge"
+        )
+    if user_cache is not None:
+        print(
+            f"🗃️ User cache: {user_cache.hits} hits, {user_cache.misses} misses "
+            f"({user_cache.hit_rate() * 100:.1f}% hit rate)"
+        )
 
     with open(ckpt_path, "w") as f:
         json.dump([result.model_dump() for result in results], f, indent=2)
@@ -124,6 +200,9 @@ def run(config: RunConfig) -> List[EnvRunResult]:
 def agent_factory(
     tools_info: List[Dict[str, Any]], wiki, config: RunConfig
 ) -> Agent:
+    history_policy = get_history_policy(
+        config.history_max_tokens, keep_recent_turns=config.history_keep_turns
+    )
     if config.agent_strategy == "tool-calling":
         # native tool calling
         from tau_bench.agents.tool_calling_agent import ToolCallingAgent
@@ -134,6 +213,8 @@ def agent_factory(
             model=config.model,
             provider=config.model_provider,
             temperature=config.temperature,
+            history_policy=history_policy,
+            parallel_tool_calls=config.parallel_tool_calls,
         )
     elif config.agent_strategy == "act":
         # `act` from https://arxiv.org/abs/2210.03629
@@ -145,7 +226,9 @@ def agent_factory(
             model=config.model,
             provider=config.model_provider,
             use_reasoning=False,
+            stream=config.stream_actions,
             temperature=config.temperature,
+            history_policy=history_policy,
         )
     elif config.agent_strategy == "react":
         # `react` from https://arxiv.org/abs/2210.03629
@@ -157,13 +240,22 @@ def agent_factory(
             model=config.model,
             provider=config.model_provider,
             use_reasoning=True,
+            stream=config.stream_actions,
             temperature=config.temperature,
+            history_policy=history_policy,
         )
     elif config.agent_strategy == "few-shot":
         from tau_bench.agents.few_shot_agent import FewShotToolCallingAgent
         assert config.few_shot_displays_path is not None, "Few shot displays path is required for few-shot agent strategy"
         with open(config.few_shot_displays_path, "r") as f:
             few_shot_displays = [json.loads(line)["messages_display"] for line in f]
+        few_shot_selector = None
+        if config.few_shot_selection == "bm25":
+            from tau_bench.agents.few_shot_retrieval import FewShotSelector
+
+            few_shot_selector = FewShotSelector.from_path(
+                config.few_shot_displays_path, max_tokens=config.few_shot_max_tokens
+            )
 
         return FewShotToolCallingAgent(
             tools_info=tools_info,
@@ -172,7 +264,14 @@ def agent_factory(
             provider=config.model_provider,
             few_shot_displays=few_shot_displays,
             temperature=config.temperature,
+            history_policy=history_policy,
+            few_shot_selector=few_shot_selector,
         )
+    elif config.agent_strategy == "oracle":
+        # replays the ground truth without calling a model
+        from tau_bench.agents.oracle_agent import OracleAgent
+
+        return OracleAgent()
     else:
         raise ValueError(f"Unknown agent strategy: {config.agent_strategy}")
 
@@ -201,3 +300,82 @@ def display_metrics(results: List[EnvRunResult]) -> None:
     print("📈 Pass^k")
     for k, pass_hat_k in pass_hat_ks.items():
         print(f"  k={k}: {pass_hat_k}")
+    validation_failures: dict[str, int] = {}
+    for result in results:
+        for tool_name, count in result.info.get("validation_failures", {}).items():
+            validation_failures[tool_name] = validation_failures.get(tool_name, 0) + count
+    if len(validation_failures) > 0:
+        print("🚫 Invalid tool calls")
+        for tool_name, count in sorted(validation_failures.items()):
+            print(f"  {tool_name}: {count}")
+    agent_metrics = [r.info["agent_metrics"] for r in results if "agent_metrics" in r.info]
+    if len(agent_metrics) > 0:
+        print("🤖 Agent turns (mean per task)")
+        for key, value in agent_metrics[0].items():
+            if isinstance(value, list):
+                # per-step values, averaged over every step of every task
+                values = [v for m in agent_metrics for v in m.get(key, [])]
+                if len(values) > 0:
+                    print(f"  {key} (per step): {sum(values) / len(values):.1f}")
+                continue
+            mean = sum(m.get(key, 0) for m in agent_metrics) / len(agent_metrics)
+            print(f"  {key}: {mean:.1f}")
+    compacted = [r.reward for r in results if r.info.get("agent_metrics", {}).get("compacted_turns", 0) > 0]
+    if len(compacted) > 0:
+        verbatim = [r.reward for r in results if r.info.get("agent_metrics", {}).get("compacted_turns", 0) == 0]
+        print("🗜️ History compaction")
+        print(f"  tasks compacted: {len(compacted)}/{len(results)}")
+        print(f"  average reward (compacted): {sum(compacted) / len(compacted)}")
+        if len(verbatim) > 0:
+            print(f"  average reward (verbatim): {sum(verbatim) / len(verbatim)}")
+    display_usage(merge_summaries([r.usage for r in results]), len(results))
+    durations = sorted(r.info["duration_ms"] for r in results if "duration_ms" in r.info)
+    if len(durations) > 0:
+        print(
+            f"⏳ Conversation latency: p50 {durations[len(durations) // 2] / 1000:.2f}s, "
+            f"p95 {durations[min(len(durations) - 1, int(0.95 * len(durations)))] / 1000:.2f}s, "
+            f"max {durations[-1] / 1000:.2f}s"
+        )
+    display_env_metrics(
+        summarize(
+            [EnvMetrics.from_dict(r.info["metrics"]) for r in results if "metrics" in r.info]
+        )
+    )
+
+
+def display_usage(usage: Dict[str, Dict[str, Any]], num_episodes: int) -> None:
+    if len(usage) == 0:
+        return
+    print("💰 LLM usage")
+    print(
+        f"  {'role:model':<36} {'calls':>6} {'errors':>6} {'retries':>7} {'prompt tok':>11} {'compl tok':>10} {'cached tok':>11} {'cost':>9} {'cost/ep':>8} {'mean ms':>8} {'hedges':>6} {'hedge cost':>10}"
+    )
+    for key, entry in sorted(usage.items()):
+        print(
+            f"  {key:<36} {entry['calls']:>6} {entry['errors']:>6} {entry.get('retries', 0):>7} {entry['prompt_tokens']:>11} "
+            f"{entry['completion_tokens']:>10} {entry['cached_prompt_tokens']:>11} {entry['cost']:>9.4f} "
+            f"{entry['cost'] / num_episodes:>8.4f} {entry['latency_ms'] / max(entry['calls'], 1):>8.1f} "
+            f"{entry.get('hedges', 0):>6} {entry.get('hedge_cost', 0.0):>10.4f}"
+        )
+
+
+def display_env_metrics(metrics: EnvMetrics) -> None:
+    if len(metrics.tools) == 0:
+        return
+    print("⏱️ Tool calls")
+    print(
+        f"  {'tool':<36} {'calls':>6} {'err%':>6} {'mean ms':>8} {'p50 ms':>7} {'p95 ms':>7} {'max ms':>8} {'avg bytes':>9} {'tokens':>8}"
+    )
+    rows = sorted(metrics.tools.items()) + [("total", metrics.total())]
+    for tool_name, tool_metrics in rows:
+        d = tool_metrics.to_dict()
+        print(
+            f"  {tool_name:<36} {d['calls']:>6} {d['error_rate'] * 100:>6.1f} {d['mean_latency_ms']:>8.2f} "
+            f"{tool_metrics.latency_quantile(0.5):>7.2f} {tool_metrics.latency_quantile(0.95):>7.2f} "
+            f"{d['max_latency_ms']:>8.2f} {d['observation_bytes'] // d['calls']:>9} {d['observation_tokens']:>8}"
+        )
+    if metrics.reward_calls > 0:
+        print(
+            f"  calculate_reward: {metrics.reward_calls} calls, "
+            f"{metrics.reward_latency_ms / metrics.reward_calls:.2f} ms mean"
+        )
@@ -67,6 +67,8 @@ class EnvRunResult(BaseModel):
     info: Dict[str, Any]
     traj: List[Dict[str, Any]]
     trial: int
+    # LLM usage of the episode by `role:model`, see `tau_bench.ledger`
+    usage: Dict[str, Dict[str, Any]] = {}
 
 
 class RunConfig(BaseModel):
@@ -88,3 +90,16 @@ class RunConfig(BaseModel):
     shuffle: int = 0
     user_strategy: str = "llm"
     few_shot_displays_path: Optional[str] = None
+    parallel_tool_calls: bool = False
+    history_max_tokens: Optional[int] = None
+    history_keep_turns: int = 4
+    stream_actions: bool = False
+    cassette_dir: Optional[str] = None
+    cassette_mode: str = "record-missing"
+    few_shot_selection: str = "random"
+    few_shot_max_tokens: Optional[int] = None
+    user_cache_path: Optional[str] = None
+    user_cache_max_mb: int = 512
+    hedge_quantile: Optional[float] = None
+    hedge_max_rate: float = 0.1
+    validate_args: bool = False
@@ -0,0 +1,86 @@
+# Copyright Sierra
+
+import json
+
+import pytest
+
+from tau_bench.agents.chat_react_agent import ActionStreamParser, parse_action
+from tau_bench.types import RESPOND_ACTION_NAME
+
+ACTION = {
+    "name": "find_user_id_by_email",
+    "arguments": {"email": "a@b.com", "note": 'braces {"}"} in a string'},
+}
+
+
+def generation(action):
+    return (
+        "Thought:\nI should look the user up.\nAction:\n"
+        + json.dumps(action)
+        + "\nObservation: made up by the model"
+    )
+
+
+GENERATION = generation(ACTION)
+
+
+def chunks(text, size):
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+def stream(generation, size):
+    parser = ActionStreamParser()
+    for chunk in chunks(generation, size):
+        if parser.feed(chunk):
+            break
+    return parser
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 10_000])
+def test_action_is_found_at_any_chunk_boundary(size):
+    parser = stream(GENERATION, size)
+    assert parser.action_end is not None
+    assert parser.text == GENERATION[: GENERATION.index("\nObservation")]
+    assert parser.action() == parse_action(parser.text)
+    assert parser.action().kwargs == ACTION["arguments"]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 10_000])
+def test_a_marker_inside_the_object_is_part_of_a_value(size):
+    action = {"name": "respond", "arguments": {"content": "Say Action: {} to me"}}
+    parser = stream(generation(action), size)
+    assert parser.action_end is not None
+    assert parser.action().kwargs == action["arguments"]
+
+
+@pytest.mark.parametrize("size", [1, 5, 10_000])
+def test_a_later_marker_restarts_the_scan(size):
+    generation = "Action: not json yet\nAction:\n" + json.dumps(ACTION)
+    parser = stream(generation, size)
+    assert parser.action_end is not None
+    assert parser.action().name == ACTION["name"]
+
+
+@pytest.mark.parametrize("size", [1, 4, 10_000])
+def test_text_without_an_object_falls_back_to_a_response(size):
+    generation = "Thought:\nJust answer.\nAction: Hello there {not json}"
+    parser = stream(generation, size)
+    assert parser.action_end is None
+    assert parser.text == generation
+    assert parser.action() == parse_action(generation)
+    assert parser.action().name == RESPOND_ACTION_NAME
+
+
+def test_escaped_quotes_do_not_end_a_string():
+    action = {"name": "think", "arguments": {"thought": 'a \\"} quote'}}
+    generation = "Action: " + json.dumps(action) + " trailing"
+    parser = stream(generation, 1)
+    assert parser.action().kwargs == action["arguments"]
+    assert not parser.text.endswith("trailing")
+
+
+def test_feeding_after_the_action_keeps_it():
+    parser = stream(GENERATION, 10_000)
+    text = parser.text
+    assert parser.feed("more text")
+    assert parser.text == text
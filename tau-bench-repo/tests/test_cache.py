@@ -0,0 +1,54 @@
+# Copyright Sierra
+
+import pytest
+
+from tau_bench.model_utils.api.api import API
+from tau_bench.model_utils.api.cache import KeyEncoder, hash_func_call
+from tau_bench.model_utils.api.datapoint import GenerateDatapoint
+from tau_bench.model_utils.api.router import OnlineSLORequestRouter
+from tau_bench.model_utils.api.sample import MajoritySamplingStrategy
+from tau_bench.model_utils.model.vllm_completion import VLLMCompletionModel
+
+
+def make_api(temperature=0.0, **kwargs):
+    model = VLLMCompletionModel(
+        model="m", base_url="http://127.0.0.1:9", temperature=temperature
+    )
+    return API.from_general_model(model, **kwargs)
+
+
+def key(api, text="text"):
+    return hash_func_call(
+        API.generate, (api,), {"instruction": "Summarize.", "text": text}
+    )
+
+
+def test_equal_configurations_share_a_key():
+    assert key(make_api()) == key(make_api())
+    assert key(make_api()) != key(make_api(), text="other")
+    assert key(make_api()) != key(make_api(temperature=1.0))
+    majority = MajoritySamplingStrategy(n=3)
+    assert key(make_api(sampling_strategy=majority)) != key(make_api())
+    # the concurrency does not change the answers
+    assert key(make_api(sampling_strategy=majority)) == key(
+        make_api(sampling_strategy=MajoritySamplingStrategy(n=3, max_concurrency=1))
+    )
+
+
+def test_learned_router_state_does_not_change_the_key():
+    router = OnlineSLORequestRouter()
+    api = make_api(request_router=router)
+    before = key(api)
+    dp = GenerateDatapoint(instruction="Summarize.", text="text")
+    router.observe(api.generate_models[0], dp, 10.0)
+    assert key(api) == before
+    assert key(make_api(request_router=OnlineSLORequestRouter(alpha=0.5))) != before
+
+
+def test_objects_without_a_cache_key_are_rejected():
+    class Opaque(object):
+        def __init__(self):
+            self.config = 1
+
+    with pytest.raises(TypeError, match="Opaque"):
+        KeyEncoder().encode({"value": Opaque()})
@@ -0,0 +1,115 @@
+# Copyright Sierra
+
+import pytest
+
+from tau_bench.cassette import (
+    Cassette,
+    CassetteMissError,
+    CassetteMode,
+    Episode,
+    call_scope,
+    episode,
+    request_key,
+)
+
+MESSAGES = [{"role": "user", "content": "Hi"}]
+
+
+def request(mock_response, stream=False):
+    # the model name alone does not tell litellm which provider to route to
+    return {
+        "model": "recorded-model",
+        "custom_llm_provider": "openai",
+        "api_base": "http://127.0.0.1:9/v1",
+        "api_key": "unused",
+        "messages": MESSAGES,
+        "temperature": 0.0,
+        "mock_response": mock_response,
+        "stream": stream,
+    }
+
+
+def read(res, stream):
+    if not stream:
+        return res.choices[0].message.content
+    return "".join(
+        chunk.choices[0].delta.content or ""
+        for chunk in res
+        if len(chunk.choices) > 0
+    )
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_record_then_replay(tmp_path, stream):
+    recorder = Cassette(str(tmp_path), mode=CassetteMode.RECORD)
+    with episode(Episode(0)):
+        assert read(recorder.completion(**request("recorded", stream)), stream) == (
+            "recorded"
+        )
+    player = Cassette(str(tmp_path), mode=CassetteMode.REPLAY)
+    with episode(Episode(0)):
+        assert read(player.completion(**request("live", stream)), stream) == "recorded"
+    assert (player.hits, player.misses) == (1, 0)
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_repeated_requests_replay_in_order(tmp_path, stream):
+    recorder = Cassette(str(tmp_path), mode=CassetteMode.RECORD)
+    with episode(Episode(0)):
+        for text in ["first", "second", "third"]:
+            read(recorder.completion(**request(text, stream)), stream)
+    assert len(list(tmp_path.glob("*/*.json"))) == 3
+    player = Cassette(str(tmp_path), mode=CassetteMode.REPLAY)
+    with episode(Episode(0)):
+        replayed = [
+            read(player.completion(**request("live", stream)), stream) for _ in range(3)
+        ]
+        assert replayed == ["first", "second", "third"]
+        with pytest.raises(CassetteMissError):
+            player.completion(**request("live", stream))
+
+
+def test_trials_are_recorded_apart(tmp_path):
+    recorder = Cassette(str(tmp_path), mode=CassetteMode.RECORD)
+    for trial, text in enumerate(["trial 0", "trial 1"]):
+        with episode(Episode(trial)):
+            recorder.completion(**request(text))
+    player = Cassette(str(tmp_path), mode=CassetteMode.REPLAY)
+    for trial, text in enumerate(["trial 0", "trial 1"]):
+        with episode(Episode(trial)):
+            assert read(player.completion(**request("live")), False) == text
+
+
+def test_attempts_of_one_call_share_an_entry(tmp_path):
+    recorder = Cassette(str(tmp_path), mode=CassetteMode.RECORD)
+    with episode(Episode(0)):
+        with call_scope():
+            recorder.completion(**request("attempt 1"))
+            recorder.completion(**request("attempt 2"))
+        recorder.completion(**request("next call"))
+    player = Cassette(str(tmp_path), mode=CassetteMode.REPLAY)
+    with episode(Episode(0)):
+        assert read(player.completion(**request("live")), False) == "attempt 2"
+        assert read(player.completion(**request("live")), False) == "next call"
+
+
+def test_tasks_are_recorded_apart(tmp_path):
+    recorder = Cassette(str(tmp_path), mode=CassetteMode.RECORD)
+    for task, text in enumerate(["task 0", "task 1"]):
+        with episode(Episode(0, task=task)):
+            recorder.completion(**request(text))
+    player = Cassette(str(tmp_path), mode=CassetteMode.REPLAY)
+    for task, text in enumerate(["task 0", "task 1"]):
+        with episode(Episode(0, task=task)):
+            assert read(player.completion(**request("live")), False) == text
+
+
+def test_unset_fields_keep_the_plain_key():
+    kwargs = request("unused")
+    assert request_key(kwargs, trial=0, task=None, occurrence=0) == request_key(kwargs)
+    assert request_key(kwargs, task=0) != request_key(kwargs)
+    assert request_key(kwargs, occurrence=1) != request_key(kwargs)
+    # mock responses and routing arguments do not change what was asked
+    assert request_key(kwargs) == request_key(
+        {**request("other"), "api_base": "http://elsewhere/v1"}
+    )
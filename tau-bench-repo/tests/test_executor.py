@@ -0,0 +1,84 @@
+# Copyright Sierra
+
+import time
+
+import pytest
+
+from tau_bench.model_utils.executor import PIPELINE, SAMPLES, SharedExecutor
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def released(executor):
+    return executor.root.in_use == 0 and executor.levels[SAMPLES].in_use == 0
+
+
+def test_map_until_skips_the_rest_once_decided():
+    executor = SharedExecutor(max_workers=4)
+    settled = []
+
+    def func(x):
+        # the second item is still running when the first two results come in
+        time.sleep(0.3 if x == 1 else 0.01)
+        return x
+
+    outcome = executor.map_until(
+        func,
+        range(10),
+        until=lambda results: len(results) >= 2,
+        max_concurrency=2,
+        on_settled=settled.append,
+    )
+    assert outcome.decided
+    assert outcome.results == [0, 2]
+    assert (outcome.started, outcome.skipped, outcome.in_flight) == (3, 7, 1)
+    # the call in flight finishes in the background and gives its helper back
+    wait_for(lambda: len(settled) == 1 and released(executor))
+    assert settled[0] > 0
+    assert outcome.results == [0, 2]
+
+
+def test_map_until_runs_everything_if_never_decided():
+    executor = SharedExecutor(max_workers=4)
+    outcome = executor.map_until(lambda x: x, range(5), until=lambda results: False)
+    assert not outcome.decided
+    assert sorted(outcome.results) == list(range(5))
+    assert (outcome.skipped, outcome.in_flight) == (0, 0)
+    wait_for(lambda: released(executor))
+
+
+def test_map_until_raises_the_first_error_and_releases_its_budget():
+    executor = SharedExecutor(max_workers=4)
+
+    def func(x):
+        if x == 0:
+            raise ValueError("boom")
+        time.sleep(0.05)
+        return x
+
+    with pytest.raises(ValueError, match="boom"):
+        executor.map_until(
+            func, range(10), until=lambda results: False, max_concurrency=2
+        )
+    wait_for(lambda: released(executor))
+
+
+def test_map_until_runs_in_the_caller_without_spare_threads():
+    executor = SharedExecutor(max_workers=2, level_limits={PIPELINE: 1, SAMPLES: 1})
+    budget = executor.levels[SAMPLES]
+    assert budget.try_acquire()
+    try:
+        outcome = executor.map_until(
+            lambda x: x, range(5), until=lambda results: len(results) >= 3
+        )
+    finally:
+        budget.release()
+    assert outcome.results == [0, 1, 2]
+    assert (outcome.skipped, outcome.in_flight) == (2, 0)
+    assert executor.metrics()["helpers"] == 0
+    assert released(executor)
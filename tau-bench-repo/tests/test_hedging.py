@@ -0,0 +1,89 @@
+# Copyright Sierra
+
+import threading
+import time
+
+import pytest
+
+from tau_bench.hedging import Hedger
+
+MODEL_KEY = ("m", None)
+
+
+def make_hedger():
+    hedger = Hedger(quantile=0.5, max_hedge_rate=1.0, min_samples=5)
+    for _ in range(5):
+        hedger.record_latency(MODEL_KEY, 20.0)
+    return hedger
+
+
+def scripted(*steps):
+    """Return a completion whose n-th call sleeps steps[n][0] s, then returns or raises."""
+    calls = []
+    lock = threading.Lock()
+
+    def fn(**kwargs):
+        with lock:
+            delay, outcome = steps[len(calls)]
+            calls.append(outcome)
+        time.sleep(delay)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    return fn
+
+
+def latencies(hedger):
+    return list(hedger.trackers[MODEL_KEY].latencies)[5:]
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_fast_call_is_not_hedged():
+    hedger = make_hedger()
+    assert hedger.completion(scripted((0.0, "primary")), model="m") == "primary"
+    assert hedger.hedges == 0
+    assert len(latencies(hedger)) == 1
+
+
+def test_primary_latency_is_recorded_when_the_hedge_wins():
+    hedger = make_hedger()
+    extras = []
+    fn = scripted((0.3, "primary"), (0.0, "hedge"))
+    res = hedger.completion(
+        fn, on_extra=lambda res, ms, error: extras.append(res), model="m"
+    )
+    assert res == "hedge"
+    assert hedger.hedge_wins == 1
+    # the primary is still running, its latency is recorded once it finishes
+    wait_for(lambda: len(latencies(hedger)) == 1)
+    assert latencies(hedger)[0] >= 300
+    wait_for(lambda: extras == ["primary"])
+
+
+def test_primary_latency_is_recorded_when_it_wins():
+    hedger = make_hedger()
+    fn = scripted((0.05, "primary"), (0.3, "hedge"))
+    assert hedger.completion(fn, model="m") == "primary"
+    assert hedger.hedges == 1
+    wait_for(lambda: len(latencies(hedger)) == 1)
+    assert latencies(hedger)[0] >= 50
+
+
+def test_failed_primary_records_the_hedge_delay():
+    hedger = make_hedger()
+    extras = []
+    fn = scripted((0.05, RuntimeError("primary")), (0.0, RuntimeError("hedge")))
+    with pytest.raises(RuntimeError, match="primary"):
+        hedger.completion(
+            fn, on_extra=lambda res, ms, error: extras.append(str(error)), model="m"
+        )
+    wait_for(lambda: len(latencies(hedger)) == 1)
+    assert latencies(hedger) == [20.0]
+    assert extras == ["hedge"]
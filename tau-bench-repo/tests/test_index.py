@@ -0,0 +1,219 @@
+# Copyright Sierra
+
+import copy
+import random
+
+import pytest
+
+from tau_bench.envs.base import consistent_hash, to_hashable
+from tau_bench.envs.index import (
+    IndexSpec,
+    TrackedDict,
+    casefold,
+    get_registry,
+    index_data,
+    lookup,
+    scan,
+)
+from tau_bench.envs.retail.data import load_data
+from tau_bench.envs.retail.indexes import (
+    CACHED_TABLES,
+    INDEXES,
+    USERS_BY_EMAIL,
+    USERS_BY_NAME_ZIP,
+)
+
+ORDERS_BY_USER_ID = IndexSpec("orders.user_id")
+USERS_BY_PAYMENT_SOURCE = IndexSpec("users.payment_methods.source")
+ORDERS_BY_ITEM_ID = IndexSpec("orders.items.item_id")
+
+
+@pytest.fixture(scope="module")
+def raw_data():
+    return load_data()
+
+
+def make_data(raw_data):
+    return index_data(
+        copy.deepcopy(raw_data),
+        INDEXES + [ORDERS_BY_USER_ID, ORDERS_BY_ITEM_ID],
+        tables=CACHED_TABLES,
+        source="tests",
+    )
+
+
+def assert_consistent(data, spec, *values):
+    assert lookup(data, spec, *values) == scan(data, spec, *values)
+
+
+def test_spec_validation():
+    with pytest.raises(ValueError):
+        IndexSpec()
+    with pytest.raises(ValueError):
+        IndexSpec("users.email", "orders.user_id")
+    with pytest.raises(ValueError):
+        IndexSpec("users")
+    with pytest.raises(ValueError):
+        IndexSpec("users.email", "users.name", normalize=(casefold,))
+
+
+def test_lookup_matches_scan(raw_data):
+    data = make_data(raw_data)
+    user_id, user = next(iter(raw_data["users"].items()))
+    assert lookup(data, USERS_BY_EMAIL, user["email"].upper()) == [user_id]
+    assert_consistent(
+        data,
+        USERS_BY_NAME_ZIP,
+        user["name"]["first_name"],
+        user["name"]["last_name"],
+        user["address"]["zip"],
+    )
+    assert_consistent(data, ORDERS_BY_USER_ID, user_id)
+    assert lookup(data, ORDERS_BY_USER_ID, user_id) == user["orders"]
+    assert lookup(data, USERS_BY_EMAIL, "nobody@example.com") == []
+
+
+def test_lookup_without_registry_scans(raw_data):
+    data = copy.deepcopy(raw_data)
+    user_id, user = next(iter(data["users"].items()))
+    assert get_registry(data) is None
+    assert lookup(data, USERS_BY_EMAIL, user["email"]) == [user_id]
+
+
+def test_list_fields_fan_out(raw_data):
+    data = index_data(copy.deepcopy(raw_data), [USERS_BY_PAYMENT_SOURCE])
+    for source in ["paypal", "credit_card", "gift_card"]:
+        assert_consistent(data, USERS_BY_PAYMENT_SOURCE, source)
+
+
+def test_record_mutation_refreshes_index(raw_data):
+    data = make_data(raw_data)
+    user_id = next(iter(raw_data["users"]))
+    old_email = raw_data["users"][user_id]["email"]
+    assert lookup(data, USERS_BY_EMAIL, old_email) == [user_id]
+    data["users"][user_id]["email"] = "changed@example.com"
+    assert lookup(data, USERS_BY_EMAIL, old_email) == []
+    assert lookup(data, USERS_BY_EMAIL, "changed@example.com") == [user_id]
+
+
+def test_nested_mutation_refreshes_index(raw_data):
+    data = make_data(raw_data)
+    user_id = next(iter(raw_data["users"]))
+    user = raw_data["users"][user_id]
+    values = (user["name"]["first_name"], user["name"]["last_name"])
+    assert lookup(data, USERS_BY_NAME_ZIP, *values, user["address"]["zip"]) == [user_id]
+    data["users"][user_id]["address"]["zip"] = "00000"
+    assert lookup(data, USERS_BY_NAME_ZIP, *values, user["address"]["zip"]) == []
+    assert lookup(data, USERS_BY_NAME_ZIP, *values, "00000") == [user_id]
+
+
+def test_list_mutation_refreshes_index(raw_data):
+    data = make_data(raw_data)
+    order_id = next(iter(raw_data["orders"]))
+    items = data["orders"][order_id]["items"]
+    item_id = items[0]["item_id"]
+    assert order_id in lookup(data, ORDERS_BY_ITEM_ID, item_id)
+    items.append({"item_id": "new_item"})
+    assert lookup(data, ORDERS_BY_ITEM_ID, "new_item") == [order_id]
+    items.pop()
+    assert lookup(data, ORDERS_BY_ITEM_ID, "new_item") == []
+
+
+def test_new_record_is_indexed_and_tracked(raw_data):
+    data = make_data(raw_data)
+    user_id = next(iter(raw_data["users"]))
+    order = {"user_id": user_id, "items": [{"item_id": "a"}]}
+    data["orders"]["#new"] = order
+    assert lookup(data, ORDERS_BY_USER_ID, user_id)[-1] == "#new"
+    # the tool that wrote the record still holds it and may keep mutating it
+    order["items"].append({"item_id": "b"})
+    assert lookup(data, ORDERS_BY_ITEM_ID, "b") == ["#new"]
+    get_registry(data).settle()
+    tracked = data["orders"]["#new"]
+    assert isinstance(tracked, TrackedDict)
+    tracked["user_id"] = "someone_else"
+    assert "#new" not in lookup(data, ORDERS_BY_USER_ID, user_id)
+    assert lookup(data, ORDERS_BY_USER_ID, "someone_else") == ["#new"]
+
+
+def test_removed_record_leaves_index(raw_data):
+    data = make_data(raw_data)
+    user_id, user = next(iter(raw_data["users"].items()))
+    assert lookup(data, USERS_BY_EMAIL, user["email"]) == [user_id]
+    del data["users"][user_id]
+    assert lookup(data, USERS_BY_EMAIL, user["email"]) == []
+    order_id = user["orders"][0]
+    data["orders"].pop(order_id)
+    assert order_id not in lookup(data, ORDERS_BY_USER_ID, user_id)
+
+
+def test_versions_follow_changes(raw_data):
+    data = make_data(raw_data)
+    state = get_registry(data).tables["users"]
+    user_id, other_id = list(raw_data["users"])[:2]
+    assert state.version(user_id) == 0
+    data["users"][user_id]["payment_methods"]["gift_card_0"] = {"balance": 1}
+    get_registry(data).settle()
+    version = state.version(user_id)
+    assert version > 0
+    data["users"][user_id]["payment_methods"]["gift_card_0"]["balance"] = 2
+    assert state.version(user_id) > version
+    assert state.version(other_id) == 0
+
+
+def test_random_mutations_stay_consistent(raw_data):
+    rng = random.Random(0)
+    data = make_data(raw_data)
+    plain = copy.deepcopy(raw_data)
+    user_ids = list(raw_data["users"])
+    order_ids = list(raw_data["orders"])
+    for step in range(300):
+        op = rng.randrange(4)
+        order_id = rng.choice(order_ids)
+        if op == 0 and order_id in plain["orders"]:
+            user_id = rng.choice(user_ids)
+            data["orders"][order_id]["user_id"] = user_id
+            plain["orders"][order_id]["user_id"] = user_id
+        elif op == 1 and order_id in plain["orders"]:
+            item = {"item_id": f"item_{step % 7}"}
+            data["orders"][order_id]["items"].append(dict(item))
+            plain["orders"][order_id]["items"].append(dict(item))
+        elif op == 2 and order_id in plain["orders"]:
+            del data["orders"][order_id]
+            del plain["orders"][order_id]
+        else:
+            record = {"user_id": rng.choice(user_ids), "items": []}
+            data["orders"][f"#new_{step}"] = copy.deepcopy(record)
+            plain["orders"][f"#new_{step}"] = copy.deepcopy(record)
+            order_ids.append(f"#new_{step}")
+        if rng.random() < 0.5:
+            get_registry(data).settle()
+        user_id = rng.choice(user_ids)
+        assert lookup(data, ORDERS_BY_USER_ID, user_id) == scan(
+            plain, ORDERS_BY_USER_ID, user_id
+        )
+        item_id = f"item_{rng.randrange(7)}"
+        assert lookup(data, ORDERS_BY_ITEM_ID, item_id) == scan(
+            plain, ORDERS_BY_ITEM_ID, item_id
+        )
+    assert consistent_hash(to_hashable(data)) == consistent_hash(to_hashable(plain))
+
+
+def test_tracked_data_hashes_like_plain_data(raw_data):
+    data = make_data(raw_data)
+    user_id = next(iter(raw_data["users"]))
+    data["users"][user_id]["address"]["city"] = "Elsewhere"
+    plain = copy.deepcopy(raw_data)
+    plain["users"][user_id]["address"]["city"] = "Elsewhere"
+    assert to_hashable(data) == to_hashable(plain)
+
+
+def test_copies_are_detached(raw_data):
+    data = make_data(raw_data)
+    user_id = next(iter(raw_data["users"]))
+    copied = copy.deepcopy(data["users"])
+    assert type(copied) is dict
+    assert type(copied[user_id]) is dict
+    copied[user_id]["email"] = "copy@example.com"
+    assert get_registry(data).tables["users"].version(user_id) == 0
+    assert lookup(data, USERS_BY_EMAIL, "copy@example.com") == []
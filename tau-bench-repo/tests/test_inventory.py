@@ -0,0 +1,135 @@
+# Copyright Sierra
+
+import copy
+import json
+
+import pytest
+
+from tau_bench.envs.airline.data import load_data
+from tau_bench.envs.airline.indexes import CACHED_TABLES, DERIVED_TABLES, INDEXES
+from tau_bench.envs.airline.inventory import get_flight_inventory
+from tau_bench.envs.airline.tools.search_direct_flight import SearchDirectFlight
+from tau_bench.envs.index import get_registry, index_data
+
+
+@pytest.fixture(scope="module")
+def raw_data():
+    return load_data()
+
+
+def make_data(raw_data):
+    return index_data(
+        copy.deepcopy(raw_data),
+        INDEXES,
+        tables=CACHED_TABLES + DERIVED_TABLES,
+        source="tests",
+    )
+
+
+def scan_direct(data, origin, destination, date):
+    # search_direct_flight as it was before the inventory
+    results = []
+    for flight in data["flights"].values():
+        if flight["origin"] == origin and flight["destination"] == destination:
+            dates = flight["dates"]
+            if date in dates and dates[date]["status"] == "available":
+                results.append({k: v for k, v in flight.items() if k != "dates"})
+                results[-1].update(flight["dates"][date])
+    return json.dumps(results)
+
+
+def some_slot(data):
+    for flight_number, flight in data["flights"].items():
+        for date, date_data in flight["dates"].items():
+            if date_data["status"] == "available":
+                return flight_number, flight, date
+    raise AssertionError("no available flight")
+
+
+def test_search_matches_scan(raw_data):
+    data = make_data(raw_data)
+    flight_number, flight, date = some_slot(raw_data)
+    args = (flight["origin"], flight["destination"], date)
+    observation = SearchDirectFlight.invoke(data, *args)
+    assert observation == scan_direct(raw_data, *args)
+    assert flight_number in observation
+
+
+def test_inventory_is_kept_per_snapshot(raw_data):
+    data = make_data(raw_data)
+    inventory = get_flight_inventory(data)
+    assert get_flight_inventory(data) is inventory
+    assert get_flight_inventory(make_data(raw_data)) is not inventory
+
+
+def test_untracked_data_is_read_on_every_call(raw_data):
+    data = copy.deepcopy(raw_data)
+    flight_number, flight, date = some_slot(data)
+    assert get_flight_inventory(data) is not get_flight_inventory(data)
+    data["flights"][flight_number]["dates"][date]["status"] = "cancelled"
+    assert (flight_number, date) not in get_flight_inventory(data).search(dates=[date])
+
+
+def test_write_to_table_rebuilds_inventory(raw_data):
+    data = make_data(raw_data)
+    flight_number, flight, date = some_slot(raw_data)
+    args = (flight["origin"], flight["destination"], date)
+    inventory = get_flight_inventory(data)
+    assert flight_number in SearchDirectFlight.invoke(data, *args)
+    data["flights"][flight_number]["dates"][date]["status"] = "cancelled"
+    assert get_flight_inventory(data) is not inventory
+    observation = SearchDirectFlight.invoke(data, *args)
+    assert flight_number not in observation
+    assert observation == scan_direct(data, *args)
+
+
+def test_new_flight_is_searchable_before_and_after_settle(raw_data):
+    data = make_data(raw_data)
+    flight_number, flight, date = some_slot(raw_data)
+    new_flight = copy.deepcopy(flight)
+    new_flight["flight_number"] = "NEW001"
+    data["flights"]["NEW001"] = new_flight
+    args = (flight["origin"], flight["destination"], date)
+    assert "NEW001" in SearchDirectFlight.invoke(data, *args)
+    # the writer still holds the record, so the inventory must not be kept
+    new_flight["dates"][date]["status"] = "delayed"
+    assert "NEW001" not in SearchDirectFlight.invoke(data, *args)
+    get_registry(data).settle()
+    assert SearchDirectFlight.invoke(data, *args) == scan_direct(data, *args)
+
+
+def test_inventory_writes_keep_inventory(raw_data):
+    data = make_data(raw_data)
+    flight_number, _, date = some_slot(raw_data)
+    inventory = get_flight_inventory(data)
+    seats = data["flights"][flight_number]["dates"][date]["available_seats"]["economy"]
+    inventory.reserve_seats(flight_number, date, "economy", 1)
+    assert get_flight_inventory(data) is inventory
+    assert (
+        data["flights"][flight_number]["dates"][date]["available_seats"]["economy"]
+        == seats - 1
+    )
+    found, _ = inventory.lookup([(flight_number, date)], "economy")
+    assert found.tolist() == [seats - 1]
+    inventory.set_status(flight_number, date, "cancelled")
+    assert get_flight_inventory(data) is inventory
+    assert (flight_number, date) not in inventory.search(dates=[date])
+    with pytest.raises(ValueError):
+        inventory.reserve_seats(flight_number, date, "economy", 10**6)
+
+
+def test_cheapest_matches_scan(raw_data):
+    data = make_data(raw_data)
+    _, flight, date = some_slot(raw_data)
+    best = get_flight_inventory(data).cheapest(
+        "business", origin=flight["origin"], dates=[date]
+    )
+    candidates = [
+        f["dates"][date]["prices"]["business"]
+        for f in raw_data["flights"].values()
+        if f["origin"] == flight["origin"]
+        and date in f["dates"]
+        and f["dates"][date]["status"] == "available"
+        and f["dates"][date]["available_seats"]["business"] >= 1
+    ]
+    assert best["price"] == min(candidates)
@@ -0,0 +1,36 @@
+# Copyright Sierra
+
+import json
+
+from tau_bench.model_utils.api.logging import LogRecord, LogWriter
+
+
+def read(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_records_are_snapshotted_when_submitted(tmp_path):
+    path = str(tmp_path / "api.jsonl")
+    writer = LogWriter(path)
+    options = ["a", "b"]
+    response = {"label": "a"}
+    writer.submit(LogRecord("API", "classify", {"options": options}, response))
+    # e.g. a caller reusing its lists for the next call
+    options.append("c")
+    response["label"] = "c"
+    assert writer.flush()
+    [record] = read(path)
+    assert record["kwargs"] == {"options": ["a", "b"]}
+    assert record["response"] == {"label": "a"}
+
+
+def test_unserializable_records_are_counted_not_raised(tmp_path):
+    path = str(tmp_path / "api.jsonl")
+    writer = LogWriter(path)
+    writer.submit(LogRecord("API", "generate", {"text": object()}, "response"))
+    writer.submit(LogRecord("API", "generate", {"text": "text"}, "response"))
+    assert writer.flush()
+    assert [record["kwargs"] for record in read(path)] == [{"text": "text"}]
+    metrics = writer.metrics()
+    assert (metrics["errors"], metrics["enqueued"], metrics["written"]) == (1, 1, 1)
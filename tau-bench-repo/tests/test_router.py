@@ -0,0 +1,106 @@
+# Copyright Sierra
+
+import pytest
+
+from tau_bench.model_utils.api import router as router_module
+from tau_bench.model_utils.api.datapoint import ClassifyDatapoint
+from tau_bench.model_utils.api.router import OnlineSLORequestRouter, prompt_size_bucket
+from tau_bench.model_utils.model.model import Model
+
+DP = ClassifyDatapoint(
+    instruction="Who failed?", text="text", options=["user", "agent"]
+)
+
+
+class StubModel(Model):
+    def __init__(self, cost, latency_ms=100.0, capability=1.0):
+        self.cost = cost
+        self.latency_ms = latency_ms
+        self.capability = capability
+
+    def get_capability(self):
+        return self.capability
+
+    def get_approx_cost(self, dp):
+        return self.cost
+
+    def get_latency(self, dp):
+        return self.latency_ms
+
+    def supports_dp(self, dp):
+        return True
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(router_module, "time", clock)
+    return clock
+
+
+def latency(router, model):
+    return router.predict(model, DP, prompt_size_bucket(DP))[0]
+
+
+def test_latency_is_an_ewma_once_observed(clock):
+    model = StubModel(cost=1.0, latency_ms=50.0)
+    router = OnlineSLORequestRouter(alpha=0.5, min_observations=3)
+    router.observe(model, DP, 100.0)
+    router.observe(model, DP, 200.0)
+    # the model's own estimate until there are enough observations
+    assert latency(router, model) == 50.0
+    router.observe(model, DP, 300.0)
+    assert latency(router, model) == 225.0
+    # failed calls do not count towards the latency
+    router.observe(model, DP, 10_000.0, error=True)
+    assert latency(router, model) == 225.0
+
+
+def test_a_model_without_an_estimate_is_tried_first(clock):
+    known = StubModel(cost=1.0)
+    unknown = StubModel(cost=10.0, latency_ms=0.0)
+    router = OnlineSLORequestRouter(max_latency_ms=1000.0)
+    assert router.route(DP, [known, unknown]) is unknown
+
+
+def test_the_cheapest_model_within_the_slo_is_picked(clock):
+    cheap, dear = StubModel(cost=1.0), StubModel(cost=10.0)
+    router = OnlineSLORequestRouter(max_latency_ms=1000.0, alpha=0.5)
+    assert router.route(DP, [dear, cheap]) is cheap
+    for _ in range(3):
+        router.observe(cheap, DP, 3000.0)
+        router.observe(dear, DP, 500.0)
+    assert router.route(DP, [dear, cheap]) is dear
+
+
+def test_error_rate_decays_until_the_model_is_tried_again(clock):
+    cheap, dear = StubModel(cost=1.0), StubModel(cost=10.0)
+    router = OnlineSLORequestRouter(
+        max_latency_ms=1000.0, max_error_rate=0.5, alpha=0.5, error_half_life_s=60.0
+    )
+    for _ in range(3):
+        router.observe(cheap, DP, 100.0)
+        router.observe(dear, DP, 100.0)
+    assert router.route(DP, [cheap, dear]) is cheap
+    for _ in range(3):
+        router.observe(cheap, DP, 100.0, error=True)
+    # 0.875 after the burst, it decays to 0.5 in about 48 s
+    assert router.route(DP, [cheap, dear]) is dear
+    clock.now += 45.0
+    assert router.route(DP, [cheap, dear]) is dear
+    clock.now += 5.0
+    assert router.route(DP, [cheap, dear]) is cheap
+    # a new error restarts from the decayed rate rather than the stored one
+    router.observe(cheap, DP, 100.0, error=True)
+    bucket = prompt_size_bucket(DP)
+    assert router.predict(cheap, DP, bucket)[2] == pytest.approx(
+        0.5 * 0.875 * 0.5 ** (50.0 / 60.0) + 0.5
+    )
@@ -0,0 +1,53 @@
+# Copyright Sierra
+
+import threading
+
+from pydantic import BaseModel
+
+from tau_bench.model_utils.api.sample import MajoritySamplingStrategy, majority_decided
+
+
+class Label(BaseModel):
+    label: str
+
+
+def test_majority_needs_a_value():
+    assert not majority_decided([], 0)
+    assert not majority_decided([], 3)
+
+
+def test_majority_with_no_samples_left():
+    assert majority_decided(["a"], 0)
+    assert majority_decided(["a", "a", "b"], 0)
+    # a tie is not a majority
+    assert not majority_decided(["a", "b"], 0)
+    assert not majority_decided(["a", "a", "b", "b"], 0)
+
+
+def test_majority_must_survive_the_remaining_samples():
+    # the remaining samples could all go to the runner up
+    assert not majority_decided(["a", "a", "b"], 1)
+    assert majority_decided(["a", "a", "a", "b"], 1)
+    assert majority_decided(["a", "a", "a"], 2)
+    assert not majority_decided(["a", "a", "a"], 3)
+
+
+def test_majority_compares_models_by_value():
+    assert majority_decided([Label(label="a"), Label(label="a")], 1)
+    assert not majority_decided([Label(label="a"), Label(label="b")], 0)
+
+
+def test_majority_sampling_stops_once_decided():
+    calls = []
+    lock = threading.Lock()
+
+    def sample():
+        with lock:
+            calls.append(len(calls))
+        return "a"
+
+    strategy = MajoritySamplingStrategy(n=5, max_concurrency=1)
+    assert strategy.execute(sample) == "a"
+    assert len(calls) == 3
+    metrics = strategy.voting_metrics()
+    assert (metrics["early_decisions"], metrics["calls_skipped"]) == (1, 2)
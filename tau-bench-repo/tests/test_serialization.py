@@ -0,0 +1,63 @@
+# Copyright Sierra
+
+import copy
+import json
+
+import pytest
+
+from tau_bench.envs import serialization
+from tau_bench.envs.index import get_registry, index_data
+from tau_bench.envs.retail.data import load_data
+from tau_bench.envs.retail.indexes import CACHED_TABLES, INDEXES
+from tau_bench.envs.serialization import dumps_record
+
+
+@pytest.fixture(scope="module")
+def raw_data():
+    return load_data()
+
+
+def make_data(raw_data, source="tests"):
+    return index_data(
+        copy.deepcopy(raw_data), INDEXES, tables=CACHED_TABLES, source=source
+    )
+
+
+def test_untracked_records_are_serialized(raw_data):
+    user_id = next(iter(raw_data["users"]))
+    loaded = json.dumps(raw_data["users"][user_id])
+    assert dumps_record(raw_data, "users", user_id) == loaded
+
+
+def test_records_follow_changes(raw_data):
+    data = make_data(raw_data)
+    other = make_data(raw_data)
+    user_id = next(iter(raw_data["users"]))
+    loaded = json.dumps(raw_data["users"][user_id])
+    assert dumps_record(data, "users", user_id) == loaded
+    data["users"][user_id]["address"]["city"] = "Elsewhere"
+    changed = dumps_record(data, "users", user_id)
+    assert json.loads(changed)["address"]["city"] == "Elsewhere"
+    assert dumps_record(data, "users", user_id) is changed
+    # the other snapshot of the same source still sees the record as loaded
+    assert dumps_record(other, "users", user_id) == loaded
+
+
+def test_pending_records_are_serialized_on_every_call(raw_data):
+    data = make_data(raw_data)
+    record = {"name": "new"}
+    data["users"]["new_user"] = record
+    assert dumps_record(data, "users", "new_user") == json.dumps(record)
+    record["name"] = "renamed"
+    assert dumps_record(data, "users", "new_user") == json.dumps(record)
+    get_registry(data).settle()
+    assert dumps_record(data, "users", "new_user") == json.dumps(record)
+
+
+def test_pristine_sources_are_bounded(raw_data, monkeypatch):
+    monkeypatch.setattr(serialization, "MAX_PRISTINE_SOURCES", 2)
+    user_id = next(iter(raw_data["users"]))
+    for i in range(5):
+        dumps_record(make_data(raw_data, source=f"bounded_{i}"), "users", user_id)
+    assert "bounded_4" in serialization._pristine
+    assert len(serialization._pristine) == 2
@@ -0,0 +1,78 @@
+# Copyright Sierra
+
+import time
+
+import pytest
+
+from tau_bench.agents.tool_calling_agent import execute_tool_calls
+from tau_bench.envs import get_env
+from tau_bench.types import Action
+
+
+class SlowThink(object):
+    @staticmethod
+    def invoke(data, thought: str, delay: float = 0.0) -> str:
+        time.sleep(delay)
+        return thought
+
+
+@pytest.fixture
+def env():
+    env = get_env(
+        "retail",
+        user_strategy="human",
+        user_model="mock",
+        task_split="test",
+        task_index=0,
+    )
+    env.tools_map["think"] = SlowThink
+    return env
+
+
+def test_concurrent_calls_are_recorded_in_call_order(env):
+    # later calls finish first
+    actions = [
+        Action(name="think", kwargs={"thought": str(i), "delay": 0.02 * (5 - i)})
+        for i in range(5)
+    ]
+    responses = execute_tool_calls(env, actions)
+    observations = [response.observation for response in responses]
+    assert observations == [str(i) for i in range(5)]
+    assert env.actions == actions
+    assert env.metrics.tools["think"].calls == 5
+
+
+def test_write_calls_split_concurrent_runs(env):
+    user_id = next(iter(env.data["users"]))
+    address = {
+        "address1": "1 Main St",
+        "address2": "",
+        "city": "Austin",
+        "state": "TX",
+        "country": "USA",
+        "zip": "78701",
+    }
+    actions = [
+        Action(name="get_user_details", kwargs={"user_id": user_id}),
+        Action(name="think", kwargs={"thought": "before", "delay": 0.01}),
+        Action(name="modify_user_address", kwargs={"user_id": user_id, **address}),
+        Action(name="get_user_details", kwargs={"user_id": user_id}),
+        Action(name="think", kwargs={"thought": "after"}),
+    ]
+    responses = execute_tool_calls(env, actions)
+    assert env.actions == actions
+    assert "Austin" not in responses[0].observation
+    assert "Austin" in responses[3].observation
+    assert responses[4].observation == "after"
+
+
+def test_calls_after_the_end_are_not_run(env):
+    actions = [
+        Action(name="transfer_to_human_agents", kwargs={"summary": "done"}),
+        Action(name="think", kwargs={"thought": "never"}),
+    ]
+    env.task = env.task.model_copy(update={"actions": [], "outputs": []})
+    responses = execute_tool_calls(env, actions)
+    assert len(responses) == 1
+    assert responses[0].done
+    assert env.actions == actions[:1]
@@ -0,0 +1,119 @@
+# Copyright Sierra
+
+import pytest
+
+from tau_bench.envs.retail.tools import ALL_TOOLS
+from tau_bench.envs.validation import (
+    ArgumentValidationError,
+    ArgumentValidator,
+    compile_schema,
+)
+
+
+def errors(schema, value, strict=False):
+    found = []
+    compile_schema(schema, strict=strict)(value, "", found)
+    return found
+
+
+def tool(parameters):
+    return {"type": "function", "function": {"name": "tool", "parameters": parameters}}
+
+
+def test_types_are_not_coerced():
+    assert errors({"type": "integer"}, 1) == []
+    assert len(errors({"type": "integer"}, "1")) == 1
+    assert len(errors({"type": "integer"}, 1.0)) == 1
+    assert len(errors({"type": "integer"}, True)) == 1
+    assert errors({"type": "number"}, 1) == []
+    assert errors({"type": "number"}, 1.5) == []
+    assert len(errors({"type": "number"}, False)) == 1
+    assert len(errors({"type": "string"}, 1)) == 1
+    assert len(errors({"type": "boolean"}, 0)) == 1
+    assert errors({"type": ["string", "null"]}, None) == []
+    assert "must be of type string or null, got int" in errors(
+        {"type": ["string", "null"]}, 1
+    )[0]
+
+
+def test_enum():
+    schema = {"type": "string", "enum": ["economy", "business"]}
+    assert errors(schema, "economy") == []
+    assert errors(schema, "first") == [
+        "arguments must be one of ['economy', 'business'], got 'first'"
+    ]
+    # a wrong type reports both violations
+    assert len(errors(schema, 1)) == 2
+
+
+def test_nested_arrays():
+    schema = {
+        "type": "object",
+        "properties": {
+            "passengers": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "name": {"type": "string"},
+                        "seats": {"type": "array", "items": {"type": "integer"}},
+                    },
+                    "required": ["name"],
+                },
+            }
+        },
+    }
+    value = {"passengers": [{"name": "a", "seats": [1, 2]}, {"name": "b", "seats": []}]}
+    assert errors(schema, value) == []
+    value = {"passengers": [{"seats": [1, "2"]}, "c"]}
+    assert errors(schema, value) == [
+        "missing required argument 'passengers[0].name'",
+        "'passengers[0].seats[1]' must be of type integer, got str",
+        "'passengers[1]' must be of type object, got str",
+    ]
+
+
+def test_additional_properties():
+    schema = {"type": "object", "properties": {"a": {"type": "integer"}}}
+    assert errors(schema, {"a": 1, "b": 2}) == []
+    assert errors(schema, {"a": 1, "b": 2}, strict=True) == ["unexpected argument 'b'"]
+    closed = dict(schema, additionalProperties=False)
+    assert errors(closed, {"a": 1, "b": 2}) == ["unexpected argument 'b'"]
+    typed = dict(schema, additionalProperties={"type": "string"})
+    assert errors(typed, {"a": 1, "b": "x"}, strict=True) == []
+    assert errors(typed, {"a": 1, "b": 2}) == ["'b' must be of type string, got int"]
+    # strict only applies to the top level, as nested objects are free-form by default
+    nested = {"type": "object", "properties": {"inner": {"type": "object"}}}
+    assert errors(nested, {"inner": {"x": 1}}, strict=True) == []
+
+
+def test_validator_rejects_undeclared_arguments():
+    validator = ArgumentValidator(
+        tool(
+            {
+                "type": "object",
+                "properties": {"user_id": {"type": "string"}},
+                "required": ["user_id"],
+            }
+        )
+    )
+    validator.validate({"user_id": "u"})
+    with pytest.raises(ArgumentValidationError) as raised:
+        validator.validate({"user": "u"})
+    assert raised.value.tool_name == "tool"
+    assert raised.value.errors == [
+        "missing required argument 'user_id'",
+        "unexpected argument 'user'",
+    ]
+    assert isinstance(raised.value, ValueError)
+
+
+def test_validator_without_parameters():
+    validator = ArgumentValidator({"type": "function", "function": {"name": "think"}})
+    assert validator.errors({}) == []
+    assert validator.errors({"x": 1}) == ["unexpected argument 'x'"]
+
+
+def test_every_tool_schema_compiles():
+    for tool_class in ALL_TOOLS:
+        ArgumentValidator(tool_class.get_info())
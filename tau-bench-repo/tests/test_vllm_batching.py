@@ -0,0 +1,136 @@
+# Copyright Sierra
+
+import gc
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from tau_bench.model_utils.model.vllm_batching import BatchDispatcher
+from tau_bench.model_utils.model.vllm_completion import VLLMCompletionModel
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # prompt -> choices to answer with, instead of one echo per prompt
+    overrides: dict = {}
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append((self.path, body))
+        if self.path.endswith("/generate"):
+            res = {"text": [body["prompt"] + " native"]}
+        else:
+            prompts = body["prompt"]
+            choices = [{"index": i, "text": f" {p}!"} for i, p in enumerate(prompts)]
+            res = {"choices": choices}
+            for prompt in prompts:
+                if prompt in self.overrides:
+                    res = {"choices": self.overrides[prompt]}
+        payload = json.dumps(res).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+
+def base_url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def test_batching_needs_a_completions_endpoint(server):
+    with pytest.raises(ValueError):
+        VLLMCompletionModel(model="m", base_url=base_url(server), batch_window_ms=1.0)
+
+
+def test_native_endpoint_strips_the_prompt(server):
+    model = VLLMCompletionModel(model="m", base_url=base_url(server))
+    assert model.generate_from_prompt("hello") == " native"
+    path, body = server.requests[-1]
+    assert path == "/generate"
+    assert "model" not in body
+
+
+def test_batched_and_unbatched_requests_agree(server):
+    unbatched = VLLMCompletionModel(
+        model="m", base_url=base_url(server), endpoint="v1/completions"
+    )
+    batched = VLLMCompletionModel(
+        model="m",
+        base_url=base_url(server),
+        endpoint="v1/completions",
+        batch_window_ms=20.0,
+    )
+    prompts = [f"prompt {i}" for i in range(8)]
+    with ThreadPoolExecutor(max_workers=len(prompts)) as executor:
+        texts = list(executor.map(batched.generate_from_prompt, prompts))
+    assert texts == [unbatched.generate_from_prompt(prompt) for prompt in prompts]
+    assert texts[0] == " prompt 0!"
+    assert batched.dispatcher.num_batches < len(prompts)
+    assert {path for path, _ in server.requests} == {"/v1/completions"}
+    assert all(body["model"] == "m" for _, body in server.requests)
+    batched.close()
+
+
+def test_missing_completions_are_errors(server):
+    Handler.overrides = {"lost": [{"index": 1, "text": "only the second"}]}
+    try:
+        dispatcher = BatchDispatcher(
+            url=f"{base_url(server)}/v1/completions", model="m", max_wait_ms=50.0
+        )
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(dispatcher.submit, p) for p in ["lost", "kept"]]
+        for future in futures:
+            with pytest.raises(ValueError, match="Empty response"):
+                future.result()
+        dispatcher.close()
+    finally:
+        Handler.overrides = {}
+
+
+def test_close_sends_queued_prompts_and_stops(server):
+    dispatcher = BatchDispatcher(
+        url=f"{base_url(server)}/v1/completions", model="m", max_wait_ms=60_000.0
+    )
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(dispatcher.submit, "queued")
+        while len(dispatcher.queues) == 0:
+            time.sleep(0.001)
+        dispatcher.close()
+        assert future.result(timeout=5) == " queued!"
+    assert not dispatcher.thread.is_alive()
+    with pytest.raises(RuntimeError):
+        dispatcher.submit("late")
+    dispatcher.close()
+
+
+def test_dispatcher_is_closed_with_its_model(server):
+    model = VLLMCompletionModel(
+        model="m",
+        base_url=base_url(server),
+        endpoint="v1/completions",
+        batch_window_ms=1.0,
+    )
+    dispatcher = model.dispatcher
+    assert model.generate_from_prompt("x") == " x!"
+    del model
+    gc.collect()
+    assert dispatcher.closed
+    assert not dispatcher.thread.is_alive()